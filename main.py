@@ -1,39 +1,213 @@
 """
 NPPES Cardiology Data Pipeline - Main Entry Point
 Complete 28-Step Review Project
+
+Runs steps 6-9 in one process as a dependency graph. The extract is handed
+to downstream stages in memory; MinIO, PostgreSQL and S3 are only written
+at checkpoints, and independent branches run concurrently:
+
+    extract ─┬─ checkpoint   (MinIO processed-data)
+             ├─ load         (PostgreSQL) ── index (AWS S3, provider lookup index)
+             └─ backup       (AWS S3) ── mirror (S3 → MinIO)
+
+Progress is recorded in a run manifest in MinIO; re-running with the same
+--run-id skips finished stages and resumes the PostgreSQL load from its
+last committed batch. A new run whose extract has the same content as the
+last run skips the load, index, backup and mirror (--force runs them); the
+load only while PostgreSQL still holds what that run loaded.
 """
+import argparse
 import os
+import sys
 from dotenv import load_dotenv
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+import connections
+import frame_io
+import pipeline
+import provider_index
+import run_manifest
+import step6_minio_transform as step6
+import step7_minio_to_postgres as step7
+import step8_postgres_to_aws as step8
+import step9_aws_to_minio as step9
+
 # Load environment variables
 load_dotenv()
 
-def main():
-    print("=" * 70)
-    print("NPPES Cardiology Data Pipeline")
-    print("28-Step Review Project")
-    print("=" * 70)
-    
-    # Verify environment variables
+BACKUP_PREFIX = 'pipeline-backup/'
+
+def check_environment():
+    """Print the configuration; returns True if the NPPES file exists"""
     nppes_file = os.getenv('NPPES_FILE_PATH')
     minio_endpoint = os.getenv('MINIO_ENDPOINT')
     postgres_host = os.getenv('POSTGRES_HOST')
-    
+
     print("\n### Environment Configuration ###")
     print(f"✓ NPPES File: {nppes_file}")
     print(f"✓ MinIO: {minio_endpoint}")
     print(f"✓ PostgreSQL: {postgres_host}")
-    
-    # Verify file exists
-    if os.path.exists(nppes_file):
+
+    # Verify file exists (s3:// sources are read from MinIO by DuckDB)
+    if nppes_file and nppes_file.startswith('s3://'):
+        print("✓ File read from MinIO via DuckDB httpfs")
+        return True
+    if nppes_file and os.path.exists(nppes_file):
         file_size_gb = os.path.getsize(nppes_file) / (1024**3)
         print(f"✓ File found: {file_size_gb:.2f} GB")
+        return True
+    print(f"⚠️  File not found at: {nppes_file}")
+    return False
+
+def build_stages(nppes_file, manifest, limit=None, skip_unchanged=True):
+    """Pipeline graph for steps 6-9"""
+    aws_bucket = os.getenv('AWS_BUCKET')
+    backup_key = f"{BACKUP_PREFIX}cardiology_processed.parquet"
+    batch_size = int(os.getenv('COPY_BATCH_SIZE', '100000'))
+
+    def extract(inputs):
+        return step6.extract_table(nppes_file, limit=limit)
+
+    def restore_extract(summary):
+        # The MinIO checkpoint holds exactly the extracted table
+        if not manifest.is_done('checkpoint') or not manifest.verify('checkpoint'):
+            raise RuntimeError("no valid checkpoint")
+        return step6.read_table(connections.get_minio_client())
+
+    def checkpoint(inputs):
+        minio_s3 = connections.get_minio_client()
+        step9.ensure_bucket(minio_s3, step6.TARGET_BUCKET)
+        result = step6.save_table(minio_s3, inputs['extract'])
+        manifest.record_object('checkpoint', 'minio', step6.TARGET_BUCKET, step6.PROCESSED_KEY,
+                               sha256=result['sha256'], etag=result['etag'], size=result['bytes'])
+        return result
+
+    def load(inputs):
+        with connections.pg_connection() as conn:
+            stats = step7.load_table(
+                conn,
+                inputs['extract'],
+                batch_size=batch_size,
+                resume_rows=manifest.chunk_offset('load'),
+                on_batch=lambda rows: manifest.record_chunk('load', rows)
+            )
+            # Compared before skipping the load, see load_current
+            stats['postgres'] = step7.table_state(conn)
+        return stats
+
+    def load_current(summary):
+        # Any later load (incremental too) bumps the version; a truncate
+        # or restore changes the row count
+        with connections.pg_connection() as conn:
+            return (summary or {}).get('postgres') == step7.table_state(conn)
+
+    def index(inputs):
+        # Built from PostgreSQL, which also knows deactivations
+        index_bucket = os.getenv('PROVIDER_INDEX_BUCKET', aws_bucket)
+        index_key = os.getenv('PROVIDER_INDEX_KEY', provider_index.INDEX_KEY)
+        with connections.pg_connection() as conn:
+            index_table = provider_index.build_index(provider_index.read_providers(conn))
+        result = provider_index.publish_index(
+            connections.get_aws_s3_client(), index_bucket, index_key, index_table
+        )
+        manifest.record_object('index', 'aws', index_bucket, index_key,
+                               etag=result['etag'], size=result['bytes'])
+        return result
+
+    def backup(inputs):
+        result = step8.upload_table(
+            connections.get_aws_s3_client(), aws_bucket, backup_key, inputs['extract']
+        )
+        manifest.record_object('backup', 'aws', aws_bucket, backup_key,
+                               sha256=result['sha256'], etag=result['etag'], size=result['bytes'])
+        return result
+
+    def mirror(inputs):
+        results = step9.mirror_prefix(
+            connections.get_aws_s3_client(),
+            connections.get_minio_client(),
+            aws_bucket,
+            BACKUP_PREFIX
+        )
+        for result in results:
+            manifest.record_object('mirror', 'minio', step9.MINIO_BUCKET, result['key'],
+                                   size=result['size'])
+        return results
+
+    # Downstream stages are skipped when the extract's content is unchanged
+    options = {'checkpoint': True, 'skip_unchanged': skip_unchanged}
+    return [
+        pipeline.Stage('extract', extract, restore=restore_extract,
+                       summarize=lambda table: {'rows': table.num_rows},
+                       fingerprint=frame_io.content_sha256),
+        pipeline.Stage('checkpoint', checkpoint, depends_on=['extract'],
+                       fingerprint=lambda result: result['sha256'], **options),
+        pipeline.Stage('load', load, depends_on=['extract'], current=load_current,
+                       fingerprint=lambda result: "{load_version}:{rows}".format(**result['postgres']),
+                       **options),
+        pipeline.Stage('index', index, depends_on=['load'], **options),
+        pipeline.Stage('backup', backup, depends_on=['extract'],
+                       fingerprint=lambda result: result['sha256'], **options),
+        pipeline.Stage('mirror', mirror, depends_on=['backup'], **options),
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description="NPPES Cardiology Data Pipeline")
+    parser.add_argument('--check-only', action='store_true',
+                        help="only verify the environment configuration")
+    parser.add_argument('--limit', type=int, default=None,
+                        help="extract at most this many providers")
+    parser.add_argument('--workers', type=int, default=4,
+                        help="stages allowed to run concurrently")
+    parser.add_argument('--run-id', default=None,
+                        help="resume this run (default: start a new one)")
+    parser.add_argument('--force', action='store_true',
+                        help="run every stage even if its inputs are unchanged")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("NPPES Cardiology Data Pipeline")
+    print("28-Step Review Project")
+    print("=" * 70)
+
+    file_ok = check_environment()
+    if args.check_only or not file_ok:
+        print("\n" + "=" * 70)
+        print("Environment ready for pipeline execution!" if file_ok else "Fix the environment first.")
+        print("=" * 70)
+        return
+
+    print("\n### Pipeline Run ###")
+    minio_s3 = connections.get_minio_client()
+    step9.ensure_bucket(minio_s3, run_manifest.MANIFEST_BUCKET)
+    manifest = run_manifest.RunManifest.open(minio_s3, args.run_id or run_manifest.new_run_id())
+    if manifest.resumed:
+        print(f"✓ Resuming run {manifest.run_id}")
     else:
-        print(f"⚠️  File not found at: {nppes_file}")
-    
+        print(f"✓ Run id: {manifest.run_id} (re-run with --run-id {manifest.run_id} to resume)")
+    manifest.save()
+
+    stages = build_stages(os.getenv('NPPES_FILE_PATH'), manifest, limit=args.limit,
+                          skip_unchanged=not args.force)
+    try:
+        results = pipeline.run(stages, max_workers=args.workers, manifest=manifest)
+    finally:
+        connections.close_all()
+
+    print("\n### Summary ###")
+    extracted = results['extract']
+    rows = extracted['rows'] if isinstance(extracted, dict) else extracted.num_rows
+    print(f"✓ Extracted: {rows:,} providers")
+    print(f"✓ MinIO checkpoint: {results['checkpoint']['bytes']:,} bytes")
+    print(f"✓ PostgreSQL: {results['load']['upserted']:,} merged, {results['load']['deleted']:,} removed")
+    print(f"✓ S3 backup: {results['backup']['bytes']:,} bytes")
+    print(f"✓ Mirrored to MinIO: {len(results['mirror'])} object(s)")
+    print(f"✓ Manifest: s3://{run_manifest.MANIFEST_BUCKET}/{manifest.key}")
+
     print("\n" + "=" * 70)
-    print("Environment ready for pipeline execution!")
+    print("Pipeline complete!")
     print("=" * 70)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,64 @@
+"""
+Benchmark: processed intermediate as CSV (old pandas round trip) vs
+Parquet (Arrow buffers) - object size, serialize and parse time
+"""
+import io
+import os
+import statistics
+import time
+from dotenv import load_dotenv
+import pandas as pd
+
+import frame_io
+import step6_minio_transform as step6
+
+load_dotenv()
+
+
+def median_seconds(func, runs):
+    """Median wall time of `runs` calls, plus the last return value"""
+    timings = []
+    result = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), result
+
+
+def report(label, size, write_seconds, read_seconds):
+    print(f"✓ {label}: {size / 1024**2:,.1f} MB, "
+          f"write {write_seconds:.2f}s ({size / write_seconds / 1024**2:,.0f} MB/s), "
+          f"read {read_seconds:.2f}s ({size / read_seconds / 1024**2:,.0f} MB/s)")
+
+
+def main():
+    print("=" * 70)
+    print("Benchmark: CSV vs Parquet Intermediate Format")
+    print("=" * 70)
+
+    runs = int(os.getenv('BENCHMARK_RUNS', '3'))
+    limit = os.getenv('BENCHMARK_LIMIT')
+
+    print("\n### Extract ###")
+    table = step6.extract_table(os.getenv('NPPES_FILE_PATH'), limit=int(limit) if limit else None)
+    print(f"✓ {table.num_rows:,} rows")
+
+    print("\n### CSV (pandas) ###")
+    df = table.to_pandas()
+    csv_write, csv_bytes = median_seconds(lambda: df.to_csv(index=False).encode('utf-8'), runs)
+    csv_read, _ = median_seconds(lambda: pd.read_csv(io.BytesIO(csv_bytes)), runs)
+    report('CSV', len(csv_bytes), csv_write, csv_read)
+
+    print("\n### Parquet (Arrow, zstd) ###")
+    parquet_write, buffer = median_seconds(lambda: frame_io.to_parquet_buffer(table), runs)
+    parquet_read, _ = median_seconds(lambda: frame_io.read_parquet_bytes(buffer), runs)
+    report('Parquet', buffer.size, parquet_write, parquet_read)
+
+    print("\n" + "=" * 70)
+    print(f"Size: Parquet is {buffer.size / len(csv_bytes):.0%} of CSV")
+    print(f"Write: {csv_write / parquet_write:.1f}x faster, Read: {csv_read / parquet_read:.1f}x faster")
+    print("=" * 70)
+
+if __name__ == "__main__":
+    main()
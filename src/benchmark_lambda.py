@@ -0,0 +1,194 @@
+"""
+Benchmark: cold vs warm latency of the Lambda handlers (steps 11 and 12)
+and what their imports cost. A cold sample is a fresh interpreter that
+imports the handler and serves one request, as a new container does; warm
+samples are the following requests in the same process.
+"""
+import importlib
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+HANDLERS = ['step11_lambda_get', 'step12_lambda_post']
+DEFAULT_COLD_RUNS = '10'
+DEFAULT_WARM_RUNS = '200'
+DEFAULT_INDEX_ROWS = '100000'
+POST_BATCH = 1000
+IMPORT_REPORT_COUNT = 8
+
+
+class MockContext:
+    request_id = 'benchmark'
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(int(len(values) * share), len(values) - 1)]
+
+
+def sample_index(path, rows):
+    """Write a synthetic provider index with `rows` providers; returns its NPIs"""
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    import nppes_synthetic
+    import provider_index
+
+    rng = np.random.default_rng(0)
+    states = list(nppes_synthetic.STATES)
+    state_column = rng.choice(states, rows)
+    table = pa.table({
+        'NPI': np.arange(rows, dtype=np.int64) * 7 + nppes_synthetic.FIRST_NPI,
+        'provider_state': state_column,
+        'provider_city': [nppes_synthetic.STATES[state][0] for state in state_column],
+        'specialty_code': rng.choice(['207RC0000X', '207RI0011X', '207RE0101X'], rows),
+    })
+    pq.write_table(provider_index.build_index(provider_index.from_processed(table)), path)
+    return table['NPI'].to_pylist()
+
+
+def sample_events(npis, states, count):
+    """`count` API Gateway events per handler"""
+    rng = random.Random(0)
+    get_events = []
+    for number in range(count):
+        if number % 2:
+            params = {'state': rng.choice(states), 'limit': '100'}
+        else:
+            params = {'npi': str(rng.choice(npis))}
+        get_events.append({'queryStringParameters': params})
+    post_events = [
+        {'body': json.dumps([str(npi) for npi in rng.sample(npis, min(POST_BATCH, len(npis)))])}
+        for _ in range(count)
+    ]
+    return {'step11_lambda_get': get_events, 'step12_lambda_post': post_events}
+
+
+def run_child(module_name, events_path, warm_runs):
+    """Child process: import, first request, then warm requests; prints JSON"""
+    start = time.perf_counter()
+    module = importlib.import_module(module_name)
+    import_ms = (time.perf_counter() - start) * 1000
+    with open(events_path, encoding='utf-8') as events_file:
+        events = json.load(events_file)[module_name]
+
+    start = time.perf_counter()
+    module.lambda_handler(events[0], MockContext())
+    first_ms = (time.perf_counter() - start) * 1000
+    warm_ms = []
+    for number in range(warm_runs):
+        start = time.perf_counter()
+        module.lambda_handler(events[(number + 1) % len(events)], MockContext())
+        warm_ms.append((time.perf_counter() - start) * 1000)
+    print(json.dumps({'import_ms': import_ms, 'first_ms': first_ms, 'warm_ms': warm_ms}))
+
+
+def spawn(module_name, events_path, warm_runs, env, importtime=False):
+    import subprocess
+
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + [
+        os.path.abspath(__file__), '--child', module_name, events_path, str(warm_runs)
+    ]
+    start = time.perf_counter()
+    result = subprocess.run(command, capture_output=True, text=True, env=env, check=True)
+    process_ms = (time.perf_counter() - start) * 1000
+    return json.loads(result.stdout.strip().splitlines()[-1]), process_ms, result.stderr
+
+
+def slowest_imports(importtime_output, count=IMPORT_REPORT_COUNT):
+    """Top-level imports by cumulative microseconds from -X importtime output"""
+    imports = []
+    for line in importtime_output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nested imports are indented; keep the top level only
+        if not name.startswith('  '):
+            imports.append((int(cumulative), name.strip()))
+    return sorted(imports, reverse=True)[:count]
+
+
+def main():
+    # Imported here, not at the top, so -X importtime in the child only
+    # lists what the handler imports
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    print("=" * 70)
+    print("Benchmark: Lambda Cold vs Warm Latency")
+    print("=" * 70)
+
+    cold_runs = int(os.getenv('BENCHMARK_COLD_RUNS', DEFAULT_COLD_RUNS))
+    warm_runs = int(os.getenv('BENCHMARK_WARM_RUNS', DEFAULT_WARM_RUNS))
+    work_dir = tempfile.mkdtemp(prefix='lambda-benchmark-')
+    env = dict(os.environ)
+
+    index_path = os.getenv('PROVIDER_INDEX_PATH')
+    if index_path:
+        import provider_index
+        index = provider_index.ProviderIndex.from_file(index_path)
+        npis = index.npi.tolist()
+        states = list(index.state_offsets)
+    else:
+        import nppes_synthetic
+        rows = int(os.getenv('BENCHMARK_INDEX_ROWS', DEFAULT_INDEX_ROWS))
+        index_path = os.path.join(work_dir, 'provider_index.parquet')
+        npis = sample_index(index_path, rows)
+        states = list(nppes_synthetic.STATES)
+        env['PROVIDER_INDEX_PATH'] = index_path
+    print(f"✓ Index: {index_path} ({len(npis):,} providers)")
+
+    events_path = os.path.join(work_dir, 'events.json')
+    with open(events_path, 'w', encoding='utf-8') as events_file:
+        json.dump(sample_events(npis, states, max(warm_runs, 1)), events_file)
+
+    results = {}
+    for module_name in HANDLERS:
+        print(f"\n### {module_name} ###")
+        for mode in ['lazy', 'preload']:
+            mode_env = dict(env, LAMBDA_PRELOAD='true' if mode == 'preload' else 'false')
+            samples = [spawn(module_name, events_path, warm_runs if run == 0 else 0, mode_env)
+                       for run in range(cold_runs)]
+            import_ms = [sample['import_ms'] for sample, _, _ in samples]
+            first_ms = [sample['first_ms'] for sample, _, _ in samples]
+            cold_ms = [a + b for a, b in zip(import_ms, first_ms)]
+            warm_ms = samples[0][0]['warm_ms']
+            results[f"{module_name}.{mode}"] = {
+                'import_ms_p50': percentile(import_ms, 0.5),
+                'first_request_ms_p50': percentile(first_ms, 0.5),
+                'cold_ms_p50': percentile(cold_ms, 0.5),
+                'cold_ms_p99': percentile(cold_ms, 0.99),
+                'warm_ms_p50': percentile(warm_ms, 0.5) if warm_ms else None,
+                'warm_ms_p99': percentile(warm_ms, 0.99) if warm_ms else None,
+                'process_ms_p50': percentile([process_ms for _, process_ms, _ in samples], 0.5),
+            }
+            result = results[f"{module_name}.{mode}"]
+            print(f"✓ [{mode:>7}] init {result['import_ms_p50']:7.1f} ms + first request "
+                  f"{result['first_request_ms_p50']:7.1f} ms = cold p50 {result['cold_ms_p50']:7.1f} / "
+                  f"p99 {result['cold_ms_p99']:7.1f} ms; warm p50 {result['warm_ms_p50'] or 0:6.2f} / "
+                  f"p99 {result['warm_ms_p99'] or 0:6.2f} ms")
+
+        _, _, importtime_output = spawn(module_name, events_path, 0,
+                                        dict(env, LAMBDA_PRELOAD='false'), importtime=True)
+        print("  Slowest imports up to the first response (-X importtime, cumulative):")
+        for microseconds, name in slowest_imports(importtime_output):
+            print(f"    {microseconds / 1000:8.1f} ms  {name}")
+
+    output_path = os.getenv('BENCHMARK_OUTPUT')
+    if output_path:
+        with open(output_path, 'w', encoding='utf-8') as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+        print(f"\n✓ Results: {output_path}")
+
+    print("\n" + "=" * 70)
+    print("Benchmark complete!")
+    print("=" * 70)
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        run_child(sys.argv[2], sys.argv[3], int(sys.argv[4]))
+    else:
+        main()
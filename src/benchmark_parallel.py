@@ -0,0 +1,76 @@
+"""
+Benchmark: parallel chunked extract over the raw NPPES CSV at 1-16 workers.
+Speedups are measured against a 1-worker run and the single-process DuckDB
+extract on the same file.
+"""
+import os
+import time
+from dotenv import load_dotenv
+
+import frame_io
+import nppes_extract
+import parallel_extract
+
+load_dotenv()
+
+DEFAULT_WORKER_COUNTS = '1,2,4,8,16'
+
+
+def table_digest(table):
+    """
+    Hash of a result sorted by NPI, independent of how it is chunked.
+    The serial connection runs with preserve_insertion_order=false, so its
+    row order is not the file order the parallel extract keeps.
+    """
+    return frame_io.content_sha256(table.sort_by('NPI'))
+
+
+def serial_extract(csv_path, taxonomy_index):
+    """The same extract in one DuckDB scan; returns (table, seconds)"""
+    start = time.perf_counter()
+    conn = nppes_extract.connect()
+    source, _ = nppes_extract.nppes_source(csv_path)
+    table = conn.execute(nppes_extract.cardiology_query(source, taxonomy_index=taxonomy_index)).fetch_arrow_table()
+    conn.close()
+    return table, time.perf_counter() - start
+
+
+def main():
+    print("=" * 70)
+    print("Benchmark: Parallel Chunked Extract Scaling")
+    print("=" * 70)
+
+    csv_path = os.getenv('NPPES_FILE_PATH')
+    worker_counts = [int(count) for count in os.getenv('BENCHMARK_WORKERS', DEFAULT_WORKER_COUNTS).split(',')]
+    taxonomy_index = nppes_extract.taxonomy_index_path()
+    size_mb = os.path.getsize(csv_path) / 1024**2
+    print(f"✓ Input: {csv_path} ({size_mb:,.0f} MB), CPUs: {os.cpu_count()}")
+
+    serial, serial_seconds = serial_extract(csv_path, taxonomy_index)
+    print(f"✓ DuckDB single-process extract: {serial_seconds:.1f}s, {serial.num_rows:,} rows")
+
+    # Both baselines are measured on this file, never extrapolated
+    if 1 not in worker_counts:
+        worker_counts = [1] + worker_counts
+    baseline = None
+    digests = set()
+    print(f"\n{'workers':>8} {'ranges':>7} {'seconds':>8} {'MB/s':>8} {'rows/s':>11} "
+          f"{'speedup':>8} {'efficiency':>10} {'vs DuckDB':>10}")
+    for workers in sorted(worker_counts):
+        table, stats = parallel_extract.parallel_extract(csv_path, workers, taxonomy_index=taxonomy_index)
+        digests.add(table_digest(table))
+        baseline = baseline or stats['seconds']  # the 1-worker run
+        speedup = baseline / stats['seconds']
+        print(f"{workers:>8} {stats['ranges']:>7} {stats['seconds']:>8.1f} "
+              f"{size_mb / stats['seconds']:>8,.0f} {stats['rows_scanned'] / stats['seconds']:>11,.0f} "
+              f"{speedup:>7.1f}x {speedup / workers:>9.0%} {serial_seconds / stats['seconds']:>9.1f}x")
+
+    print("\n" + "=" * 70)
+    if len(digests) == 1 and table_digest(serial.cast(table.schema)) in digests:
+        print(f"✓ Identical output ({table.num_rows:,} rows) at every worker count and in DuckDB")
+    else:
+        print("⚠️  Output differs between worker counts")
+    print("=" * 70)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Benchmark: cardiology filter query on the raw CSV vs the compiled Parquet.
+The filter matches all 15 taxonomy slots, so no partition is pruned; the
+speedup measured is from column projection and skipping CSV parsing.
+"""
+import os
+import statistics
+import time
+from dotenv import load_dotenv
+
+import nppes_extract
+
+load_dotenv()
+
+REQUIRED_SPEEDUP = 10.0
+
+
+def time_query(conn, query, runs):
+    """Median wall time of `runs` executions, plus the row count"""
+    timings = []
+    row_count = 0
+    for _ in range(runs):
+        start = time.perf_counter()
+        row_count = conn.execute(f"SELECT COUNT(*) FROM ({query})").fetchone()[0]
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), row_count
+
+
+def main():
+    print("=" * 70)
+    print("Benchmark: CSV vs Parquet Cardiology Filter")
+    print("=" * 70)
+
+    csv_path = os.getenv('NPPES_FILE_PATH')
+    parquet_path = os.getenv('NPPES_PARQUET_PATH', 'data/nppes_parquet')
+    runs = int(os.getenv('BENCHMARK_RUNS', '3'))
+
+    conn = nppes_extract.connect()
+
+    print("\n### CSV (read_csv, all_varchar) ###")
+    csv_query = nppes_extract.cardiology_query(nppes_extract.csv_source(csv_path))
+    csv_seconds, csv_rows = time_query(conn, csv_query, runs)
+    print(f"✓ {csv_rows:,} rows, median {csv_seconds:.2f}s over {runs} runs")
+
+    print("\n### Parquet (column projection) ###")
+    partition_column = nppes_extract.parquet_partition_column(parquet_path)
+    parquet_query = nppes_extract.cardiology_query(nppes_extract.parquet_source(parquet_path))
+    parquet_seconds, parquet_rows = time_query(conn, parquet_query, runs)
+    print(f"✓ {parquet_rows:,} rows, median {parquet_seconds:.2f}s over {runs} runs")
+    print(f"✓ Partitioned by: {partition_column} (every partition read)")
+
+    taxonomy_index = nppes_extract.taxonomy_index_path()
+    if taxonomy_index:
+        print("\n### Parquet + taxonomy index ###")
+        index_query = nppes_extract.cardiology_query(
+            nppes_extract.parquet_source(parquet_path),
+            taxonomy_index=taxonomy_index
+        )
+        index_seconds, index_rows = time_query(conn, index_query, runs)
+        print(f"✓ {index_rows:,} rows, median {index_seconds:.2f}s over {runs} runs")
+        if index_rows != csv_rows:
+            print(f"⚠️  Row counts differ: CSV {csv_rows:,} vs taxonomy index {index_rows:,}, timing ignored")
+        elif index_seconds < parquet_seconds:
+            parquet_seconds = index_seconds
+
+    conn.close()
+
+    speedup = csv_seconds / parquet_seconds
+    print("\n" + "=" * 70)
+    print(f"Speedup: {speedup:.1f}x (target {REQUIRED_SPEEDUP:.0f}x)")
+    if csv_rows != parquet_rows:
+        print(f"⚠️  Row counts differ: CSV {csv_rows:,} vs Parquet {parquet_rows:,}")
+    elif speedup >= REQUIRED_SPEEDUP:
+        print("✓ Parquet compile stage meets the speedup target")
+    else:
+        print("⚠️  Parquet compile stage is below the speedup target")
+    print("=" * 70)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""
+Benchmark suite: synthetic NPPES files through steps 6-9 against an S3
+stand-in (moto, or the docker-compose MinIO) and a local PostgreSQL.
+Each stage runs in a forked child so its wall time, CPU time and peak RSS
+are measured on their own; results go to a JSON file to diff between commits.
+"""
+import json
+import logging
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import traceback
+from datetime import datetime, timezone
+
+DEFAULT_ROWS = '10000'
+DEFAULT_MOTO_PORT = '5055'
+RESULTS_DIR = 'benchmarks'
+BENCHMARK_AWS_BUCKET = 'nppes-benchmark'
+
+
+def start_moto(port):
+    """Start an in-process moto S3 server; returns (server, endpoint URL)"""
+    try:
+        from moto.server import ThreadedMotoServer
+    except ImportError:
+        raise ImportError("The moto S3 stand-in needs moto[server] (pip install 'moto[server]')")
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = ThreadedMotoServer(ip_address='127.0.0.1', port=port, verbose=False)
+    server.start()
+    return server, f"http://127.0.0.1:{port}"
+
+
+def use_moto(endpoint, work_dir):
+    """
+    Point both the MinIO and the AWS clients at the moto endpoint.
+    Must run before the step modules load .env (which never overrides).
+    """
+    credentials = os.path.join(work_dir, 'aws_credentials')
+    with open(credentials, 'w', encoding='utf-8') as credentials_file:
+        credentials_file.write(
+            "[benchmark]\naws_access_key_id = benchmark\naws_secret_access_key = benchmark\n"
+        )
+    os.environ.update({
+        'MINIO_ENDPOINT': endpoint,
+        'MINIO_ACCESS_KEY': 'benchmark',
+        'MINIO_SECRET_KEY': 'benchmark',
+        'AWS_SHARED_CREDENTIALS_FILE': credentials,
+        'AWS_CONFIG_FILE': os.path.join(work_dir, 'aws_config'),
+        'AWS_PROFILE': 'benchmark',
+        'AWS_REGION': 'us-east-1',
+        'AWS_ENDPOINT_URL_S3': endpoint,
+        'AWS_BUCKET': BENCHMARK_AWS_BUCKET,
+    })
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measure(func):
+    """
+    Run func() in a forked child and return its JSON result with wall and
+    CPU seconds and the child's peak RSS (from os.wait4). The RSS includes
+    the interpreter and modules inherited from the parent.
+    """
+    import connections
+
+    read_fd, write_fd = os.pipe()
+    start = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        status = 0
+        try:
+            # Never share the parent's pooled sockets
+            connections.get_minio_client.cache_clear()
+            connections.get_aws_s3_client.cache_clear()
+            payload = {'result': func()}
+        except BaseException:
+            payload = {'error': traceback.format_exc()}
+            status = 1
+        with os.fdopen(write_fd, 'w') as pipe:
+            json.dump(payload, pipe, default=str)
+        os._exit(status)
+
+    os.close(write_fd)
+    with os.fdopen(read_fd) as pipe:
+        payload = json.load(pipe)
+    _, _, rusage = os.wait4(pid, 0)
+    seconds = time.perf_counter() - start
+    if 'error' in payload:
+        raise RuntimeError(f"Stage failed in child process:\n{payload['error']}")
+
+    result = payload['result']
+    rows = result.pop('rows', None)
+    size = result.pop('bytes', None)
+    peak_rss = rusage.ru_maxrss * (1 if platform.system() == 'Darwin' else 1024)
+    return {
+        **result,
+        'seconds': round(seconds, 3),
+        'user_seconds': round(rusage.ru_utime, 3),
+        'system_seconds': round(rusage.ru_stime, 3),
+        'peak_rss_mb': round(peak_rss / 1024**2, 1),
+        'rows': rows,
+        'rows_per_second': round(rows / seconds) if rows else None,
+        'bytes': size,
+        'mb_per_second': round(size / seconds / 1024**2, 1) if size else None,
+    }
+
+
+def benchmark_stages(csv_path, rows):
+    """
+    (name, func) for each stage; every func returns {'rows', 'bytes'} plus
+    any extra fields. rows is what the stage processed (input rows for the
+    extract), bytes what it read and wrote.
+    """
+    import connections
+    import nppes_synthetic
+    import step6_minio_transform as step6
+    import step7_minio_to_postgres as step7
+    import step8_postgres_to_aws as step8
+    import step9_aws_to_minio as step9
+
+    aws_bucket = os.getenv('AWS_BUCKET')
+    export_format = os.getenv('EXPORT_FORMAT', 'csv')
+    export_key, compression = step8.export_key(export_format, os.getenv('EXPORT_COMPRESSION', 'gzip'))
+    batch_size = os.getenv('COPY_BATCH_SIZE')
+
+    def generate():
+        if os.path.exists(csv_path):
+            return {'rows': None, 'bytes': None, 'cached': True}
+        size, _ = nppes_synthetic.generate(csv_path, rows)
+        return {'rows': rows, 'bytes': size}
+
+    def step6_extract():
+        minio_s3 = connections.get_minio_client()
+        result = step6.run_full_extract(minio_s3, step6.TARGET_BUCKET, csv_path)
+        written = minio_s3.head_object(Bucket=step6.TARGET_BUCKET, Key=step6.PROCESSED_KEY)
+        return {
+            'rows': rows,
+            'rows_out': result['rows'],
+            'bytes': result['input_bytes'] + written['ContentLength'],
+        }
+
+    def step7_load():
+        minio_s3 = connections.get_minio_client()
+        size = minio_s3.head_object(Bucket=step6.TARGET_BUCKET, Key=step6.PROCESSED_KEY)['ContentLength']
+        with connections.pg_connection() as conn:
+            step7.ensure_table(conn)
+            stats = step7.load_object(conn, minio_s3, step6.TARGET_BUCKET, step6.PROCESSED_KEY,
+                                      int(batch_size) if batch_size else None)
+        return {'rows': stats['copied'], 'bytes': size}
+
+    def step8_export():
+        with connections.pg_connection() as conn:
+            result = step8.export_to_s3(conn, connections.get_aws_s3_client(), aws_bucket,
+                                        export_key, export_format, compression)
+        return {'rows': result['rows'], 'bytes': result['bytes']}
+
+    def step9_mirror():
+        results = step9.mirror_prefix(connections.get_aws_s3_client(), connections.get_minio_client(),
+                                      aws_bucket, 'postgres-backup/')
+        return {'rows': None, 'objects': len(results), 'bytes': sum(result['size'] for result in results)}
+
+    return [
+        ('generate', generate),
+        ('step6_extract', step6_extract),
+        ('step7_load', step7_load),
+        ('step8_export', step8_export),
+        ('step9_mirror', step9_mirror),
+    ]
+
+
+def main():
+    print("=" * 70)
+    print("Benchmark Suite: Steps 6-9 on Synthetic NPPES Data")
+    print("=" * 70)
+
+    row_counts = [int(count) for count in os.getenv('BENCHMARK_ROWS', DEFAULT_ROWS).split(',')]
+    data_dir = os.getenv('BENCHMARK_DATA_DIR', os.path.join('data', 'benchmark'))
+    s3_mode = os.getenv('BENCHMARK_S3', 'moto')
+    os.makedirs(data_dir, exist_ok=True)
+    if os.getenv('BENCHMARK_POSTGRES_DB'):
+        os.environ['POSTGRES_DB'] = os.getenv('BENCHMARK_POSTGRES_DB')
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        server = None
+        if s3_mode == 'moto':
+            server, endpoint = start_moto(int(os.getenv('BENCHMARK_MOTO_PORT', DEFAULT_MOTO_PORT)))
+            use_moto(endpoint, work_dir)
+            print(f"✓ moto S3 stand-in at {endpoint}")
+        else:
+            print(f"✓ Using MinIO/S3 from the environment ({os.getenv('MINIO_ENDPOINT')})")
+
+        # Imported after the environment is set up
+        import connections
+        import s3_bulk
+        import step9_aws_to_minio as step9
+
+        s3_bulk.ensure_buckets(connections.get_minio_client(),
+                               ['raw-data', 'processed-data', os.getenv('AWS_BUCKET')])
+        if s3_mode != 'moto':
+            step9.ensure_bucket(connections.get_aws_s3_client(), os.getenv('AWS_BUCKET'))
+
+        runs = []
+        for rows in row_counts:
+            print(f"\n### {rows:,} rows ###")
+            csv_path = os.path.join(data_dir, f"nppes_synthetic_{rows}.csv")
+            stages = {}
+            for name, func in benchmark_stages(csv_path, rows):
+                stages[name] = measure(func)
+                stage = stages[name]
+                rate = f", {stage['rows_per_second']:,} rows/s" if stage['rows_per_second'] else ""
+                print(f"✓ [{name}] {stage['seconds']:.1f}s{rate}, peak RSS {stage['peak_rss_mb']:,.0f} MB")
+            runs.append({
+                'rows': rows,
+                'file_bytes': os.path.getsize(csv_path),
+                'stages': stages,
+            })
+
+        if server is not None:
+            server.stop()
+        connections.close_all()
+
+    commit = git_commit()
+    results = {
+        'commit': commit,
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        's3': s3_mode,
+        'runs': runs,
+    }
+    output_path = os.getenv('BENCHMARK_OUTPUT', os.path.join(RESULTS_DIR, f"results-{commit or 'local'}.json"))
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as output:
+        json.dump(results, output, indent=2, sort_keys=True)
+
+    print("\n" + "=" * 70)
+    print(f"Results: {output_path}")
+    print("=" * 70)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Shared connection factory: cached boto3 clients for MinIO and AWS S3 and a
+pooled PostgreSQL connection, so steps chained in one process reuse warm
+connections instead of rebuilding sessions and TCP/TLS setup each time
+"""
+import os
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from urllib.parse import urlparse
+import boto3
+from botocore.config import Config
+from psycopg2 import extensions, pool
+
+import metrics
+
+MAX_POOL_CONNECTIONS = 32
+
+_pg_pool = None
+_pg_pool_lock = threading.Lock()
+
+
+class CountingCursor(extensions.cursor):
+    """psycopg2 cursor that counts its round trips for metrics"""
+
+    def execute(self, query, vars=None):
+        metrics.count_pg_call('execute')
+        return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        metrics.count_pg_call('executemany')
+        return super().executemany(query, vars_list)
+
+    def copy_expert(self, sql, file, size=8192):
+        metrics.count_pg_call('copy_expert')
+        return super().copy_expert(sql, file, size)
+
+
+def _client_config():
+    """Connection pool, retries and keep-alive shared by every boto3 client"""
+    return Config(
+        signature_version='s3v4',
+        max_pool_connections=int(os.getenv('S3_MAX_POOL_CONNECTIONS', MAX_POOL_CONNECTIONS)),
+        retries={'max_attempts': 5, 'mode': 'adaptive'},
+        tcp_keepalive=True,
+        connect_timeout=10,
+        read_timeout=120
+    )
+
+
+@lru_cache(maxsize=None)
+def get_minio_client():
+    """boto3 S3 client for MinIO, created once per process"""
+    client = boto3.client(
+        's3',
+        endpoint_url=os.getenv('MINIO_ENDPOINT'),
+        aws_access_key_id=os.getenv('MINIO_ACCESS_KEY'),
+        aws_secret_access_key=os.getenv('MINIO_SECRET_KEY'),
+        config=_client_config(),
+        region_name='us-east-1'
+    )
+    return metrics.instrument_s3_client(client, 'minio')
+
+
+@lru_cache(maxsize=None)
+def get_aws_s3_client():
+    """boto3 S3 client for AWS (profile from .env), created once per process"""
+    session = boto3.Session(profile_name=os.getenv('AWS_PROFILE'))
+    client = session.client('s3', region_name=os.getenv('AWS_REGION'), config=_client_config())
+    return metrics.instrument_s3_client(client, 'aws')
+
+
+def _sql_literal(value):
+    """DuckDB literal for a SET value"""
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def configure_duckdb_minio(conn):
+    """
+    Load httpfs on a DuckDB connection and point its S3 settings at MinIO,
+    so queries can read s3://bucket/key and COPY results straight back
+    """
+    endpoint = urlparse(os.getenv('MINIO_ENDPOINT'))
+    conn.execute("INSTALL httpfs")
+    conn.execute("LOAD httpfs")
+    settings = {
+        's3_endpoint': endpoint.netloc or endpoint.path,
+        's3_use_ssl': endpoint.scheme == 'https',
+        's3_url_style': 'path',
+        's3_region': 'us-east-1',
+        's3_access_key_id': os.getenv('MINIO_ACCESS_KEY'),
+        's3_secret_access_key': os.getenv('MINIO_SECRET_KEY'),
+    }
+    for name, value in settings.items():
+        conn.execute(f"SET {name} = {_sql_literal(value)}")
+    return conn
+
+
+def get_pg_pool():
+    """Process-wide ThreadedConnectionPool for PostgreSQL"""
+    global _pg_pool
+    with _pg_pool_lock:
+        if _pg_pool is None or _pg_pool.closed:
+            _pg_pool = pool.ThreadedConnectionPool(
+                minconn=1,
+                maxconn=int(os.getenv('POSTGRES_POOL_SIZE', '8')),
+                host=os.getenv('POSTGRES_HOST'),
+                port=os.getenv('POSTGRES_PORT'),
+                database=os.getenv('POSTGRES_DB'),
+                user=os.getenv('POSTGRES_USER'),
+                password=os.getenv('POSTGRES_PASSWORD'),
+                keepalives=1,
+                keepalives_idle=30,
+                cursor_factory=CountingCursor
+            )
+        return _pg_pool
+
+
+@contextmanager
+def pg_connection():
+    """
+    Borrow a pooled PostgreSQL connection.
+    Uncommitted work is rolled back before the connection goes back;
+    a connection that cannot be rolled back is closed instead of reused.
+    """
+    pg_pool = get_pg_pool()
+    conn = pg_pool.getconn()
+    try:
+        yield conn
+    finally:
+        broken = bool(conn.closed)
+        try:
+            if not broken:
+                conn.rollback()
+        except Exception:
+            broken = True
+            raise
+        finally:
+            pg_pool.putconn(conn, close=broken)
+
+
+def close_all():
+    """Close pooled PostgreSQL connections (boto3 clients need no cleanup)"""
+    global _pg_pool
+    with _pg_pool_lock:
+        if _pg_pool is not None and not _pg_pool.closed:
+            _pg_pool.closeall()
+        _pg_pool = None
@@ -0,0 +1,176 @@
+"""
+In-memory handoff helpers for the processed cardiology data: an explicit
+Arrow schema, Parquet (de)serialization over zero-copy buffers, and CSV
+rendering in bounded chunks where PostgreSQL COPY still needs text
+"""
+import hashlib
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+DEFAULT_CHUNK_ROWS = 50_000
+
+# pyarrow.compute is imported where it is used: provider_index imports this
+# module on a Lambda cold start
+
+# NPI as an integer; low-cardinality text columns dictionary-encoded;
+# taxonomy_codes holds every matched code (specialty_code is the first)
+PROCESSED_SCHEMA = pa.schema([
+    pa.field('NPI', pa.int64(), nullable=False),
+    pa.field('provider_state', pa.dictionary(pa.int16(), pa.string())),
+    pa.field('provider_city', pa.dictionary(pa.int32(), pa.string())),
+    pa.field('specialty_code', pa.dictionary(pa.int16(), pa.string())),
+    pa.field('enumeration_year', pa.int16()),
+    pa.field('is_active', pa.bool_(), nullable=False),
+    pa.field('taxonomy_codes', pa.list_(pa.string())),
+])
+
+DICTIONARY_COLUMNS = ['provider_state', 'provider_city', 'specialty_code']
+
+
+def to_processed(table):
+    """
+    Cast a table with the processed column names to PROCESSED_SCHEMA.
+    enumeration_year, is_active and taxonomy_codes were added later; when
+    missing the year is null, every provider is active and the codes are
+    [specialty_code]. Extra columns (other transform spec outputs) are
+    kept, after the processed ones.
+    """
+    if 'enumeration_year' not in table.column_names:
+        table = table.append_column('enumeration_year', pa.nulls(table.num_rows, pa.int16()))
+    if 'is_active' not in table.column_names:
+        table = table.append_column('is_active', pa.repeat(True, table.num_rows))
+    if 'taxonomy_codes' not in table.column_names:
+        table = table.append_column('taxonomy_codes', _single_code_lists(table['specialty_code']))
+    extra = [name for name in table.column_names if name not in PROCESSED_SCHEMA.names]
+    schema = pa.schema(list(PROCESSED_SCHEMA) + [table.schema.field(name) for name in extra])
+    return table.select(PROCESSED_SCHEMA.names + extra).cast(schema)
+
+
+def _single_code_lists(column):
+    """[code] per row, [] where the code is null"""
+    import pyarrow.compute as pc
+
+    codes = column.combine_chunks()
+    if pa.types.is_dictionary(codes.type):
+        codes = codes.dictionary_decode()
+    present = codes.is_valid()
+    offsets = pa.concat_arrays([
+        pa.array([0], pa.int32()), pc.cumulative_sum(present.cast(pa.int32()))
+    ])
+    return pa.ListArray.from_arrays(offsets, codes.cast(pa.string()).filter(present))
+
+
+def to_parquet_buffer(table, compression='zstd'):
+    """Serialize a table to an in-memory Parquet buffer (pa.Buffer)"""
+    sink = pa.BufferOutputStream()
+    pq.write_table(table, sink, compression=compression)
+    return sink.getvalue()
+
+
+def read_parquet_bytes(data):
+    """
+    Parse Parquet from bytes without copying them.
+    Dictionary columns come back dictionary-encoded.
+    """
+    return pq.read_table(pa.BufferReader(data), read_dictionary=DICTIONARY_COLUMNS)
+
+
+def _pg_array_text(column):
+    """
+    A list<string> array as PostgreSQL array literals ({"a","b"}), the text
+    COPY reads into a TEXT[] column; null lists stay null
+    """
+    import pyarrow.compute as pc
+
+    elements = pc.replace_substring_regex(column.flatten(), r'(["\\])', r'\\\1')
+    elements = pc.fill_null(pc.binary_join_element_wise('"', elements, '"', ''), 'NULL')
+    offsets = pc.subtract(column.offsets, column.offsets[0])
+    joined = pc.binary_join(pa.ListArray.from_arrays(offsets, elements), ',')
+    return pc.if_else(column.is_valid(), pc.binary_join_element_wise('{', joined, '}', ''), None)
+
+
+def _decoded(batch):
+    """
+    Record batch with dictionary columns decoded and list columns as
+    PostgreSQL array literals (the CSV writer needs plain types)
+    """
+    columns = []
+    for column in batch.columns:
+        if pa.types.is_dictionary(column.type):
+            column = column.dictionary_decode()
+        elif pa.types.is_list(column.type):
+            column = _pg_array_text(column)
+        columns.append(column)
+    return pa.RecordBatch.from_arrays(columns, names=batch.schema.names)
+
+
+def iter_csv_chunks(batches):
+    """Yield UTF-8 CSV bytes for each record batch, header first"""
+    header = True
+    for batch in batches:
+        sink = pa.BufferOutputStream()
+        pa_csv.write_csv(_decoded(batch), sink, write_options=pa_csv.WriteOptions(include_header=header))
+        header = False
+        yield sink.getvalue().to_pybytes()
+
+
+class _HashSink:
+    """Writable file object that only feeds a hash"""
+
+    def __init__(self, sha256):
+        self._sha256 = sha256
+        self.closed = False
+
+    def write(self, data):
+        self._sha256.update(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def content_sha256(table):
+    """
+    SHA-256 of a table's values as one Arrow IPC stream, independent of
+    chunking, dictionary encoding and schema metadata, so equal extracts
+    get equal fingerprints. Unlike CSV, IPC handles every type (e.g. the
+    list columns of the enriched spec).
+    """
+    columns = [
+        column.cast(column.type.value_type) if pa.types.is_dictionary(column.type) else column
+        for column in table.columns
+    ]
+    table = pa.table(columns, names=table.column_names).combine_chunks()
+    sha256 = hashlib.sha256()
+    with pa.ipc.new_stream(_HashSink(sha256), table.schema) as writer:
+        writer.write_table(table)
+    return sha256.hexdigest()
+
+
+def table_batches(table, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Record batches of at most chunk_rows rows (zero-copy slices)"""
+    return table.to_batches(max_chunksize=chunk_rows)
+
+
+class CsvStream:
+    """Readable byte stream over iter_csv_chunks (e.g. for COPY FROM STDIN)"""
+
+    def __init__(self, batches):
+        self._chunks = iter_csv_chunks(batches)
+        self._buffer = b''
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        if size < 0:
+            data, self._buffer = self._buffer, b''
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
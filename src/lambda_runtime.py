@@ -0,0 +1,55 @@
+"""
+Start-up and shared helpers for the Lambda handlers (steps 11 and 12).
+Only the standard library is imported here; numpy, pyarrow and boto3 are
+imported on the first request that needs the provider index, so the
+init phase stays short. Module-level state (the index, the S3 client)
+is kept between warm invocations.
+
+    LAMBDA_PRELOAD=true   load the index during init instead, for
+                          provisioned concurrency or SnapStart snapshots
+"""
+import base64
+import gzip
+import json
+import os
+
+
+def get_index():
+    """The cached ProviderIndex (imports provider_index on first use)"""
+    import provider_index
+    return provider_index.cached_index()
+
+
+def _after_restore():
+    # Connections in a restored snapshot are stale; reconnect lazily
+    import provider_index
+    provider_index.reset_clients()
+
+
+def preload():
+    """Import and load everything during init if LAMBDA_PRELOAD is set"""
+    if os.getenv('LAMBDA_PRELOAD', 'false').lower() == 'true':
+        get_index()
+        try:
+            from snapshot_restore_py import register_after_restore
+        except ImportError:  # not running under SnapStart
+            return
+        register_after_restore(_after_restore)
+
+
+def response(status, body, gzip_body=False):
+    """API Gateway proxy response with a JSON body, optionally gzipped"""
+    headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*'
+    }
+    payload = json.dumps(body)
+    if not gzip_body:
+        return {'statusCode': status, 'headers': headers, 'body': payload}
+    headers['Content-Encoding'] = 'gzip'
+    return {
+        'statusCode': status,
+        'headers': headers,
+        'isBase64Encoded': True,
+        'body': base64.b64encode(gzip.compress(payload.encode('utf-8'))).decode('ascii')
+    }
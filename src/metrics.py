@@ -0,0 +1,210 @@
+"""
+Stage instrumentation: wrap a unit of work in `stage(name)` (or decorate it
+with `instrumented(name)`) to emit one JSON line with its duration,
+rows/bytes in and out, peak RSS and the S3/PostgreSQL calls made meanwhile.
+
+    METRICS=off          disable
+    METRICS_PATH=file    append JSON lines to a file (default: stderr)
+    METRICS_PROFILE=cprofile|pyinstrument
+                         profile every stage into METRICS_PROFILE_DIR
+"""
+import contextvars
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+COUNTERS = ('rows_in', 'rows_out', 'bytes_read', 'bytes_written')
+DEFAULT_PROFILE_DIR = 'profiles'
+
+_current = contextvars.ContextVar('metrics_stage', default=None)
+_lock = threading.Lock()
+_s3_calls = Counter()
+_pg_calls = Counter()
+
+
+def enabled():
+    return os.getenv('METRICS', 'on').lower() not in ('off', '0', 'false')
+
+
+def count_s3_call(name):
+    with _lock:
+        _s3_calls[name] += 1
+
+
+def count_pg_call(name):
+    with _lock:
+        _pg_calls[name] += 1
+
+
+def instrument_s3_client(client, store):
+    """Count every API call made by a boto3 S3 client as '<store>.<Operation>'"""
+    def before_call(model=None, **kwargs):
+        count_s3_call(f"{store}.{model.name}")
+    client.meta.events.register('before-call.s3', before_call)
+    return client
+
+
+def _snapshot():
+    with _lock:
+        return Counter(_s3_calls), Counter(_pg_calls)
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # KiB on Linux, bytes on macOS
+    return round(peak / (1024**2 if sys.platform == 'darwin' else 1024), 1)
+
+
+def emit(event):
+    """Write one JSON line to METRICS_PATH or stderr"""
+    line = json.dumps(event, default=str, sort_keys=True) + '\n'
+    path = os.getenv('METRICS_PATH')
+    with _lock:
+        if path:
+            with open(path, 'a', encoding='utf-8') as output:
+                output.write(line)
+        else:
+            sys.stderr.write(line)
+
+
+class StageMetrics:
+    """Counters of one running stage; add to them with record()"""
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = dict(fields)
+        self.counters = dict.fromkeys(COUNTERS, 0)
+
+    def record(self, **values):
+        for key, value in values.items():
+            if key in self.counters:
+                self.counters[key] += value or 0
+            else:
+                self.fields[key] = value
+
+
+def record(**values):
+    """Add rows/bytes (or extra fields) to the innermost running stage"""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.record(**values)
+
+
+def _start_profiler():
+    """(kind, profiler) for METRICS_PROFILE, or None"""
+    kind = os.getenv('METRICS_PROFILE')
+    if kind == 'cprofile':
+        import cProfile
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another thread's stage holds the profiler (Python 3.12+)
+            return None
+    elif kind == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            raise ImportError("METRICS_PROFILE=pyinstrument needs pyinstrument (pip install pyinstrument)")
+        profiler = Profiler()
+        profiler.start()
+    else:
+        return None
+    return kind, profiler
+
+
+def _stop_profiler(name, started):
+    """Stop a profiler and write its report; returns the report path"""
+    kind, profiler = started
+    profile_dir = os.getenv('METRICS_PROFILE_DIR', DEFAULT_PROFILE_DIR)
+    os.makedirs(profile_dir, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    if kind == 'cprofile':
+        profiler.disable()
+        path = os.path.join(profile_dir, f"{name}-{stamp}.prof")
+        profiler.dump_stats(path)
+    else:
+        profiler.stop()
+        path = os.path.join(profile_dir, f"{name}-{stamp}.html")
+        with open(path, 'w', encoding='utf-8') as output:
+            output.write(profiler.output_html())
+    return path
+
+
+@contextmanager
+def stage(name, **fields):
+    """
+    Measure the enclosed block as stage `name`.
+    S3/PostgreSQL call counts are process-wide deltas, so stages running
+    concurrently see each other's calls. cProfile only sees this thread.
+    """
+    if not enabled():
+        yield StageMetrics(name, fields)
+        return
+
+    metrics = StageMetrics(name, fields)
+    # Only the outermost stage in a thread is profiled
+    outermost = _current.get() is None
+    token = _current.set(metrics)
+    s3_before, pg_before = _snapshot()
+    rss_before = _peak_rss_mb()
+    profiler = _start_profiler() if outermost else None
+    started_at = datetime.now(timezone.utc).isoformat(timespec='milliseconds')
+    start = time.perf_counter()
+    status = 'ok'
+    try:
+        yield metrics
+    except BaseException:
+        status = 'error'
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        profile_path = _stop_profiler(name, profiler) if profiler else None
+        _current.reset(token)
+        s3_after, pg_after = _snapshot()
+        s3_calls = dict(s3_after - s3_before)
+        pg_calls = dict(pg_after - pg_before)
+        rss_after = _peak_rss_mb()
+        event = {
+            'event': 'stage',
+            'stage': name,
+            'status': status,
+            'started_at': started_at,
+            'duration_seconds': round(duration, 4),
+            **metrics.counters,
+            'peak_rss_mb': rss_after,
+            'peak_rss_growth_mb': round(rss_after - rss_before, 1) if rss_after is not None else None,
+            's3_calls': s3_calls,
+            's3_calls_total': sum(s3_calls.values()),
+            'pg_calls': pg_calls,
+            'pg_calls_total': sum(pg_calls.values()),
+            'pid': os.getpid(),
+            **metrics.fields,
+        }
+        if profile_path:
+            event['profile'] = profile_path
+        emit(event)
+
+
+def instrumented(name):
+    """Decorator form of stage(name)"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,271 @@
+"""
+NPPES extract helpers: bounded-memory DuckDB scans over the full NPPES file
+"""
+import os
+import re
+import time
+import duckdb
+
+import connections
+
+# Source columns in the NPPES monthly file
+NPI_COLUMN = 'NPI'
+STATE_COLUMN = 'Provider Business Practice Location Address State Name'
+CITY_COLUMN = 'Provider Business Practice Location Address City Name'
+TAXONOMY_COLUMN = 'Healthcare Provider Taxonomy Code_1'
+DEACTIVATION_DATE_COLUMN = 'NPI Deactivation Date'
+REACTIVATION_DATE_COLUMN = 'NPI Reactivation Date'
+ENUMERATION_DATE_COLUMN = 'Provider Enumeration Date'
+TAXONOMY_COLUMNS = [f'Healthcare Provider Taxonomy Code_{slot}' for slot in range(1, 16)]
+
+# Cardiovascular disease plus its subspecialties; override with TAXONOMY_CODES
+CARDIOLOGY_TAXONOMIES = (
+    '207RC0000X',  # Cardiovascular Disease
+    '207RI0011X',  # Interventional Cardiology
+    '207RC0001X',  # Clinical Cardiac Electrophysiology
+    '207RA0001X',  # Advanced Heart Failure and Transplant Cardiology
+    '2080P0202X',  # Pediatric Cardiology
+)
+
+TAXONOMY_CODE_PATTERN = re.compile(r'^[0-9A-Z]{9}X$')
+
+# Hive partition columns written by nppes_parquet.py
+PARTITION_COLUMNS = {
+    'state': 'practice_state',
+    'taxonomy_family': 'taxonomy_family',
+}
+
+DEFAULT_MEMORY_LIMIT = '3GB'
+
+
+def connect(memory_limit=None, threads=None, temp_directory=None, minio=False):
+    """
+    Open a DuckDB connection with a memory ceiling.
+    Anything above the limit spills to temp_directory instead of failing.
+    With minio=True, s3:// paths resolve against MinIO (httpfs).
+    """
+    memory_limit = memory_limit or os.getenv('DUCKDB_MEMORY_LIMIT', DEFAULT_MEMORY_LIMIT)
+    threads = threads or os.getenv('DUCKDB_THREADS')
+    temp_directory = temp_directory or os.getenv('DUCKDB_TEMP_DIR')
+
+    conn = duckdb.connect(':memory:')
+    conn.execute(f"SET memory_limit = '{memory_limit}'")
+    if threads:
+        conn.execute(f"SET threads = {int(threads)}")
+    if temp_directory:
+        conn.execute(f"SET temp_directory = '{temp_directory}'")
+
+    # Row order does not matter for the extract; this lets COPY stream
+    # batches out as soon as they are filtered instead of buffering them
+    conn.execute("SET preserve_insertion_order = false")
+    if minio:
+        connections.configure_duckdb_minio(conn)
+    return conn
+
+
+def is_s3_url(path):
+    """True for s3://bucket/key paths (read through httpfs)"""
+    return bool(path) and path.startswith('s3://')
+
+
+def csv_source(path):
+    """
+    read_csv() call for the raw NPPES file.
+    Every column is read as text so DuckDB skips type sniffing on 330 columns;
+    NPI is cast explicitly in the SELECT.
+    """
+    return f"read_csv('{path}', header = true, all_varchar = true)"
+
+
+def parquet_source(path):
+    """read_parquet() call for a directory compiled by nppes_parquet.py"""
+    return f"read_parquet('{path}/**/*.parquet', hive_partitioning = true)"
+
+
+def parquet_source_file(path):
+    """read_parquet() call for a single Parquet file or s3:// object"""
+    return f"read_parquet('{path}')"
+
+
+def parquet_partition_column(path):
+    """Partition column of a compiled Parquet directory, or None"""
+    for name in sorted(os.listdir(path)):
+        column = name.split('=', 1)[0]
+        if '=' in name and column in PARTITION_COLUMNS.values():
+            return column
+    return None
+
+
+def nppes_source(csv_path=None, parquet_path=None):
+    """
+    Source relation for extract queries.
+    Prefers the compiled Parquet (NPPES_PARQUET_PATH) over the raw CSV.
+    Returns (source_sql, partition_column).
+    """
+    parquet_path = parquet_path or os.getenv('NPPES_PARQUET_PATH')
+    if is_s3_url(parquet_path):
+        return parquet_source(parquet_path.rstrip('/')), None
+    if parquet_path and os.path.isdir(parquet_path):
+        return parquet_source(parquet_path), parquet_partition_column(parquet_path)
+    return csv_source(csv_path), None
+
+
+def taxonomy_codes(codes=None):
+    """
+    Taxonomy codes to match, from the argument, TAXONOMY_CODES, or the
+    cardiology default. Codes are validated since they are inlined into SQL.
+    """
+    if codes is None:
+        env_codes = os.getenv('TAXONOMY_CODES')
+        codes = env_codes.split(',') if env_codes else CARDIOLOGY_TAXONOMIES
+    codes = tuple(code.strip().upper() for code in codes if code.strip())
+    for code in codes:
+        if not TAXONOMY_CODE_PATTERN.match(code):
+            raise ValueError(f"Invalid taxonomy code: {code}")
+    if not codes:
+        raise ValueError("At least one taxonomy code is required")
+    return codes
+
+
+def sql_list(values):
+    """DuckDB list literal for validated string values"""
+    return '[' + ', '.join(f"'{value}'" for value in values) + ']'
+
+
+def taxonomy_slots_sql():
+    """All 15 taxonomy slots as one DuckDB list expression"""
+    return '[' + ', '.join(f'"{column}"' for column in TAXONOMY_COLUMNS) + ']'
+
+
+def matched_taxonomies_sql(codes):
+    """Taxonomy slots whose code is in `codes`, in slot order (first = primary match)"""
+    return f"list_filter({taxonomy_slots_sql()}, code -> list_contains({sql_list(codes)}, code))"
+
+
+def matched_taxonomy_sql(codes):
+    """First taxonomy slot whose code is in `codes`"""
+    return f"{matched_taxonomies_sql(codes)}[1]"
+
+
+def taxonomy_codes_sql(codes):
+    """Every distinct matched code, sorted; [] when none match"""
+    return f"list_sort(list_distinct({matched_taxonomies_sql(codes)}))"
+
+
+def pg_array_sql(expression):
+    """
+    A DuckDB list of validated codes as PostgreSQL array literal text
+    ('{A,B}'), for CSV that COPY loads into a TEXT[] column
+    """
+    return f"'{{' || array_to_string({expression}, ',') || '}}'"
+
+
+def enumeration_year_sql(column=ENUMERATION_DATE_COLUMN):
+    """Year of an NPPES MM/DD/YYYY date column; NULL when blank or malformed"""
+    return f"""CAST(year(try_strptime("{column}", '%m/%d/%Y')) AS SMALLINT)"""
+
+
+def active_sql():
+    """FALSE for an NPI deactivated and not reactivated since, else TRUE"""
+    return f"""NOT (coalesce("{DEACTIVATION_DATE_COLUMN}", '') <> ''
+                 AND coalesce("{REACTIVATION_DATE_COLUMN}", '') = '')"""
+
+
+def taxonomy_filter_sql(codes, taxonomy_index=None):
+    """
+    WHERE predicate matching any of `codes` in any slot.
+    With a taxonomy index sidecar the predicate is a semi-join on NPI,
+    so the 15 slot columns are not compared row by row.
+    """
+    if taxonomy_index:
+        return f"""CAST("{NPI_COLUMN}" AS BIGINT) IN (
+            SELECT npi FROM read_parquet('{taxonomy_index}')
+            WHERE taxonomy_code IN ({', '.join(f"'{code}'" for code in codes)})
+        )"""
+    return f"list_has_any({taxonomy_slots_sql()}, {sql_list(codes)})"
+
+
+def cardiology_query(source, limit=None, codes=None, taxonomy_index=None, select_sql=None):
+    """
+    SELECT producing the processed cardiology schema (NPI + renamed columns).
+    specialty_code is the first slot that matched the taxonomy filter and
+    taxonomy_codes every matched code.
+    select_sql replaces the column list (see transform_spec.select_sql).
+    """
+    codes = taxonomy_codes(codes)
+    select_sql = select_sql or f"""CAST("{NPI_COLUMN}" AS BIGINT) AS NPI,
+            "{STATE_COLUMN}" AS provider_state,
+            "{CITY_COLUMN}" AS provider_city,
+            {matched_taxonomy_sql(codes)} AS specialty_code,
+            {enumeration_year_sql()} AS enumeration_year,
+            {active_sql()} AS is_active,
+            {taxonomy_codes_sql(codes)} AS taxonomy_codes"""
+    query = f"""
+        SELECT
+            {select_sql}
+        FROM {source}
+        WHERE {taxonomy_filter_sql(codes, taxonomy_index)}
+    """
+    if limit:
+        query += f"\n        LIMIT {int(limit)}"
+    return query
+
+
+def delta_query(source, codes=None):
+    """
+    Classify every row of an NPPES incremental file for the target table:
+    'deactivate' for deactivated NPIs (their taxonomy fields are blank),
+    'upsert' when a taxonomy slot matches, otherwise 'delete' so providers
+    who dropped the specialty leave the table.
+    """
+    codes = taxonomy_codes(codes)
+    return f"""
+        SELECT
+            CAST("{NPI_COLUMN}" AS BIGINT) AS npi,
+            "{STATE_COLUMN}" AS provider_state,
+            "{CITY_COLUMN}" AS provider_city,
+            {matched_taxonomy_sql(codes)} AS specialty_code,
+            {taxonomy_codes_sql(codes)} AS taxonomy_codes,
+            {enumeration_year_sql()} AS enumeration_year,
+            CASE
+                WHEN NOT {active_sql()} THEN 'deactivate'
+                WHEN {taxonomy_filter_sql(codes)} THEN 'upsert'
+                ELSE 'delete'
+            END AS action
+        FROM {source}
+    """
+
+
+def taxonomy_index_path():
+    """Taxonomy index sidecar from TAXONOMY_INDEX_PATH, if it has been built"""
+    path = os.getenv('TAXONOMY_INDEX_PATH')
+    if path and os.path.exists(path):
+        return path
+    return None
+
+
+def copy_to_csv(conn, query, output_path):
+    """
+    Stream a query result to a local CSV file.
+    DuckDB writes the file chunk by chunk, so the result never sits in memory.
+    Returns (row_count, seconds).
+    """
+    start = time.perf_counter()
+    row_count = conn.execute(
+        f"COPY ({query}) TO '{output_path}' (HEADER, DELIMITER ',')"
+    ).fetchone()[0]
+    return row_count, time.perf_counter() - start
+
+
+def copy_to_parquet(conn, query, output_path):
+    """
+    Stream a query result to a Parquet file (same contract as copy_to_csv).
+    output_path may be an s3:// URL on a MinIO-enabled connection; DuckDB
+    then uploads the file in multipart chunks as it writes.
+    DuckDB dictionary-encodes repetitive columns such as state on its own.
+    """
+    start = time.perf_counter()
+    row_count = conn.execute(
+        f"COPY ({query}) TO '{output_path}' (FORMAT PARQUET, COMPRESSION ZSTD)"
+    ).fetchone()[0]
+    return row_count, time.perf_counter() - start
@@ -0,0 +1,235 @@
+"""
+Incremental NPPES ingestion: apply weekly delta files and deactivation
+reports to cardiology_providers as upserts, tracked by a watermark
+"""
+import os
+import re
+import tempfile
+from datetime import date
+from psycopg2 import sql
+
+import metrics
+import nppes_extract
+import pg_bulk_load
+import pg_rollups
+import pg_schema
+import s3_bulk
+
+RAW_BUCKET = 'raw-data'
+
+# feed name → MinIO prefix; on the same file date, later feeds apply last
+FEEDS = {
+    'weekly': 'nppes-weekly/',
+    'deactivations': 'nppes-deactivations/',
+}
+
+# File dates in CMS names: 2024-03-11 / 20240311, or MMDDYY as in the
+# weekly "..._030424_031024_V2.csv"; in either format the last date in
+# the name (the period's end) orders the file
+ISO_DATE_PATTERN = re.compile(r'(?<!\d)(20\d{2})-?(\d{2})-?(\d{2})(?!\d)')
+US_DATE_PATTERN = re.compile(r'(?<!\d)(\d{2})(\d{2})(\d{2})(?!\d)')
+
+DELTA_COLUMNS = ['npi', 'provider_state', 'provider_city', 'specialty_code', 'taxonomy_codes',
+                 'enumeration_year', 'action']
+
+WATERMARK_DDL = """
+CREATE TABLE IF NOT EXISTS nppes_watermarks (
+    feed VARCHAR(50) PRIMARY KEY,
+    last_key TEXT NOT NULL,
+    rows_applied INTEGER,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+
+def get_watermark(cursor, feed):
+    """Key of the last applied file for `feed`, or None"""
+    cursor.execute("SELECT last_key FROM nppes_watermarks WHERE feed = %s", (feed,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def file_date(key):
+    """Last date in a delta file name; raises ValueError when there is none"""
+    name = key.rsplit('/', 1)[-1]
+    matches = ISO_DATE_PATTERN.findall(name)
+    if matches:
+        year, month, day = matches[-1]
+        return date(int(year), int(month), int(day))
+    matches = US_DATE_PATTERN.findall(name)
+    if matches:
+        month, day, year = matches[-1]
+        return date(2000 + int(year), int(month), int(day))
+    raise ValueError(f"No file date in delta key '{key}'")
+
+
+def _order(feed, key):
+    return file_date(key), list(FEEDS).index(feed), key
+
+
+def pending_keys(s3, feed, watermark):
+    """Keys under the feed prefix dated after the watermark, oldest first"""
+    keys = [key for key in s3_bulk.list_keys(s3, RAW_BUCKET, FEEDS[feed]) if key.endswith('.csv')]
+    if watermark is not None:
+        keys = [key for key in keys if _order(feed, key) > _order(feed, watermark)]
+    return sorted(keys, key=lambda key: _order(feed, key))
+
+
+def pending_files(s3, watermarks):
+    """
+    (feed, key) of every pending file across the feeds, in file date order,
+    so a deactivation never overrides a later reactivation or upsert
+    """
+    files = [(feed, key) for feed in FEEDS for key in pending_keys(s3, feed, watermarks.get(feed))]
+    return sorted(files, key=lambda item: _order(*item))
+
+
+def deactivation_query(source):
+    """Deactivation reports only carry NPIs; every row is a 'deactivate'"""
+    return f"""
+        SELECT
+            CAST("{nppes_extract.NPI_COLUMN}" AS BIGINT) AS npi,
+            NULL AS provider_state,
+            NULL AS provider_city,
+            NULL AS specialty_code,
+            CAST(NULL AS VARCHAR[]) AS taxonomy_codes,
+            NULL AS enumeration_year,
+            'deactivate' AS action
+        FROM {source}
+    """
+
+
+def extract_delta(feed, local_path, output_path):
+    """
+    Classify a downloaded delta file into a CSV of DELTA_COLUMNS rows,
+    taxonomy_codes written as PostgreSQL array literals
+    """
+    source = nppes_extract.csv_source(local_path)
+    if feed == 'deactivations':
+        query = deactivation_query(source)
+    else:
+        query = nppes_extract.delta_query(source)
+    query = f"""
+        SELECT * REPLACE ({nppes_extract.pg_array_sql('taxonomy_codes')} AS taxonomy_codes)
+        FROM ({query})
+    """
+    conn = nppes_extract.connect()
+    row_count, _ = nppes_extract.copy_to_csv(conn, query, output_path)
+    conn.close()
+    return row_count
+
+
+@metrics.instrumented('incremental.apply_delta')
+def apply_delta(conn, delta_table, table, feed, key):
+    """
+    Apply staged delta rows and advance the watermark in one transaction,
+    so a file is either fully applied and recorded, or not at all.
+    Returns a dict of affected row counts.
+    """
+    cursor = conn.cursor()
+    names = {'table': sql.Identifier(table), 'delta': sql.Identifier(delta_table)}
+
+    insert = """
+        INSERT INTO {table} (npi, provider_state, provider_city, specialty_code, taxonomy_codes,
+                             enumeration_year, is_active)
+        SELECT DISTINCT ON (npi) npi, provider_state, provider_city, specialty_code, taxonomy_codes,
+               enumeration_year, TRUE
+        FROM {delta}
+        WHERE action = 'upsert'
+        ORDER BY npi
+    """
+    # Rollups follow the changed NPIs in the same transaction
+    with pg_rollups.tracking(cursor, delta_table, table):
+        if pg_schema.is_partitioned(conn, table):
+            # No unique constraint on npi alone: replace the rows instead
+            cursor.execute(sql.SQL("""
+                DELETE FROM {table} t
+                USING {delta} d
+                WHERE t.npi = d.npi AND d.action = 'upsert'
+            """).format(**names))
+            cursor.execute(sql.SQL(insert).format(**names))
+        else:
+            cursor.execute(sql.SQL(insert + """
+            ON CONFLICT (npi) DO UPDATE SET
+                provider_state = EXCLUDED.provider_state,
+                provider_city = EXCLUDED.provider_city,
+                specialty_code = EXCLUDED.specialty_code,
+                taxonomy_codes = EXCLUDED.taxonomy_codes,
+                enumeration_year = EXCLUDED.enumeration_year,
+                is_active = TRUE
+            """).format(**names))
+        upserted = cursor.rowcount
+
+        cursor.execute(sql.SQL("""
+            DELETE FROM {table} t
+            USING {delta} d
+            WHERE t.npi = d.npi AND d.action = 'delete'
+        """).format(**names))
+        deleted = cursor.rowcount
+
+        cursor.execute(sql.SQL("""
+            UPDATE {table} t
+            SET is_active = FALSE
+            FROM {delta} d
+            WHERE t.npi = d.npi AND d.action = 'deactivate' AND t.is_active
+        """).format(**names))
+        deactivated = cursor.rowcount
+
+    cursor.execute("""
+        INSERT INTO nppes_watermarks (feed, last_key, rows_applied, applied_at)
+        VALUES (%s, %s, %s, CURRENT_TIMESTAMP)
+        ON CONFLICT (feed) DO UPDATE SET
+            last_key = EXCLUDED.last_key,
+            rows_applied = EXCLUDED.rows_applied,
+            applied_at = EXCLUDED.applied_at
+    """, (feed, key, upserted + deleted + deactivated))
+
+    cursor.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(delta_table)))
+    conn.commit()
+    cursor.close()
+    metrics.record(rows_out=upserted + deleted + deactivated, feed=feed, key=key)
+    return {'upserted': upserted, 'deleted': deleted, 'deactivated': deactivated}
+
+
+@metrics.instrumented('incremental.apply_pending')
+def apply_pending(conn, s3, table='cardiology_providers'):
+    """
+    Apply every delta file newer than its feed's watermark, across feeds in
+    file date order. Returns a list of (feed, key, counts) for the applied files.
+    """
+    cursor = conn.cursor()
+    cursor.execute(WATERMARK_DDL)
+    conn.commit()
+
+    delta_table = f"{table}_delta"
+    applied = []
+    watermarks = {feed: get_watermark(cursor, feed) for feed in FEEDS}
+    for feed, key in pending_files(s3, watermarks):
+        with tempfile.TemporaryDirectory(dir=os.getenv('NPPES_WORK_DIR')) as work_dir:
+            local_path = os.path.join(work_dir, 'delta.csv')
+            output_path = os.path.join(work_dir, 'delta_classified.csv')
+            s3.download_file(RAW_BUCKET, key, local_path)
+            delta_rows = extract_delta(feed, local_path, output_path)
+            metrics.record(bytes_read=os.path.getsize(local_path), rows_in=delta_rows)
+
+            cursor.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(sql.Identifier(delta_table)))
+            cursor.execute(sql.SQL("""
+                CREATE UNLOGGED TABLE {} (
+                    npi BIGINT,
+                    provider_state VARCHAR(2),
+                    provider_city VARCHAR(100),
+                    specialty_code VARCHAR(20),
+                    taxonomy_codes TEXT[],
+                    enumeration_year SMALLINT,
+                    action VARCHAR(10)
+                )
+            """).format(sql.Identifier(delta_table)))
+            conn.commit()
+
+            with open(output_path, 'rb') as stream:
+                pg_bulk_load.copy_stream(conn, stream, delta_table, DELTA_COLUMNS)
+        counts = apply_delta(conn, delta_table, table, feed, key)
+        applied.append((feed, key, counts))
+    cursor.close()
+    metrics.record(rows_out=sum(sum(counts.values()) for _, _, counts in applied), files=len(applied))
+    return applied
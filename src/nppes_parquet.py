@@ -0,0 +1,100 @@
+"""
+Compile stage: convert the raw NPPES CSV to partitioned Parquet once,
+so later extract runs skip CSV parsing entirely. The gain is columnar
+reads; the cardiology filter matches all 15 taxonomy slots, so it reads
+every partition under either layout.
+"""
+import os
+import time
+from pathlib import Path
+from dotenv import load_dotenv
+
+import connections
+import nppes_extract
+import s3_bulk
+
+load_dotenv()
+
+PARQUET_PREFIX = 'nppes-parquet'
+
+
+def compile_to_parquet(conn, csv_path, output_dir, partition_by='state'):
+    """
+    Rewrite the NPPES CSV as hive-partitioned Parquet.
+    partition_by is 'state' (practice location state) or 'taxonomy_family'
+    (first four characters of the primary taxonomy code only, so it cannot
+    prune a filter over all 15 slots).
+    Returns (row_count, seconds).
+    """
+    if partition_by == 'state':
+        partition_expr = f'"{nppes_extract.STATE_COLUMN}"'
+    elif partition_by == 'taxonomy_family':
+        partition_expr = f'left("{nppes_extract.TAXONOMY_COLUMN}", 4)'
+    else:
+        raise ValueError(f"Unknown partition_by: {partition_by}")
+    partition_column = nppes_extract.PARTITION_COLUMNS[partition_by]
+
+    start = time.perf_counter()
+    row_count = conn.execute(f"""
+        COPY (
+            SELECT
+                * REPLACE (CAST("{nppes_extract.NPI_COLUMN}" AS BIGINT) AS "{nppes_extract.NPI_COLUMN}"),
+                coalesce({partition_expr}, 'UNKNOWN') AS {partition_column}
+            FROM {nppes_extract.csv_source(csv_path)}
+        ) TO '{output_dir}' (
+            FORMAT PARQUET,
+            PARTITION_BY ({partition_column}),
+            COMPRESSION ZSTD,
+            OVERWRITE_OR_IGNORE
+        )
+    """).fetchone()[0]
+    return row_count, time.perf_counter() - start
+
+
+def upload_parquet_dir(s3, output_dir, bucket, prefix=PARQUET_PREFIX):
+    """
+    Upload every Parquet file under output_dir concurrently, keeping the
+    partition layout. Returns (files, bytes).
+    """
+    files = {
+        f"{prefix}/{path.relative_to(output_dir).as_posix()}": str(path)
+        for path in Path(output_dir).rglob('*.parquet')
+    }
+    results = s3_bulk.upload_files(s3, files, bucket)
+    return len(results), sum(result['bytes'] for result in results)
+
+
+def main():
+    print("=" * 70)
+    print("Compile: NPPES CSV → Partitioned Parquet")
+    print("=" * 70)
+
+    csv_path = os.getenv('NPPES_FILE_PATH')
+    output_dir = os.getenv('NPPES_PARQUET_PATH', 'data/nppes_parquet')
+    partition_by = os.getenv('NPPES_PARQUET_PARTITION', 'state')
+
+    print("\n### Step 1: Convert CSV to Parquet ###")
+    conn = nppes_extract.connect()
+    row_count, seconds = compile_to_parquet(conn, csv_path, output_dir, partition_by)
+    conn.close()
+
+    parquet_bytes = sum(p.stat().st_size for p in Path(output_dir).rglob('*.parquet'))
+    csv_bytes = os.path.getsize(csv_path)
+    print(f"✓ Converted {row_count:,} records in {seconds:.1f}s ({row_count / seconds:,.0f} rows/s)")
+    print(f"✓ Partitioned by: {partition_by}")
+    print(f"✓ Size: {csv_bytes / 1024**3:.2f} GB CSV → {parquet_bytes / 1024**3:.2f} GB Parquet")
+
+    # Optional: keep a copy in MinIO next to the raw data
+    if os.getenv('NPPES_PARQUET_UPLOAD', 'false').lower() == 'true':
+        print("\n### Step 2: Upload to MinIO ###")
+        s3 = connections.get_minio_client()
+        uploaded, total_bytes = upload_parquet_dir(s3, output_dir, 'raw-data')
+        print(f"✓ Uploaded {uploaded} files ({total_bytes:,} bytes) to s3://raw-data/{PARQUET_PREFIX}/")
+
+    print("\n" + "=" * 70)
+    print("Compile Complete!")
+    print("=" * 70)
+    print(f"✓ Set NPPES_PARQUET_PATH={output_dir} so step 6 reads Parquet")
+
+if __name__ == "__main__":
+    main()
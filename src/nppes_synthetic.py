@@ -0,0 +1,168 @@
+"""
+Synthetic NPPES monthly files: the real 330-column header with plausible
+values in the columns the pipeline reads, for benchmarks without the
+9 GB download
+"""
+import os
+import random
+import time
+
+import nppes_extract
+
+BASE_COLUMNS = [
+    'NPI',
+    'Entity Type Code',
+    'Replacement NPI',
+    'Employer Identification Number (EIN)',
+    'Provider Organization Name (Legal Business Name)',
+    'Provider Last Name (Legal Name)',
+    'Provider First Name',
+    'Provider Middle Name',
+    'Provider Name Prefix Text',
+    'Provider Name Suffix Text',
+    'Provider Credential Text',
+    'Provider Other Organization Name',
+    'Provider Other Organization Name Type Code',
+    'Provider Other Last Name',
+    'Provider Other First Name',
+    'Provider Other Middle Name',
+    'Provider Other Name Prefix Text',
+    'Provider Other Name Suffix Text',
+    'Provider Other Credential Text',
+    'Provider Other Last Name Type Code',
+    'Provider First Line Business Mailing Address',
+    'Provider Second Line Business Mailing Address',
+    'Provider Business Mailing Address City Name',
+    'Provider Business Mailing Address State Name',
+    'Provider Business Mailing Address Postal Code',
+    'Provider Business Mailing Address Country Code (If outside U.S.)',
+    'Provider Business Mailing Address Telephone Number',
+    'Provider Business Mailing Address Fax Number',
+    'Provider First Line Business Practice Location Address',
+    'Provider Second Line Business Practice Location Address',
+    'Provider Business Practice Location Address City Name',
+    'Provider Business Practice Location Address State Name',
+    'Provider Business Practice Location Address Postal Code',
+    'Provider Business Practice Location Address Country Code (If outside U.S.)',
+    'Provider Business Practice Location Address Telephone Number',
+    'Provider Business Practice Location Address Fax Number',
+    'Provider Enumeration Date',
+    'Last Update Date',
+    'NPI Deactivation Reason Code',
+    'NPI Deactivation Date',
+    'NPI Reactivation Date',
+    'Provider Gender Code',
+    'Authorized Official Last Name',
+    'Authorized Official First Name',
+    'Authorized Official Middle Name',
+    'Authorized Official Title or Position',
+    'Authorized Official Telephone Number',
+]
+
+TRAILING_COLUMNS = [
+    'Is Sole Proprietor',
+    'Is Organization Subpart',
+    'Parent Organization LBN',
+    'Parent Organization TIN',
+    'Authorized Official Name Prefix Text',
+    'Authorized Official Name Suffix Text',
+    'Authorized Official Credential Text',
+]
+
+
+def nppes_header():
+    """The 330 column names of the NPPES monthly dissemination file, in order"""
+    columns = list(BASE_COLUMNS)
+    for slot in range(1, 16):
+        columns += [
+            f'Healthcare Provider Taxonomy Code_{slot}',
+            f'Provider License Number_{slot}',
+            f'Provider License Number State Code_{slot}',
+            f'Healthcare Provider Primary Taxonomy Switch_{slot}',
+        ]
+    for slot in range(1, 51):
+        columns += [
+            f'Other Provider Identifier_{slot}',
+            f'Other Provider Identifier Type Code_{slot}',
+            f'Other Provider Identifier State_{slot}',
+            f'Other Provider Identifier Issuer_{slot}',
+        ]
+    columns += TRAILING_COLUMNS
+    columns += [f'Healthcare Provider Taxonomy Group_{slot}' for slot in range(1, 16)]
+    columns.append('Certification Date')
+    return columns
+
+
+NPPES_HEADER = nppes_header()
+
+STATES = {
+    'CA': ['LOS ANGELES', 'SAN FRANCISCO', 'SAN DIEGO', 'SACRAMENTO'],
+    'TX': ['HOUSTON', 'DALLAS', 'AUSTIN', 'SAN ANTONIO'],
+    'NY': ['NEW YORK', 'BROOKLYN', 'ROCHESTER', 'BUFFALO'],
+    'FL': ['MIAMI', 'TAMPA', 'ORLANDO', 'JACKSONVILLE'],
+    'IL': ['CHICAGO', 'SPRINGFIELD', 'PEORIA'],
+    'PA': ['PHILADELPHIA', 'PITTSBURGH', 'HARRISBURG'],
+    'OH': ['COLUMBUS', 'CLEVELAND', 'CINCINNATI'],
+    'MA': ['BOSTON', 'WORCESTER', 'SPRINGFIELD'],
+    'WA': ['SEATTLE', 'SPOKANE', 'TACOMA'],
+    'PR': ['SAN JUAN', 'PONCE'],
+}
+LAST_NAMES = ['SMITH', 'JOHNSON', 'WILLIAMS', 'BROWN', 'GARCIA', "O'BRIEN", 'NGUYEN', 'PATEL']
+FIRST_NAMES = ['JAMES', 'MARY', 'ROBERT', 'PATRICIA', 'MICHAEL', 'LINDA', 'WEI', 'PRIYA']
+CREDENTIALS = ['M.D.', 'MD', 'D.O.', 'M.D., FACC', 'NP', 'PA-C', '']
+OTHER_TAXONOMIES = ['207Q00000X', '363L00000X', '208D00000X', '1223G0001X', '261QM1300X']
+
+DEFAULT_CARDIOLOGY_SHARE = 0.02
+FIRST_NPI = 1000000000
+
+
+def _quoted(value):
+    return '"' + value.replace('"', '""') + '"'
+
+
+def generate(path, rows, seed=0, cardiology_share=DEFAULT_CARDIOLOGY_SHARE):
+    """
+    Write a synthetic NPPES CSV with `rows` providers. The output depends
+    only on (rows, seed, cardiology_share). Every field is quoted like the
+    CMS file; cardiology_share of providers carry a cardiology taxonomy
+    in a random slot, and about 1% are deactivated.
+    Returns (bytes_written, seconds).
+    """
+    rng = random.Random(seed)
+    index = {column: position for position, column in enumerate(NPPES_HEADER)}
+    taxonomy_slots = [index[column] for column in nppes_extract.TAXONOMY_COLUMNS]
+    empty = ['""'] * len(NPPES_HEADER)
+    states = list(STATES)
+    codes = nppes_extract.CARDIOLOGY_TAXONOMIES
+
+    start = time.perf_counter()
+    with open(path, 'w', encoding='utf-8', newline='') as output:
+        output.write(','.join(_quoted(column) for column in NPPES_HEADER) + '\n')
+        for row_number in range(rows):
+            row = list(empty)
+            state = rng.choice(states)
+            row[index['NPI']] = _quoted(str(FIRST_NPI + row_number))
+            row[index['Entity Type Code']] = '"1"'
+            row[index['Provider Last Name (Legal Name)']] = _quoted(rng.choice(LAST_NAMES))
+            row[index['Provider First Name']] = _quoted(rng.choice(FIRST_NAMES))
+            row[index['Provider Credential Text']] = _quoted(rng.choice(CREDENTIALS))
+            row[index['Provider First Line Business Practice Location Address']] = \
+                _quoted(f"{rng.randint(1, 9999)} MAIN ST, SUITE {rng.randint(1, 400)}")
+            row[index[nppes_extract.CITY_COLUMN]] = _quoted(rng.choice(STATES[state]))
+            row[index[nppes_extract.STATE_COLUMN]] = _quoted(state)
+            row[index['Provider Business Practice Location Address Postal Code']] = \
+                _quoted(f"{rng.randint(1000, 99999):05d}{rng.randint(0, 9999):04d}")
+            row[index['Provider Business Practice Location Address Telephone Number']] = \
+                _quoted(f"{rng.randint(200, 999)}{rng.randint(2000000, 9999999)}")
+            row[index['Provider Enumeration Date']] = \
+                _quoted(f"{rng.randint(1, 12):02d}/{rng.randint(1, 28):02d}/{rng.randint(2005, 2024)}")
+
+            slot_count = rng.randint(1, 3)
+            for slot in range(slot_count):
+                row[taxonomy_slots[slot]] = _quoted(rng.choice(OTHER_TAXONOMIES))
+            if rng.random() < cardiology_share:
+                row[taxonomy_slots[rng.randrange(slot_count)]] = _quoted(rng.choice(codes))
+            if rng.random() < 0.01:
+                row[index[nppes_extract.DEACTIVATION_DATE_COLUMN]] = '"01/15/2024"'
+            output.write(','.join(row) + '\n')
+    return os.path.getsize(path), time.perf_counter() - start
@@ -0,0 +1,255 @@
+"""
+Local disk cache of MinIO / S3 objects, keyed by endpoint, bucket, key and
+ETag. Every read revalidates the entry with a conditional GET
+(If-None-Match), so an unchanged object costs one 304 and no body. Entries
+are evicted least recently used first once the cache grows past its size
+cap. Cached files are handed out as paths (for DuckDB or Parquet readers)
+or as read-only memory maps that Arrow and numpy read without copying.
+
+Only the standard library is imported here; the Lambda handlers use it.
+
+    OBJECT_CACHE_DIR                 data/object-cache (/tmp/object-cache in Lambda)
+    OBJECT_CACHE_MAX_MB              2048 (400 in Lambda); 0 disables the cache
+    OBJECT_CACHE_REVALIDATE_SECONDS  0: serve entries checked this recently
+                                     without a request
+"""
+import hashlib
+import json
+import mmap
+import os
+import threading
+import time
+
+DEFAULT_CACHE_DIR = 'data/object-cache'
+LAMBDA_CACHE_DIR = '/tmp/object-cache'
+DEFAULT_MAX_MB = 2048
+LAMBDA_MAX_MB = 400  # of the 512 MB default Lambda /tmp
+CHUNK_SIZE = 8 * 1024**2
+
+
+class CachedObject:
+    """
+    A cached object: its local path, ETag and size. `downloaded` is the
+    number of bytes fetched to serve it (0 when the entry was still
+    current).
+    """
+
+    def __init__(self, path, bucket, key, etag, size, downloaded):
+        self.path = path
+        self.bucket = bucket
+        self.key = key
+        self.etag = etag
+        self.size = size
+        self.downloaded = downloaded
+
+    @property
+    def hit(self):
+        return self.downloaded == 0
+
+    def open(self):
+        """The cached file, opened for binary reading"""
+        return open(self.path, 'rb')
+
+    def buffer(self):
+        """Read-only memory map of the file (b'' for an empty object)"""
+        if not self.size:
+            return b''
+        with open(self.path, 'rb') as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class ObjectCache:
+    """
+    Objects stored as <digest>.obj files with a <digest>.json sidecar
+    (bucket, key, ETag, size, last check). A file's mtime is its last use,
+    which orders eviction. Files are replaced atomically, so a map or open
+    handle on an old version stays valid.
+    """
+
+    def __init__(self, directory, max_bytes, revalidate_seconds=0):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.revalidate_seconds = revalidate_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, s3, bucket, key):
+        name = f"{s3.meta.endpoint_url}|{s3.meta.region_name}|{bucket}|{key}"
+        digest = hashlib.sha256(name.encode()).hexdigest()
+        base = os.path.join(self.directory, digest)
+        return base + '.obj', base + '.json'
+
+    def _entry(self, data_path, meta_path):
+        """Sidecar metadata if the entry is complete, else None"""
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if os.path.getsize(data_path) != meta['size']:
+                return None
+        except (OSError, ValueError, KeyError):
+            return None
+        return meta
+
+    def _write_meta(self, meta_path, meta):
+        tmp_path = f"{meta_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+
+    def get(self, s3, bucket, key):
+        """
+        CachedObject for s3://bucket/key: the cached file if the store
+        still has the same ETag, otherwise a fresh download
+        """
+        from botocore.exceptions import ClientError
+
+        data_path, meta_path = self._paths(s3, bucket, key)
+        meta = self._entry(data_path, meta_path)
+        now = time.time()
+        if meta is not None and now - meta['checked_at'] < self.revalidate_seconds:
+            return self._hit(data_path, meta)
+
+        request = {'Bucket': bucket, 'Key': key}
+        if meta is not None:
+            request['IfNoneMatch'] = meta['etag']
+        try:
+            response = s3.get_object(**request)
+        except ClientError as e:
+            if meta is None or e.response['Error']['Code'] not in ('304', 'NotModified'):
+                raise
+            meta['checked_at'] = now
+            self._write_meta(meta_path, meta)
+            return self._hit(data_path, meta)
+
+        # Body first, sidecar second: a crash in between leaves a sidecar
+        # whose ETag no longer matches, which only costs a re-download
+        tmp_path = f"{data_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        size = 0
+        try:
+            with open(tmp_path, 'wb') as f:
+                for chunk in response['Body'].iter_chunks(CHUNK_SIZE):
+                    f.write(chunk)
+                    size += len(chunk)
+            os.replace(tmp_path, data_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        meta = {'bucket': bucket, 'key': key, 'etag': response['ETag'], 'size': size, 'checked_at': now}
+        self._write_meta(meta_path, meta)
+        with self._lock:
+            self.misses += 1
+        self.evict(keep=data_path)
+        return CachedObject(data_path, bucket, key, meta['etag'], size, size)
+
+    def _hit(self, data_path, meta):
+        os.utime(data_path)
+        with self._lock:
+            self.hits += 1
+        return CachedObject(data_path, meta['bucket'], meta['key'], meta['etag'], meta['size'], 0)
+
+    def path(self, s3, bucket, key):
+        """Local path of the current version of s3://bucket/key"""
+        return self.get(s3, bucket, key).path
+
+    def entries(self):
+        """(data path, size, last used) of every cached file, least recently used first"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.obj'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:  # evicted concurrently
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, keep=None):
+        """
+        Remove least recently used entries until the cache fits max_bytes.
+        `keep` (just written) is never removed, even when it alone exceeds
+        the cap. Returns the bytes freed.
+        """
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        freed = 0
+        for path, size, _ in entries:
+            if total - freed <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            for stale in (path, path[:-len('.obj')] + '.json'):
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    pass
+            freed += size
+        return freed
+
+    def clear(self):
+        for path, _, _ in self.entries():
+            os.remove(path)
+            os.remove(path[:-len('.obj')] + '.json')
+
+
+_cache = {}
+
+
+def default_cache():
+    """
+    The per-process ObjectCache configured from OBJECT_CACHE_*, or None
+    when OBJECT_CACHE_MAX_MB is 0
+    """
+    if 'cache' not in _cache:
+        in_lambda = bool(os.getenv('AWS_LAMBDA_FUNCTION_NAME'))
+        max_mb = float(os.getenv('OBJECT_CACHE_MAX_MB', LAMBDA_MAX_MB if in_lambda else DEFAULT_MAX_MB))
+        _cache['cache'] = ObjectCache(
+            os.getenv('OBJECT_CACHE_DIR', LAMBDA_CACHE_DIR if in_lambda else DEFAULT_CACHE_DIR),
+            int(max_mb * 1024**2),
+            float(os.getenv('OBJECT_CACHE_REVALIDATE_SECONDS', '0'))
+        ) if max_mb > 0 else None
+    return _cache['cache']
+
+
+def main():
+    from dotenv import load_dotenv
+    import connections
+
+    load_dotenv()
+
+    print("=" * 70)
+    print("Object Cache")
+    print("=" * 70)
+
+    cache = default_cache()
+    if cache is None:
+        print("✓ Disabled (OBJECT_CACHE_MAX_MB=0)")
+        return
+    bucket = os.getenv('OBJECT_CACHE_BUCKET', 'processed-data')
+    key = os.getenv('OBJECT_CACHE_KEY', 'cardiology_processed.parquet')
+    s3 = connections.get_minio_client()
+
+    print(f"\n### s3://{bucket}/{key} ###")
+    for attempt in ['first', 'repeat']:
+        start = time.perf_counter()
+        cached = cache.get(s3, bucket, key)
+        state = "cached" if cached.hit else f"downloaded {cached.downloaded:,} bytes"
+        print(f"✓ {attempt}: {state} in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    entries = cache.entries()
+    print(f"\n✓ {cache.directory}: {len(entries)} object(s), "
+          f"{sum(size for _, size, _ in entries) / 1024**2:.1f} of {cache.max_bytes / 1024**2:.0f} MB")
+
+    print("\n" + "=" * 70)
+    print("Object cache ready!")
+    print("=" * 70)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+Parallel extract over the raw NPPES CSV: split the file into byte ranges
+aligned to record boundaries, filter and project each range in a worker
+process, and concatenate the results in file order
+"""
+import csv
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import duckdb
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+import nppes_extract
+
+SCAN_BLOCK_SIZE = 16 * 1024 * 1024
+CSV_BLOCK_SIZE = 8 * 1024 * 1024
+CHUNKS_PER_WORKER = 4
+BATCH_TABLE = 'nppes_batch'
+
+
+class RangeReader(io.RawIOBase):
+    """Readable file object over bytes [start, end) of a file"""
+
+    def __init__(self, path, start, end):
+        super().__init__()
+        self._file = open(path, 'rb')
+        self._file.seek(start)
+        self._remaining = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self._remaining)
+        if size <= 0:
+            return 0
+        read = self._file.readinto(memoryview(buffer)[:size])
+        self._remaining -= read
+        return read
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+def count_quotes(path, start, end):
+    """Number of '"' bytes in [start, end)"""
+    count = 0
+    with RangeReader(path, start, end) as reader:
+        while True:
+            block = reader.read(SCAN_BLOCK_SIZE)
+            if not block:
+                return count
+            count += block.count(b'"')
+
+
+def align_to_record(path, offset, quotes_before):
+    """
+    First record start after `offset`: the byte after a newline where the
+    number of quotes since the start of the file is even. A newline inside
+    a quoted field has an odd count before it and is skipped.
+    """
+    quotes = quotes_before
+    with open(path, 'rb') as source:
+        source.seek(offset)
+        block_offset = offset
+        while True:
+            block = source.read(SCAN_BLOCK_SIZE)
+            if not block:
+                return block_offset
+            start = 0
+            while True:
+                newline = block.find(b'\n', start)
+                if newline < 0:
+                    quotes += block.count(b'"', start)
+                    break
+                quotes += block.count(b'"', start, newline)
+                if quotes % 2 == 0:
+                    return block_offset + newline + 1
+                start = newline + 1
+            block_offset += len(block)
+
+
+def _count_quotes_task(args):
+    return count_quotes(*args)
+
+
+def _align_task(args):
+    return align_to_record(*args)
+
+
+def split_ranges(path, chunks, pool):
+    """
+    Header column names and `chunks` (or fewer) record-aligned byte ranges
+    covering the data rows. Quotes are counted per raw range in parallel;
+    their prefix sums give the quote parity at each cut, so every cut can
+    then be aligned independently.
+    """
+    size = os.path.getsize(path)
+    header_end = align_to_record(path, 0, 0)
+    with open(path, 'rb') as source:
+        header = source.read(header_end).decode('utf-8-sig')
+    column_names = next(csv.reader([header]))
+
+    step = max((size - header_end) // chunks, 1)
+    cuts = [min(header_end + step * index, size) for index in range(chunks)] + [size]
+    cuts = sorted(set(cuts))
+    counts = list(pool.map(_count_quotes_task, [
+        (path, start, end) for start, end in zip([header_end] + cuts[:-1], cuts)
+    ]))
+
+    quotes_before = []
+    total = 0  # header quotes are balanced
+    for count in counts[:-1]:
+        total += count
+        quotes_before.append(total)
+    inner_cuts = cuts[1:-1]
+    aligned = list(pool.map(_align_task, [
+        (path, cut, quotes) for cut, quotes in zip(inner_cuts, quotes_before[1:])
+    ]))
+
+    boundaries = sorted(set([header_end] + aligned + [size]))
+    return column_names, list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def extract_range(path, start, end, column_names, include_columns, query):
+    """
+    Filter/project one byte range: pyarrow parses it in batches (only the
+    needed columns, all as text, blanks as NULL like DuckDB's read_csv) and
+    DuckDB runs `query` over each batch. Returns (rows_scanned, result table).
+    """
+    conn = duckdb.connect(':memory:')
+    conn.execute("SET threads = 1")
+    reader = pa_csv.open_csv(
+        io.BufferedReader(RangeReader(path, start, end), buffer_size=CSV_BLOCK_SIZE),
+        read_options=pa_csv.ReadOptions(
+            column_names=column_names, block_size=CSV_BLOCK_SIZE, use_threads=False
+        ),
+        parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=include_columns,
+            column_types={column: pa.string() for column in include_columns},
+            null_values=[''], strings_can_be_null=True
+        )
+    )
+    scanned = 0
+    results = []
+    for batch in reader:
+        scanned += batch.num_rows
+        conn.register(BATCH_TABLE, pa.Table.from_batches([batch]))
+        results.append(conn.execute(query).fetch_arrow_table())
+        conn.unregister(BATCH_TABLE)
+    conn.close()
+    if not results:
+        return scanned, None
+    return scanned, pa.concat_tables(results)
+
+
+def _extract_task(args):
+    return extract_range(*args)
+
+
+def parallel_extract(path, workers, select_sql=None, include_columns=None, codes=None,
+                     taxonomy_index=None, chunks=None):
+    """
+    Run the cardiology extract over `path` with `workers` processes.
+    Ranges are processed out of order but merged in file order, so the
+    result is the same for any worker count. Returns (table, stats).
+    """
+    chunks = chunks or workers * CHUNKS_PER_WORKER
+    query = nppes_extract.cardiology_query(
+        BATCH_TABLE, codes=codes, taxonomy_index=taxonomy_index, select_sql=select_sql
+    )
+    include_columns = list(dict.fromkeys(
+        [nppes_extract.NPI_COLUMN, nppes_extract.STATE_COLUMN, nppes_extract.CITY_COLUMN,
+         nppes_extract.ENUMERATION_DATE_COLUMN, nppes_extract.DEACTIVATION_DATE_COLUMN,
+         nppes_extract.REACTIVATION_DATE_COLUMN]
+        + nppes_extract.TAXONOMY_COLUMNS + list(include_columns or [])
+    ))
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        column_names, ranges = split_ranges(path, chunks, pool)
+        split_seconds = time.perf_counter() - start
+        results = list(pool.map(_extract_task, [
+            (path, range_start, range_end, column_names, include_columns, query)
+            for range_start, range_end in ranges
+        ]))
+    seconds = time.perf_counter() - start
+
+    tables = [table for _, table in results if table is not None]
+    table = pa.concat_tables(tables) if tables else None
+    stats = {
+        'workers': workers,
+        'ranges': len(ranges),
+        'rows_scanned': sum(scanned for scanned, _ in results),
+        'rows': table.num_rows if table is not None else 0,
+        'bytes': os.path.getsize(path),
+        'split_seconds': split_seconds,
+        'seconds': seconds,
+    }
+    return table, stats
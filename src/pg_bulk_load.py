@@ -0,0 +1,223 @@
+"""
+PostgreSQL bulk loading: stream CSV bytes into COPY ... FROM STDIN
+through an UNLOGGED staging table, then merge into the target table
+"""
+import time
+from psycopg2 import sql
+
+DEFAULT_READ_SIZE = 1024 * 1024
+
+
+def iter_csv_records(stream, read_size=DEFAULT_READ_SIZE):
+    """
+    Yield complete CSV records (bytes, newline included) from a binary stream.
+    A line with an odd number of quotes opens a quoted field, so the record
+    continues until the quotes balance again.
+    """
+    pending = b''
+    record = []
+    quotes = 0
+    while True:
+        chunk = stream.read(read_size)
+        if not chunk:
+            break
+        lines = (pending + chunk).split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            record.append(line + b'\n')
+            quotes += line.count(b'"')
+            if quotes % 2 == 0:
+                yield b''.join(record)
+                record = []
+                quotes = 0
+    if pending or record:
+        record.append(pending)
+        yield b''.join(record)
+
+
+class RecordBatchReader:
+    """
+    File-like object handed to copy_expert: serves at most batch_size
+    records from the shared record iterator, then reports EOF.
+    """
+
+    def __init__(self, records, batch_size):
+        self._records = records
+        self._remaining = batch_size
+        self._buffer = b''
+        self.rows = 0
+        self.exhausted = False
+
+    def read(self, size=-1):
+        parts = [self._buffer]
+        buffered = len(self._buffer)
+        while (size < 0 or buffered < size) and self._remaining > 0:
+            record = next(self._records, None)
+            if record is None:
+                self.exhausted = True
+                break
+            parts.append(record)
+            buffered += len(record)
+            self._remaining -= 1
+            self.rows += 1
+        data = b''.join(parts)
+        if size < 0:
+            self._buffer = b''
+            return data
+        self._buffer = data[size:]
+        return data[:size]
+
+
+def create_staging_table(cursor, table, staging_table):
+    """Empty UNLOGGED copy of `table` without indexes or constraints"""
+    cursor.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(sql.Identifier(staging_table)))
+    cursor.execute(sql.SQL(
+        "CREATE UNLOGGED TABLE {} (LIKE {} INCLUDING DEFAULTS)"
+    ).format(sql.Identifier(staging_table), sql.Identifier(table)))
+
+
+def copy_statement(table, columns, header):
+    """COPY table (columns) FROM STDIN in CSV format"""
+    return sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv{})").format(
+        sql.Identifier(table),
+        sql.SQL(', ').join(map(sql.Identifier, columns)),
+        sql.SQL(', HEADER true') if header else sql.SQL('')
+    )
+
+
+def copy_stream(conn, stream, table, columns, batch_size=None, skip_rows=0, on_batch=None):
+    """
+    Stream CSV (with a header line) from `stream` into `table`.
+    Without batch_size the whole stream is one COPY; with it, each batch of
+    records is its own COPY and commit, on_batch(total_rows) is called after
+    each commit, and the first skip_rows records (already committed by an
+    earlier attempt) are skipped. Returns rows copied, including skipped.
+    """
+    cursor = conn.cursor()
+    if not batch_size:
+        cursor.copy_expert(copy_statement(table, columns, header=True).as_string(conn), stream,
+                           size=DEFAULT_READ_SIZE)
+        conn.commit()
+        rows = cursor.rowcount
+        cursor.close()
+        return rows
+
+    records = iter_csv_records(stream)
+    next(records, None)  # header
+    for _ in range(skip_rows):
+        next(records, None)
+    statement = copy_statement(table, columns, header=False).as_string(conn)
+    rows = skip_rows
+    while True:
+        batch = RecordBatchReader(records, batch_size)
+        cursor.copy_expert(statement, batch, size=DEFAULT_READ_SIZE)
+        conn.commit()
+        rows += batch.rows
+        if batch.rows:
+            print(f"  ... {rows:,} rows copied")
+            if on_batch is not None:
+                on_batch(rows)
+        if batch.exhausted or not batch.rows:
+            break
+    cursor.close()
+    return rows
+
+
+def merge_staging(conn, staging_table, table, columns, key, replace=False, upsert=True):
+    """
+    Upsert staging rows into `table` in one transaction.
+    With replace=True, target rows missing from staging are deleted, which
+    gives full-reload semantics without an empty-table window.
+    upsert=False replaces matching rows by delete + insert, for tables
+    without a unique constraint on `key` (e.g. partitioned tables).
+    Returns (upserted, deleted).
+    """
+    cursor = conn.cursor()
+    column_list = sql.SQL(', ').join(map(sql.Identifier, columns))
+    names = {
+        'table': sql.Identifier(table),
+        'staging': sql.Identifier(staging_table),
+        'columns': column_list,
+        'key': sql.Identifier(key),
+    }
+    if upsert:
+        updates = sql.SQL(', ').join(
+            sql.SQL("{} = EXCLUDED.{}").format(sql.Identifier(column), sql.Identifier(column))
+            for column in columns if column != key
+        )
+        cursor.execute(sql.SQL("""
+            INSERT INTO {table} ({columns})
+            SELECT DISTINCT ON ({key}) {columns} FROM {staging} ORDER BY {key}
+            ON CONFLICT ({key}) DO UPDATE SET {updates}
+        """).format(updates=updates, **names))
+    else:
+        cursor.execute(sql.SQL("""
+            DELETE FROM {table} t
+            WHERE EXISTS (SELECT 1 FROM {staging} s WHERE s.{key} = t.{key})
+        """).format(**names))
+        cursor.execute(sql.SQL("""
+            INSERT INTO {table} ({columns})
+            SELECT DISTINCT ON ({key}) {columns} FROM {staging} ORDER BY {key}
+        """).format(**names))
+    upserted = cursor.rowcount
+
+    deleted = 0
+    if replace:
+        cursor.execute(sql.SQL("""
+            DELETE FROM {table} t
+            WHERE NOT EXISTS (SELECT 1 FROM {staging} s WHERE s.{key} = t.{key})
+        """).format(
+            table=sql.Identifier(table),
+            staging=sql.Identifier(staging_table),
+            key=sql.Identifier(key)
+        ))
+        deleted = cursor.rowcount
+
+    cursor.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(staging_table)))
+    conn.commit()
+    cursor.close()
+    return upserted, deleted
+
+
+def staging_exists(conn, staging_table):
+    """True if a staging table survived an earlier, interrupted load"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT to_regclass(%s)", (staging_table,))
+    exists = cursor.fetchone()[0] is not None
+    cursor.close()
+    return exists
+
+
+def load_csv_stream(conn, stream, table, columns, key, batch_size=None, replace=False,
+                    resume_rows=0, on_batch=None, upsert=True):
+    """
+    Bulk load a CSV stream: COPY into an UNLOGGED staging table, then merge.
+    With resume_rows (a chunk offset recorded through on_batch) and the
+    staging table still present, the COPY continues after those rows.
+    Returns a dict of row counts and timings.
+    """
+    staging_table = f"{table}_staging"
+    if not (batch_size and resume_rows and staging_exists(conn, staging_table)):
+        resume_rows = 0
+        cursor = conn.cursor()
+        create_staging_table(cursor, table, staging_table)
+        conn.commit()
+        cursor.close()
+
+    start = time.perf_counter()
+    copied = copy_stream(conn, stream, staging_table, columns, batch_size,
+                         skip_rows=resume_rows, on_batch=on_batch)
+    copy_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    upserted, deleted = merge_staging(conn, staging_table, table, columns, key, replace, upsert)
+    merge_seconds = time.perf_counter() - start
+
+    return {
+        'copied': copied,
+        'resumed_rows': resume_rows,
+        'upserted': upserted,
+        'deleted': deleted,
+        'copy_seconds': copy_seconds,
+        'merge_seconds': merge_seconds,
+    }
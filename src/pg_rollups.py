@@ -0,0 +1,303 @@
+"""
+Provider count rollups for analytics: providers (and active providers) by
+state, by city, by taxonomy code and by enumeration year, kept in
+provider_rollups (see pg_schema) and refreshed after every load. Each
+refresh bumps load_version; query results are cached in-process (LRU with
+a TTL) and never served once the version has moved on.
+
+    ANALYTICS_CACHE_ENTRIES=256 ANALYTICS_CACHE_TTL_SECONDS=300 python src/pg_rollups.py
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from psycopg2 import sql
+
+import metrics
+
+TABLE = 'cardiology_providers'
+ROLLUP_LOCK_ID = 72707  # pg_advisory_xact_lock key for rollup writers
+
+DEFAULT_CACHE_ENTRIES = '256'
+DEFAULT_CACHE_TTL_SECONDS = '300'
+
+GROUP_COLUMNS = ['provider_state', 'provider_city', 'specialty_code', 'enumeration_year']
+ROLLUP_COLUMNS = ['dimension'] + GROUP_COLUMNS + ['providers', 'active_providers']
+
+# dimension → the columns it groups by
+DIMENSIONS = {
+    'state': ['provider_state'],
+    'city': ['provider_state', 'provider_city'],
+    'taxonomy': ['specialty_code'],
+    'enumeration_year': ['enumeration_year'],
+}
+
+# Grouped as NULL when blank: the key below cannot tell '' from NULL
+TEXT_GROUP_COLUMNS = ['provider_state', 'provider_city', 'specialty_code']
+
+# Same expressions as provider_rollups_key_idx, so ON CONFLICT can use it
+ROLLUP_KEY = """dimension, COALESCE(provider_state, ''), COALESCE(provider_city, ''),
+            COALESCE(specialty_code, ''), COALESCE(enumeration_year, -1)"""
+
+
+def _grouping_mask(columns):
+    # GROUPING(a, b, c, d) sets a bit, first column highest, per rolled-up column
+    return sum(1 << (len(GROUP_COLUMNS) - 1 - position)
+               for position, column in enumerate(GROUP_COLUMNS) if column not in columns)
+
+
+def rollup_sql(source):
+    """One scan of `source` (a FROM item) producing every dimension's counts"""
+    group_columns = ', '.join(GROUP_COLUMNS)
+    dimension_cases = ' '.join(
+        f"WHEN {_grouping_mask(columns)} THEN '{dimension}'" for dimension, columns in DIMENSIONS.items()
+    )
+    grouping_sets = ', '.join(f"({', '.join(columns)})" for columns in DIMENSIONS.values())
+    normalized = ', '.join(
+        f"NULLIF({column}, '') AS {column}" if column in TEXT_GROUP_COLUMNS else column
+        for column in GROUP_COLUMNS
+    )
+    return f"""
+        SELECT
+            CASE GROUPING({group_columns}) {dimension_cases} END AS dimension,
+            {group_columns},
+            COUNT(*) AS providers,
+            COUNT(*) FILTER (WHERE is_active) AS active_providers
+        FROM (SELECT {normalized}, is_active FROM {source}) source
+        GROUP BY GROUPING SETS ({grouping_sets})
+    """
+
+
+def _same_group(left, right):
+    return ' AND '.join(
+        [f"{left}.dimension = {right}.dimension"]
+        + [f"{left}.{column} IS NOT DISTINCT FROM {right}.{column}" for column in GROUP_COLUMNS]
+    )
+
+
+def _recompute(cursor, table=TABLE):
+    """Rewrite the groups whose counts differ from a fresh scan; returns how many"""
+    columns = ', '.join(ROLLUP_COLUMNS)
+    cursor.execute(sql.SQL("CREATE TEMP TABLE provider_rollups_fresh ON COMMIT DROP AS " + rollup_sql("{}"))
+                   .format(sql.Identifier(table)))
+    cursor.execute(f"""
+        DELETE FROM provider_rollups r
+        WHERE NOT EXISTS (SELECT 1 FROM provider_rollups_fresh f WHERE {_same_group('f', 'r')})
+    """)
+    removed = cursor.rowcount
+    cursor.execute(f"""
+        INSERT INTO provider_rollups ({columns})
+        SELECT {columns} FROM provider_rollups_fresh
+        ON CONFLICT ({ROLLUP_KEY}) DO UPDATE SET
+            providers = EXCLUDED.providers,
+            active_providers = EXCLUDED.active_providers
+        WHERE (provider_rollups.providers, provider_rollups.active_providers)
+            IS DISTINCT FROM (EXCLUDED.providers, EXCLUDED.active_providers)
+    """)
+    return removed + cursor.rowcount
+
+
+def _adjust(cursor, table, delta_table, sign):
+    """Add (sign=1) or subtract (sign=-1) the current rows of the delta's NPIs"""
+    columns = ', '.join(ROLLUP_COLUMNS)
+    changed = sql.SQL("(SELECT * FROM {} WHERE npi IN (SELECT npi FROM {})) changed").format(
+        sql.Identifier(table), sql.Identifier(delta_table)
+    ).as_string(cursor)
+    cursor.execute(f"""
+        INSERT INTO provider_rollups ({columns})
+        SELECT dimension, {', '.join(GROUP_COLUMNS)}, {sign} * providers, {sign} * active_providers
+        FROM ({rollup_sql(changed)}) counts
+        ON CONFLICT ({ROLLUP_KEY}) DO UPDATE SET
+            providers = provider_rollups.providers + EXCLUDED.providers,
+            active_providers = provider_rollups.active_providers + EXCLUDED.active_providers
+    """)
+    if sign < 0:
+        cursor.execute("DELETE FROM provider_rollups WHERE providers = 0")
+
+
+def _bump_version(cursor):
+    cursor.execute("""
+        INSERT INTO provider_rollup_version (id, load_version) VALUES (TRUE, 1)
+        ON CONFLICT (id) DO UPDATE SET
+            load_version = provider_rollup_version.load_version + 1,
+            refreshed_at = CURRENT_TIMESTAMP
+        RETURNING load_version
+    """)
+    return cursor.fetchone()[0]
+
+
+def load_version(cursor):
+    """Version of the rollups (bumped by every load), or None before the first refresh"""
+    cursor.execute("SELECT load_version FROM provider_rollup_version")
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+@metrics.instrumented('rollups.refresh')
+def refresh(conn, table=TABLE):
+    """
+    Recompute the rollups after a full load in one scan of `table`; only
+    groups whose counts changed are written. Commits and returns the new
+    load version.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT pg_advisory_xact_lock(%s)", (ROLLUP_LOCK_ID,))
+    changed = _recompute(cursor, table)
+    version = _bump_version(cursor)
+    conn.commit()
+    cursor.close()
+    metrics.record(rows_out=changed)
+    return version
+
+
+@contextmanager
+def tracking(cursor, delta_table, table=TABLE):
+    """
+    Keep the rollups in step with changes to the NPIs listed in
+    `delta_table` made inside the block: their rows are subtracted before
+    and added back after, in the caller's transaction (the caller commits).
+    Rollups that were never built get a full recompute instead.
+    """
+    cursor.execute("SELECT pg_advisory_xact_lock(%s)", (ROLLUP_LOCK_ID,))
+    built = load_version(cursor) is not None
+    if built:
+        _adjust(cursor, table, delta_table, -1)
+    yield
+    if built:
+        _adjust(cursor, table, delta_table, 1)
+    else:
+        _recompute(cursor, table)
+    _bump_version(cursor)
+
+
+class QueryCache:
+    """
+    LRU cache of analytics results. An entry is served only for the load
+    version it was computed at and for at most ttl seconds.
+    """
+
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()  # key → (load_version, expires_at, result)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] != version or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key, version, result):
+        with self._lock:
+            self.entries[key] = (version, time.monotonic() + self.ttl_seconds, result)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+
+_cache = None
+
+
+def query_cache():
+    """The per-process QueryCache (sized from ANALYTICS_CACHE_*)"""
+    global _cache
+    if _cache is None:
+        _cache = QueryCache(
+            int(os.getenv('ANALYTICS_CACHE_ENTRIES', DEFAULT_CACHE_ENTRIES)),
+            float(os.getenv('ANALYTICS_CACHE_TTL_SECONDS', DEFAULT_CACHE_TTL_SECONDS))
+        )
+    return _cache
+
+
+def counts(conn, dimension, state=None, limit=None):
+    """
+    Provider counts for one dimension, largest first, as dicts of the
+    dimension's columns plus providers and active_providers. `state`
+    restricts the state and city dimensions. Served from the query cache
+    while the load version is unchanged; rollups are built on first use.
+    """
+    if dimension not in DIMENSIONS:
+        raise ValueError(f"Unknown dimension '{dimension}' (expected one of {', '.join(DIMENSIONS)})")
+    cursor = conn.cursor()
+    version = load_version(cursor)
+    if version is None:
+        version = refresh(conn)
+
+    key = (dimension, state, limit)
+    result = query_cache().get(key, version)
+    if result is not None:
+        cursor.close()
+        return result
+
+    columns = DIMENSIONS[dimension]
+    query = f"""
+        SELECT {', '.join(columns)}, providers, active_providers
+        FROM provider_rollups
+        WHERE dimension = %s
+    """
+    params = [dimension]
+    if state is not None and 'provider_state' in columns:
+        query += " AND provider_state = %s"
+        params.append(state)
+    query += f" ORDER BY providers DESC, {', '.join(columns)}"
+    if limit:
+        query += f" LIMIT {int(limit)}"
+    cursor.execute(query, params)
+    names = columns + ['providers', 'active_providers']
+    result = [dict(zip(names, row)) for row in cursor.fetchall()]
+    cursor.close()
+    query_cache().put(key, version, result)
+    return result
+
+
+def main():
+    from dotenv import load_dotenv
+    import connections
+
+    load_dotenv()
+
+    print("=" * 70)
+    print("Provider Rollups")
+    print("=" * 70)
+
+    with connections.pg_connection() as conn:
+        print("\n### Refresh ###")
+        start = time.perf_counter()
+        version = refresh(conn)
+        print(f"✓ Rollups at load version {version} ({time.perf_counter() - start:.2f}s)")
+
+        print("\n### Top 5 per Dimension ###")
+        for dimension, columns in DIMENSIONS.items():
+            print(f"✓ {dimension}:")
+            for row in counts(conn, dimension, limit=5):
+                label = ', '.join(str(row[column]) for column in columns)
+                print(f"  {label}: {row['providers']:,} providers ({row['active_providers']:,} active)")
+
+        print("\n### Query Cache ###")
+        query_cache().clear()
+        for attempt in ['first', 'cached']:
+            start = time.perf_counter()
+            counts(conn, 'city', limit=20)
+            print(f"✓ {attempt}: {(time.perf_counter() - start) * 1000:.2f} ms")
+    connections.close_all()
+
+    print("\n" + "=" * 70)
+    print("Rollups ready!")
+    print("=" * 70)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""
+Schema migrations for cardiology_providers: numbered, applied once each
+(recorded in schema_migrations) under an advisory lock, so every step can
+call migrate() before touching the table. Also drops and recreates the
+secondary indexes around bulk loads, and optionally converts the table to
+LIST partitions by state.
+
+    PG_SCHEMA_PARTITION=state python src/pg_schema.py
+"""
+import os
+from contextlib import contextmanager
+from dotenv import load_dotenv
+from psycopg2 import sql
+
+load_dotenv()
+
+TABLE = 'cardiology_providers'
+MIGRATION_LOCK_ID = 72706  # pg_advisory_xact_lock key shared by all migrators
+
+MIGRATIONS_DDL = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INTEGER PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+# (version, name, statements); never edit an applied migration, add a new one
+MIGRATIONS = [
+    (1, 'create_cardiology_providers', [
+        """
+        CREATE TABLE IF NOT EXISTS cardiology_providers (
+            npi VARCHAR(10) PRIMARY KEY,
+            provider_state VARCHAR(2),
+            provider_city VARCHAR(100),
+            specialty_code VARCHAR(20),
+            is_active BOOLEAN NOT NULL DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        "ALTER TABLE cardiology_providers ADD COLUMN IF NOT EXISTS is_active BOOLEAN NOT NULL DEFAULT TRUE",
+    ]),
+    (2, 'npi_bigint', [
+        "ALTER TABLE cardiology_providers ALTER COLUMN npi TYPE BIGINT USING npi::bigint",
+    ]),
+    # Generated from specialty_code, so it only ever held the primary
+    # match; migration 9 replaces it with the loaded list of matched codes
+    (3, 'taxonomy_codes_array', [
+        """
+        ALTER TABLE cardiology_providers ADD COLUMN IF NOT EXISTS taxonomy_codes TEXT[]
+            GENERATED ALWAYS AS (
+                CASE WHEN specialty_code IS NULL THEN '{}'::TEXT[] ELSE ARRAY[specialty_code]::TEXT[] END
+            ) STORED
+        """,
+    ]),
+    (4, 'secondary_indexes', None),  # SECONDARY_INDEXES, see create_indexes
+    (5, 'enumeration_year', [
+        "ALTER TABLE cardiology_providers ADD COLUMN IF NOT EXISTS enumeration_year SMALLINT",
+    ]),
+    # Provider counts per group, maintained by pg_rollups
+    (6, 'provider_rollups', [
+        """
+        CREATE TABLE IF NOT EXISTS provider_rollups (
+            dimension VARCHAR(20) NOT NULL,
+            provider_state VARCHAR(2),
+            provider_city VARCHAR(100),
+            specialty_code VARCHAR(20),
+            enumeration_year SMALLINT,
+            providers BIGINT NOT NULL,
+            active_providers BIGINT NOT NULL
+        )
+        """,
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS provider_rollups_key_idx ON provider_rollups (
+            dimension, COALESCE(provider_state, ''), COALESCE(provider_city, ''),
+            COALESCE(specialty_code, ''), COALESCE(enumeration_year, -1)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS provider_rollup_version (
+            id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+            load_version BIGINT NOT NULL,
+            refreshed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ]),
+    # The rollup key treats '' as NULL; store blank groups as NULL only
+    (7, 'provider_rollups_blank_as_null', [
+        """
+        UPDATE provider_rollups SET
+            provider_state = NULLIF(provider_state, ''),
+            provider_city = NULLIF(provider_city, ''),
+            specialty_code = NULLIF(specialty_code, '')
+        WHERE '' IN (provider_state, provider_city, specialty_code)
+        """,
+    ]),
+    # While taxonomy_codes was generated from specialty_code, the GIN index
+    # duplicated the btree one (migration 10 restores it)
+    (8, 'drop_taxonomy_gin_index', [
+        "DROP INDEX IF EXISTS cardiology_providers_taxonomy_gin_idx",
+    ]),
+    # Every matched taxonomy code, written by the loads; until the next full
+    # load an existing row keeps its primary code only
+    (9, 'taxonomy_codes_loaded', [
+        "ALTER TABLE cardiology_providers DROP COLUMN IF EXISTS taxonomy_codes",
+        "ALTER TABLE cardiology_providers ADD COLUMN taxonomy_codes TEXT[]",
+        """
+        UPDATE cardiology_providers SET taxonomy_codes =
+            CASE WHEN specialty_code IS NULL THEN '{}'::TEXT[] ELSE ARRAY[specialty_code]::TEXT[] END
+        """,
+    ]),
+    # Multi-taxonomy queries: taxonomy_codes @> ARRAY[...] / && ARRAY[...]
+    (10, 'taxonomy_gin_index', None),  # SECONDARY_INDEXES, see create_indexes
+]
+
+# Dropped before and recreated after each bulk load
+SECONDARY_INDEXES = {
+    'cardiology_providers_state_city_idx': "ON {table} (provider_state, provider_city)",
+    'cardiology_providers_specialty_idx': "ON {table} (specialty_code)",
+    'cardiology_providers_taxonomy_gin_idx': "ON {table} USING GIN (taxonomy_codes)",
+}
+
+
+def create_indexes(cursor, table=TABLE):
+    for name, definition in SECONDARY_INDEXES.items():
+        cursor.execute(sql.SQL("CREATE INDEX IF NOT EXISTS {} " + definition).format(
+            sql.Identifier(name), table=sql.Identifier(table)
+        ))
+
+
+def drop_indexes(cursor):
+    for name in SECONDARY_INDEXES:
+        cursor.execute(sql.SQL("DROP INDEX IF EXISTS {}").format(sql.Identifier(name)))
+
+
+def migrate(conn):
+    """Apply pending migrations in order; returns the names applied"""
+    cursor = conn.cursor()
+    # Serialize concurrent callers (pipeline stages, step scripts)
+    cursor.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_ID,))
+    cursor.execute(MIGRATIONS_DDL)
+    cursor.execute("SELECT version FROM schema_migrations")
+    applied_versions = {row[0] for row in cursor.fetchall()}
+
+    applied = []
+    for version, name, statements in MIGRATIONS:
+        if version in applied_versions:
+            continue
+        if statements is None:
+            create_indexes(cursor)
+        else:
+            for statement in statements:
+                cursor.execute(statement)
+        cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+        applied.append(name)
+    conn.commit()
+    cursor.close()
+    return applied
+
+
+def is_partitioned(conn, table=TABLE):
+    """True if `table` is a partitioned table"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+    row = cursor.fetchone()
+    cursor.close()
+    return row is not None and row[0] == 'p'
+
+
+@contextmanager
+def indexes_dropped(conn):
+    """
+    Drop the secondary indexes (committed) for a bulk load and recreate
+    them afterwards, even if the load fails. Queries in between fall back
+    to sequential scans. PG_DROP_INDEXES_ON_LOAD=false keeps them.
+    """
+    if os.getenv('PG_DROP_INDEXES_ON_LOAD', 'true').lower() != 'true':
+        yield
+        return
+    cursor = conn.cursor()
+    drop_indexes(cursor)
+    conn.commit()
+    try:
+        yield
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        create_indexes(cursor)
+        cursor.execute(sql.SQL("ANALYZE {}").format(sql.Identifier(TABLE)))
+        conn.commit()
+        cursor.close()
+
+
+def partition_by_state(conn):
+    """
+    Rebuild cardiology_providers as LIST partitions by provider_state (one
+    per state present, plus a DEFAULT partition for new states and NULL),
+    in one transaction. A partitioned table cannot keep a primary key on
+    npi alone, so npi gets a plain index and loads replace rows by
+    delete + insert instead of ON CONFLICT. Returns the partition count.
+    """
+    if is_partitioned(conn):
+        return None
+    cursor = conn.cursor()
+    cursor.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_ID,))
+    new_table = f"{TABLE}_partitioned"
+    names = {'table': sql.Identifier(TABLE), 'new': sql.Identifier(new_table)}
+
+    cursor.execute(sql.SQL("""
+        CREATE TABLE {new} (LIKE {table} INCLUDING DEFAULTS INCLUDING GENERATED)
+        PARTITION BY LIST (provider_state)
+    """).format(**names))
+    cursor.execute(sql.SQL(
+        "SELECT DISTINCT provider_state FROM {table} WHERE provider_state IS NOT NULL ORDER BY 1"
+    ).format(**names))
+    states = [row[0] for row in cursor.fetchall()]
+    for state in states:
+        cursor.execute(sql.SQL("CREATE TABLE {} PARTITION OF {} FOR VALUES IN (%s)").format(
+            sql.Identifier(f"{TABLE}_{state.lower()}"), sql.Identifier(new_table)
+        ), (state,))
+    cursor.execute(sql.SQL("CREATE TABLE {} PARTITION OF {} DEFAULT").format(
+        sql.Identifier(f"{TABLE}_default"), sql.Identifier(new_table)
+    ))
+
+    columns = sql.SQL(', ').join(map(sql.Identifier, [
+        'npi', 'provider_state', 'provider_city', 'specialty_code', 'enumeration_year',
+        'is_active', 'taxonomy_codes', 'created_at'
+    ]))
+    cursor.execute(sql.SQL("INSERT INTO {new} ({columns}) SELECT {columns} FROM {table}").format(
+        columns=columns, **names
+    ))
+    cursor.execute(sql.SQL("DROP TABLE {table}").format(**names))
+    cursor.execute(sql.SQL("ALTER TABLE {new} RENAME TO {table}").format(**names))
+    cursor.execute(sql.SQL("CREATE INDEX {} ON {} (npi)").format(
+        sql.Identifier(f"{TABLE}_npi_idx"), sql.Identifier(TABLE)
+    ))
+    create_indexes(cursor)
+    cursor.execute(sql.SQL("ANALYZE {table}").format(**names))
+    conn.commit()
+    cursor.close()
+    return len(states) + 1
+
+
+def main():
+    import connections
+
+    print("=" * 70)
+    print("PostgreSQL Schema Migrations")
+    print("=" * 70)
+
+    with connections.pg_connection() as conn:
+        print("\n### Migrations ###")
+        applied = migrate(conn)
+        for name in applied:
+            print(f"✓ Applied {name}")
+        if not applied:
+            print("✓ Schema up to date")
+
+        if os.getenv('PG_SCHEMA_PARTITION') == 'state':
+            print("\n### Partitioning by State ###")
+            partitions = partition_by_state(conn)
+            if partitions is None:
+                print(f"✓ {TABLE} is already partitioned")
+            else:
+                print(f"✓ {TABLE} rebuilt with {partitions} partitions")
+    connections.close_all()
+
+    print("\n" + "=" * 70)
+    print("Schema ready!")
+    print("=" * 70)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Pipeline runner: execute stages as a dependency graph in one process,
+handing each stage's return value to its dependents in memory and running
+independent branches concurrently
+"""
+import hashlib
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import metrics
+
+
+class Stage:
+    """
+    One node of the pipeline graph.
+    func receives a dict {dependency name: dependency result} and returns
+    the value handed to downstream stages. checkpoint marks stages that
+    persist data outside the process (MinIO, Postgres, S3).
+
+    With a run manifest, a finished stage is skipped on re-runs. Its
+    result is then rebuilt by restore(summary) when a dependent still has
+    to run (e.g. re-reading a checkpoint object), or is the recorded
+    summary otherwise. summarize(result) produces that JSON summary.
+
+    fingerprint(result) identifies the content a stage produced; without
+    it a stage's fingerprint is that of its inputs. A skip_unchanged stage
+    whose inputs have the same fingerprints as at its last successful run
+    (in any run) is skipped, so identical data is not loaded or exported
+    again. current(summary) checks that what a stage wrote outside object
+    stores (e.g. a PostgreSQL table) is still as that summary recorded;
+    recorded objects are checked by ETag either way.
+    """
+
+    def __init__(self, name, func, depends_on=(), checkpoint=False,
+                 restore=None, summarize=None, fingerprint=None, skip_unchanged=False,
+                 current=None):
+        self.name = name
+        self.func = func
+        self.depends_on = tuple(depends_on)
+        self.checkpoint = checkpoint
+        self.restore = restore
+        self.summarize = summarize
+        self.fingerprint = fingerprint
+        self.skip_unchanged = skip_unchanged
+        self.current = current
+
+    def __repr__(self):
+        return f"Stage({self.name!r}, depends_on={self.depends_on!r})"
+
+
+def topological_order(stages):
+    """Stage names in dependency order; raises ValueError on unknown deps or cycles"""
+    by_name = {stage.name: stage for stage in stages}
+    if len(by_name) != len(stages):
+        raise ValueError("Duplicate stage names")
+    for stage in stages:
+        for dependency in stage.depends_on:
+            if dependency not in by_name:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown stage '{dependency}'")
+
+    order = []
+    visiting = set()
+    visited = set()
+
+    def visit(name):
+        if name in visited:
+            return
+        if name in visiting:
+            raise ValueError(f"Dependency cycle through stage '{name}'")
+        visiting.add(name)
+        for dependency in by_name[name].depends_on:
+            visit(dependency)
+        visiting.discard(name)
+        visited.add(name)
+        order.append(name)
+
+    for stage in stages:
+        visit(stage.name)
+    return order
+
+
+def _skip(stage, manifest, executed):
+    """A finished stage is skipped unless something upstream ran again"""
+    if manifest is None or not manifest.is_done(stage.name):
+        return False
+    if any(dependency in executed for dependency in stage.depends_on):
+        return False
+    if stage.current is not None and not stage.current(manifest.stage_summary(stage.name)):
+        return False
+    return manifest.verify(stage.name)
+
+
+def input_fingerprint(stage, fingerprints):
+    """Fingerprint of a stage's inputs, or None unless every dependency has one"""
+    if not stage.depends_on or any(fingerprints.get(d) is None for d in stage.depends_on):
+        return None
+    inputs = {dependency: fingerprints[dependency] for dependency in sorted(stage.depends_on)}
+    return hashlib.sha256(json.dumps(inputs).encode()).hexdigest()
+
+
+def _run_stage(stage, inputs):
+    with metrics.stage(f"pipeline.{stage.name}"):
+        return stage.func(inputs)
+
+
+def run(stages, max_workers=4, log=print, manifest=None):
+    """
+    Run stages as soon as all their dependencies have finished.
+    Returns {stage name: result}. After the first failure no new stages
+    start; stages in flight finish and the failure is re-raised.
+    With a run manifest, finished stages are skipped and each completed
+    stage is recorded, and skip_unchanged stages are skipped when their
+    inputs match the manifest's record of their last successful run.
+    """
+    topological_order(stages)
+    by_name = {stage.name: stage for stage in stages}
+    pending = dict(by_name)
+    results = {}
+    fingerprints = {}
+    executed = set()
+    running = {}
+
+    def needed_by_pending(name):
+        """Conservatively: could a not-yet-started dependent actually run?"""
+        for stage in pending.values():
+            if name not in stage.depends_on:
+                continue
+            other_dependencies = [d for d in stage.depends_on if d != name]
+            if any(d not in results or d in executed for d in other_dependencies):
+                return True
+            if not _skip(stage, manifest, executed):
+                return True
+        return False
+
+    failure = None
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while (pending and failure is None) or running:
+            for name, stage in list(pending.items()):
+                if failure is not None:
+                    break
+                if not all(dependency in results for dependency in stage.depends_on):
+                    continue
+                del pending[name]
+
+                if _skip(stage, manifest, executed):
+                    summary = manifest.stage_summary(name)
+                    fingerprints[name] = manifest.stage_fingerprint(name)
+                    if stage.restore is not None and needed_by_pending(name):
+                        try:
+                            results[name] = stage.restore(summary)
+                            log(f"↷ [{name}] restored from checkpoint")
+                            continue
+                        except Exception as e:
+                            log(f"⚠️  [{name}] restore failed ({e}); running again")
+                    else:
+                        results[name] = summary
+                        log(f"↷ [{name}] already done, skipped")
+                        continue
+
+                input_key = input_fingerprint(stage, fingerprints)
+                if (stage.skip_unchanged and input_key is not None and manifest is not None
+                        and manifest.unchanged(name, input_key)
+                        and (stage.current is None or stage.current(manifest.previous(name)['summary']))):
+                    # Same inputs as a finished earlier run: nothing to redo
+                    previous = manifest.adopt_previous(name)
+                    results[name] = previous['summary']
+                    fingerprints[name] = previous['fingerprint']
+                    log(f"↷ [{name}] inputs unchanged since run {previous['run_id']}, skipped")
+                    continue
+
+                inputs = {dependency: results[dependency] for dependency in stage.depends_on}
+                if manifest is not None:
+                    if any(dependency in executed for dependency in stage.depends_on):
+                        manifest.clear_chunks(name)
+                    manifest.begin(name)
+                log(f"→ [{name}] started")
+                future = pool.submit(_run_stage, stage, inputs)
+                running[future] = (name, time.perf_counter())
+
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, started = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    # Let stages already in flight finish (and be recorded)
+                    log(f"✗ [{name}] failed")
+                    failure = failure or e
+                    continue
+                executed.add(name)
+                stage = by_name[name]
+                input_key = input_fingerprint(stage, fingerprints)
+                fingerprints[name] = stage.fingerprint(results[name]) if stage.fingerprint else input_key
+                if manifest is not None:
+                    summary = stage.summarize(results[name]) if stage.summarize else results[name]
+                    manifest.mark_done(name, summary, input_key=input_key, fingerprint=fingerprints[name])
+                marker = " (checkpoint)" if by_name[name].checkpoint else ""
+                log(f"✓ [{name}] finished in {time.perf_counter() - started:.1f}s{marker}")
+
+    if failure is not None:
+        raise failure
+    return results
@@ -0,0 +1,415 @@
+"""
+Provider lookup index: cardiology_providers as one Parquet artifact built
+for point and filter lookups. Rows are sorted by NPI (binary search);
+a `state_order` column lists the rows ordered by state, city and NPI, and
+per-state offsets into it are stored in the file metadata. Every matched
+taxonomy code of a row is in `taxonomy_codes`, a list of indexes into the
+metadata's `taxonomy_values`, read back as CSR offsets plus codes.
+The Lambda handlers import this module on their first request; keep
+module-level imports to what loading and querying the index needs.
+"""
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timezone
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import frame_io
+
+INDEX_KEY = 'provider-index/cardiology_providers.parquet'
+INDEX_VERSION = 2
+METADATA_KEY = b'provider_index'
+FETCH_ROWS = 100_000
+NPI_CHECK_PREFIX_SUM = 24  # Luhn contribution of the '80840' card issuer prefix
+
+INDEX_SCHEMA = pa.schema([
+    pa.field('npi', pa.int64(), nullable=False),
+    pa.field('provider_state', pa.dictionary(pa.int16(), pa.string())),
+    pa.field('provider_city', pa.dictionary(pa.int32(), pa.string())),
+    pa.field('specialty_code', pa.dictionary(pa.int16(), pa.string())),
+    pa.field('is_active', pa.bool_(), nullable=False),
+    pa.field('taxonomy_codes', pa.list_(pa.string())),
+])
+
+DICTIONARY_COLUMNS = ['provider_state', 'provider_city', 'specialty_code']
+
+
+def read_providers(conn, fetch_rows=FETCH_ROWS):
+    """cardiology_providers as an Arrow table with INDEX_SCHEMA"""
+    cursor = conn.cursor(name='provider_index')
+    cursor.execute(f"SELECT {', '.join(INDEX_SCHEMA.names)} FROM cardiology_providers")
+    batches = []
+    while True:
+        records = cursor.fetchmany(fetch_rows)
+        if not records:
+            break
+        columns = list(zip(*records))
+        batches.append(pa.RecordBatch.from_arrays([
+            pa.array([int(npi) for npi in columns[0]], pa.int64()),
+            pa.array(columns[1], pa.string()).dictionary_encode(),
+            pa.array(columns[2], pa.string()).dictionary_encode(),
+            pa.array(columns[3], pa.string()).dictionary_encode(),
+            pa.array(columns[4], pa.bool_()),
+            pa.array(columns[5], pa.list_(pa.string())),
+        ], names=INDEX_SCHEMA.names).cast(INDEX_SCHEMA))
+    cursor.close()
+    return pa.Table.from_batches(batches, schema=INDEX_SCHEMA)
+
+
+def from_processed(table):
+    """Index input from a processed (step 6) table"""
+    table = frame_io.to_processed(table)
+    return pa.table([
+        table['NPI'],
+        table['provider_state'],
+        table['provider_city'],
+        table['specialty_code'],
+        table['is_active'],
+        table['taxonomy_codes'],
+    ], schema=INDEX_SCHEMA)
+
+
+def build_index(table):
+    """
+    Index table from providers with INDEX_SCHEMA columns: sorted by NPI,
+    plus the state_order column and the state offsets in the metadata.
+    taxonomy_codes becomes a list of int16 indexes into the metadata's
+    taxonomy_values (a NULL list is empty).
+    """
+    import pyarrow.compute as pc
+
+    table = table.cast(INDEX_SCHEMA).sort_by('npi').combine_chunks()
+    taxonomy_lists = table['taxonomy_codes'].combine_chunks()
+    taxonomy_values = sorted(code for code in pc.unique(taxonomy_lists.flatten()).to_pylist()
+                             if code is not None)
+    codes = pc.index_in(taxonomy_lists.flatten(), value_set=pa.array(taxonomy_values, pa.string()))
+    table = table.set_column(
+        table.schema.get_field_index('taxonomy_codes'), 'taxonomy_codes',
+        pa.ListArray.from_arrays(
+            pc.subtract(taxonomy_lists.offsets, taxonomy_lists.offsets[0]),
+            pc.fill_null(codes, -1).cast(pa.int16())
+        )
+    )
+    rows = pa.array(np.arange(table.num_rows, dtype=np.int32))
+    by_state = pa.table({
+        'state': table['provider_state'].cast(pa.string()),
+        'city': table['provider_city'].cast(pa.string()),
+        'row': rows,
+    }).sort_by([('state', 'ascending'), ('city', 'ascending'), ('row', 'ascending')])
+
+    # Row counts per state in the same order (NULL last) give the offsets
+    counts = by_state.group_by('state').aggregate([('row', 'count')]).sort_by('state')
+    ends = np.cumsum(counts['row_count'].to_numpy())
+    offsets = {
+        state: [int(end - count), int(end)]
+        for state, count, end in zip(counts['state'].to_pylist(), counts['row_count'].to_pylist(), ends)
+        if state is not None
+    }
+
+    metadata = {
+        'version': INDEX_VERSION,
+        'rows': table.num_rows,
+        'built_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'state_offsets': offsets,
+        'taxonomy_values': taxonomy_values,
+    }
+    table = table.append_column('state_order', by_state['row'].combine_chunks())
+    return table.replace_schema_metadata({METADATA_KEY: json.dumps(metadata)})
+
+
+def fingerprint(index_table):
+    """SHA-256 of the index content, leaving out its build time"""
+    metadata = json.loads(index_table.schema.metadata[METADATA_KEY])
+    metadata.pop('built_at', None)
+    content = index_table.replace_schema_metadata({METADATA_KEY: json.dumps(metadata)})
+    return hashlib.sha256(frame_io.to_parquet_buffer(content)).hexdigest()
+
+
+def publish_index(s3, bucket, key, index_table):
+    """
+    Upload the index table as Parquet unless the published index has the
+    same content, so Lambdas polling with IfNoneMatch keep their copy.
+    Returns {'bytes', 'etag', 'skipped'}.
+    """
+    import s3_transfer
+
+    result = s3_transfer.put_if_changed(
+        s3, bucket, key, frame_io.to_parquet_buffer(index_table),
+        content_type='application/vnd.apache.parquet', sha256=fingerprint(index_table)
+    )
+    return {'bytes': result['bytes'], 'etag': result['etag'], 'skipped': result['skipped']}
+
+
+# The index is read through Arrow buffers: Array.to_numpy() and pyarrow.compute
+# import pandas, which would add ~400 ms to a Lambda cold start
+
+def _array(column):
+    return column.combine_chunks() if isinstance(column, pa.ChunkedArray) else column
+
+
+def _bits(buffer, offset, length):
+    """Arrow bitmap (validity or booleans) as a numpy bool array"""
+    bits = np.unpackbits(np.frombuffer(buffer, dtype=np.uint8), bitorder='little')
+    return bits[offset:offset + length].astype(bool)
+
+
+def _values(column, dtype):
+    """numpy view of a fixed-width column (NULL slots hold arbitrary values)"""
+    array = _array(column)
+    if not len(array):
+        return np.zeros(0, dtype=dtype)
+    if pa.types.is_boolean(array.type):
+        return _bits(array.buffers()[1], array.offset, len(array))
+    dtype = np.dtype(dtype)
+    return np.frombuffer(array.buffers()[1], dtype=dtype, count=len(array),
+                         offset=array.offset * dtype.itemsize)
+
+
+def _lists(column, dtype):
+    """(offsets, values) of a list column of fixed-width values, CSR style"""
+    array = _array(column)
+    offsets = np.frombuffer(array.buffers()[1], dtype=np.int32, count=len(array) + 1,
+                            offset=array.offset * 4)
+    return offsets, _values(array.values, dtype)
+
+
+def _codes(column):
+    """(codes with -1 for NULL, dictionary values) of a dictionary column"""
+    array = _array(column)
+    indices = array.indices
+    codes = _values(indices, indices.type.to_pandas_dtype()).astype(np.int32)
+    if indices.null_count:
+        codes[~_bits(indices.buffers()[0], indices.offset, len(indices))] = -1
+    return codes, array.dictionary.to_pylist()
+
+
+class ProviderIndex:
+    """
+    Read-only lookups over an index built by build_index. Every lookup
+    returns row numbers (ascending NPI for NPI lookups, state/city/NPI
+    order otherwise); records(rows) turns them into dicts.
+    The codes of row r are
+    matched_values[matched_codes[matched_offsets[r]:matched_offsets[r + 1]]].
+    """
+
+    def __init__(self, table):
+        metadata = json.loads(table.schema.metadata[METADATA_KEY])
+        if metadata['version'] != INDEX_VERSION:
+            raise ValueError(f"Unsupported provider index version {metadata['version']}")
+        self.metadata = metadata
+        self.state_offsets = metadata['state_offsets']
+        self.npi = _values(table['npi'], np.int64)
+        self.is_active = _values(table['is_active'], np.bool_)
+        self.state_order = _values(table['state_order'], np.int32)
+        table = table.unify_dictionaries()
+        self.states, self.state_values = _codes(table['provider_state'])
+        self.cities, self.city_values = _codes(table['provider_city'])
+        self.taxonomies, self.taxonomy_values = _codes(table['specialty_code'])
+        self.city_codes = {value: code for code, value in enumerate(self.city_values)}
+        self.taxonomy_codes = {value: code for code, value in enumerate(self.taxonomy_values)}
+        self.matched_offsets, self.matched_codes = _lists(table['taxonomy_codes'], np.int16)
+        self.matched_values = metadata['taxonomy_values']
+        self.matched_lookup = {value: code for code, value in enumerate(self.matched_values)}
+
+    # ParquetFile rather than pq.read_table: read_table imports
+    # pyarrow.dataset, about 300 ms of a Lambda cold start
+    @classmethod
+    def from_bytes(cls, data):
+        return cls(pq.ParquetFile(pa.BufferReader(data), read_dictionary=DICTIONARY_COLUMNS).read())
+
+    @classmethod
+    def from_file(cls, path):
+        return cls(pq.ParquetFile(path, read_dictionary=DICTIONARY_COLUMNS, memory_map=True).read())
+
+    def __len__(self):
+        return len(self.npi)
+
+    def find_npi(self, npi):
+        """Row number of an NPI, or None"""
+        position = int(np.searchsorted(self.npi, npi))
+        if position < len(self.npi) and self.npi[position] == npi:
+            return position
+        return None
+
+    def lookup(self, npis):
+        """Row number of every NPI in an array (one vectorized binary search), -1 where absent"""
+        npis = np.asarray(npis, dtype=np.int64)
+        if not len(self.npi):
+            return np.full(len(npis), -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.npi, npis), len(self.npi) - 1)
+        return np.where(self.npi[positions] == npis, positions, -1)
+
+    def _with_taxonomy(self, taxonomy):
+        """Boolean mask of the rows with `taxonomy` among their matched codes"""
+        code = self.matched_lookup.get(taxonomy.upper(), -2)
+        entries = np.flatnonzero(self.matched_codes[self.matched_offsets[0]:self.matched_offsets[-1]] == code)
+        mask = np.zeros(len(self.npi), dtype=bool)
+        mask[np.searchsorted(self.matched_offsets, entries + self.matched_offsets[0], side='right') - 1] = True
+        return mask
+
+    def search(self, state=None, city=None, taxonomy=None):
+        """
+        Rows matching every given filter (case-insensitive). `taxonomy`
+        matches any of a provider's matched taxonomy codes, not only its
+        primary specialty_code.
+        """
+        if state is not None:
+            start, end = self.state_offsets.get(state.upper(), (0, 0))
+            rows = self.state_order[start:end]
+        else:
+            rows = self.state_order
+        if city is not None:
+            # -2 matches nothing, not even NULL (-1)
+            code = self.city_codes.get(city.upper(), -2)
+            rows = rows[self.cities[rows] == code]
+        if taxonomy is not None:
+            rows = rows[self._with_taxonomy(taxonomy)[rows]]
+        return rows
+
+    def records(self, rows):
+        """Provider dicts for row numbers"""
+        return [
+            {
+                'npi': str(self.npi[row]),
+                'provider_state': _value(self.state_values, self.states[row]),
+                'provider_city': _value(self.city_values, self.cities[row]),
+                'specialty_code': _value(self.taxonomy_values, self.taxonomies[row]),
+                'taxonomy_codes': [
+                    self.matched_values[code]
+                    for code in self.matched_codes[self.matched_offsets[row]:self.matched_offsets[row + 1]]
+                ],
+                'is_active': bool(self.is_active[row]),
+            }
+            for row in rows
+        ]
+
+
+def _value(values, code):
+    return values[code] if code >= 0 else None
+
+
+def valid_npis(npis):
+    """
+    Check digits of an int64 array of 10-digit NPIs: Luhn over the first
+    nine digits with the '80840' prefix, as in the NPI standard
+    """
+    npis = np.asarray(npis, dtype=np.int64)
+    digits = (npis[:, None] // 10 ** np.arange(9, -1, -1, dtype=np.int64)) % 10
+    payload = digits[:, :9]
+    doubled = payload[:, 0::2] * 2
+    total = NPI_CHECK_PREFIX_SUM + (doubled // 10 + doubled % 10).sum(axis=1) + payload[:, 1::2].sum(axis=1)
+    in_range = (npis >= 1_000_000_000) & (npis <= 9_999_999_999)
+    return in_range & ((10 - total % 10) % 10 == digits[:, 9])
+
+
+def load_index(s3, bucket, key):
+    """(ProviderIndex, ETag) of the published index"""
+    response = s3.get_object(Bucket=bucket, Key=key)
+    return ProviderIndex.from_bytes(response['Body'].read()), response['ETag']
+
+
+# Per-process cache: survives between warm Lambda invocations
+_cache = {'index': None, 'etag': None, 'checked_at': 0.0}
+_clients = {}
+
+
+def _s3():
+    if 's3' not in _clients:
+        import boto3
+        _clients['s3'] = boto3.client('s3')
+    return _clients['s3']
+
+
+def reset_clients():
+    """Drop the cached S3 client (e.g. after a Lambda SnapStart restore)"""
+    _clients.clear()
+
+
+def cached_index():
+    """
+    The ProviderIndex for this process. Loaded from PROVIDER_INDEX_PATH or
+    from s3://PROVIDER_INDEX_BUCKET/PROVIDER_INDEX_KEY on first use; with
+    PROVIDER_INDEX_REFRESH_SECONDS set, a conditional GET at most that
+    often picks up a newly published index. S3 reads go through the local
+    object cache (unless disabled), so a restarted process whose /tmp
+    survived maps the index from disk instead of downloading it.
+    """
+    path = os.getenv('PROVIDER_INDEX_PATH')
+    if path:
+        if _cache['index'] is None:
+            _cache['index'] = ProviderIndex.from_file(path)
+        return _cache['index']
+
+    refresh = float(os.getenv('PROVIDER_INDEX_REFRESH_SECONDS', '0'))
+    now = time.monotonic()
+    if _cache['index'] is not None and (not refresh or now - _cache['checked_at'] < refresh):
+        return _cache['index']
+
+    import object_cache
+    from botocore.exceptions import ClientError
+
+    request = {
+        'Bucket': os.getenv('PROVIDER_INDEX_BUCKET', os.getenv('AWS_BUCKET')),
+        'Key': os.getenv('PROVIDER_INDEX_KEY', INDEX_KEY),
+    }
+    cache = object_cache.default_cache()
+    if cache is not None:
+        # The cache revalidates with If-None-Match itself
+        cached = cache.get(_s3(), request['Bucket'], request['Key'])
+        if cached.etag != _cache['etag']:
+            _cache['index'] = ProviderIndex.from_bytes(cached.buffer())
+            _cache['etag'] = cached.etag
+        _cache['checked_at'] = now
+        return _cache['index']
+    if _cache['etag']:
+        request['IfNoneMatch'] = _cache['etag']
+    try:
+        response = _s3().get_object(**request)
+    except ClientError as e:
+        if e.response['Error']['Code'] not in ('304', 'NotModified'):
+            raise
+    else:
+        _cache['index'] = ProviderIndex.from_bytes(response['Body'].read())
+        _cache['etag'] = response['ETag']
+    _cache['checked_at'] = now
+    return _cache['index']
+
+
+def main():
+    from dotenv import load_dotenv
+    import connections
+
+    load_dotenv()
+
+    print("=" * 70)
+    print("Provider Index: Build and Publish")
+    print("=" * 70)
+
+    bucket = os.getenv('PROVIDER_INDEX_BUCKET', os.getenv('AWS_BUCKET'))
+    key = os.getenv('PROVIDER_INDEX_KEY', INDEX_KEY)
+
+    print("\n### Building index from PostgreSQL ###")
+    start = time.perf_counter()
+    with connections.pg_connection() as conn:
+        index_table = build_index(read_providers(conn))
+    print(f"✓ {index_table.num_rows:,} providers indexed in {time.perf_counter() - start:.1f}s")
+
+    output_path = os.getenv('PROVIDER_INDEX_PATH')
+    if output_path:
+        pq.write_table(index_table, output_path, compression='zstd')
+        print(f"✓ Written to {output_path}")
+
+    print("\n### Publishing to S3 ###")
+    result = publish_index(connections.get_aws_s3_client(), bucket, key, index_table)
+    print(f"✓ s3://{bucket}/{key} ({result['bytes'] / 1024**2:.1f} MB)")
+    connections.close_all()
+
+    print("\n" + "=" * 70)
+    print("Provider index published!")
+    print("=" * 70)
+
+if __name__ == "__main__":
+    main()
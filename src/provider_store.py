@@ -0,0 +1,328 @@
+"""
+Compact provider store for row-level work in Python. NPIs are a sorted
+uint64 array; state, city and specialty code are dictionary-encoded as small
+integer codes (-1 for NULL) over shared string tables; enumeration year
+is int16 (0 when unknown) and the active flag a bool. That is about 18
+bytes per provider, where a list of row lists costs several hundred.
+Filters, group counts and NPI lookups are vectorized numpy, and the store
+saves to a single file that loads memory-mapped.
+
+    PROVIDER_STORE_PATH=data/cardiology_providers.store python src/provider_store.py
+"""
+import json
+import mmap
+import os
+import struct
+import time
+import numpy as np
+
+DEFAULT_STORE_PATH = 'data/cardiology_providers.store'
+STORE_VERSION = 1
+MAGIC = b'NPISTORE'
+ALIGNMENT = 64
+FETCH_ROWS = 100_000
+
+DICTIONARY_COLUMNS = ['provider_state', 'provider_city', 'specialty_code']
+COLUMNS = ['npi'] + DICTIONARY_COLUMNS + ['enumeration_year', 'is_active']
+
+# Filter keyword → dictionary column
+# specialty is the primary specialty (first matching taxonomy slot)
+FILTERS = {'state': 'provider_state', 'city': 'provider_city', 'specialty': 'specialty_code'}
+
+
+def _code_dtype(values):
+    """Smallest signed integer type holding codes for `values` plus -1 for NULL"""
+    for dtype in (np.int8, np.int16, np.int32):
+        if len(values) <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def _aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+class ProviderStore:
+    """
+    Providers sorted by NPI, one numpy array per column. Row numbers index
+    every array; records(rows) turns them into dicts.
+    """
+
+    def __init__(self, npi, codes, values, enumeration_year, is_active, source=None):
+        self.npi = npi
+        self.codes = codes    # column → int codes, -1 for NULL
+        self.values = values  # column → string table
+        self.enumeration_year = enumeration_year
+        self.is_active = is_active
+        self._lookup = {column: {value: code for code, value in enumerate(values[column])}
+                        for column in DICTIONARY_COLUMNS}
+        self._source = source  # keeps a mapped file open while the arrays view it
+
+    @classmethod
+    def from_arrow(cls, table):
+        """
+        Store from an Arrow table with the processed (step 6) or index
+        columns; without is_active every provider is active
+        """
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        if 'NPI' in table.column_names:
+            table = table.rename_columns(['npi' if name == 'NPI' else name for name in table.column_names])
+        table = table.sort_by('npi').combine_chunks()
+        npi = table['npi'].cast(pa.uint64()).to_numpy()
+
+        codes, values = {}, {}
+        for column in DICTIONARY_COLUMNS:
+            array = table[column].combine_chunks()
+            if pa.types.is_dictionary(array.type):
+                array = array.dictionary_decode()
+            encoded = array.cast(pa.string()).dictionary_encode()
+            values[column] = encoded.dictionary.to_pylist()
+            dtype = _code_dtype(values[column])
+            codes[column] = pc.fill_null(encoded.indices, -1).to_numpy().astype(dtype)
+
+        if 'enumeration_year' in table.column_names:
+            enumeration_year = pc.fill_null(table['enumeration_year'].cast(pa.int16()), 0).to_numpy()
+        else:
+            enumeration_year = np.zeros(len(npi), dtype=np.int16)
+        if 'is_active' in table.column_names:
+            is_active = pc.fill_null(table['is_active'], True).to_numpy(zero_copy_only=False)
+        else:
+            is_active = np.ones(len(npi), dtype=bool)
+        return cls(npi, codes, values, enumeration_year.astype(np.int16), is_active.astype(bool))
+
+    @classmethod
+    def from_postgres(cls, conn, table='cardiology_providers', fetch_rows=FETCH_ROWS):
+        """Store from a provider table, read in fetch_rows batches through a server-side cursor"""
+        import pyarrow as pa
+
+        cursor = conn.cursor(name='provider_store')
+        cursor.execute(f"SELECT {', '.join(COLUMNS)} FROM {table}")
+        batches = []
+        while True:
+            records = cursor.fetchmany(fetch_rows)
+            if not records:
+                break
+            columns = list(zip(*records))
+            batches.append(pa.RecordBatch.from_arrays([
+                pa.array([int(npi) for npi in columns[0]], pa.int64()),
+                pa.array(columns[1], pa.string()),
+                pa.array(columns[2], pa.string()),
+                pa.array(columns[3], pa.string()),
+                pa.array(columns[4], pa.int16()),
+                pa.array(columns[5], pa.bool_()),
+            ], names=COLUMNS))
+        cursor.close()
+        if not batches:
+            return cls.from_arrow(pa.table({
+                'npi': pa.array([], pa.int64()),
+                **{column: pa.array([], pa.string()) for column in DICTIONARY_COLUMNS},
+            }))
+        return cls.from_arrow(pa.Table.from_batches(batches))
+
+    # On-disk layout: MAGIC, header length (uint64 little-endian), JSON
+    # header, then every array at an ALIGNMENT boundary, so a mapped file
+    # is used in place
+
+    def _arrays(self):
+        arrays = {'npi': self.npi, 'enumeration_year': self.enumeration_year, 'is_active': self.is_active}
+        arrays.update(self.codes)
+        return arrays
+
+    def to_bytes(self):
+        """The store file's content"""
+        arrays = self._arrays()
+        layout, offset = {}, 0
+        for name, array in arrays.items():
+            offset = _aligned(offset)
+            layout[name] = [array.dtype.str, offset]
+            offset += array.nbytes
+        header = json.dumps({
+            'version': STORE_VERSION,
+            'rows': len(self),
+            'arrays': layout,
+            'values': self.values,
+        }).encode()
+        data_start = _aligned(len(MAGIC) + 8 + len(header))
+        output = bytearray(data_start + offset)
+        output[:len(MAGIC) + 8 + len(header)] = MAGIC + struct.pack('<Q', len(header)) + header
+        for name, array in arrays.items():
+            start = data_start + layout[name][1]
+            output[start:start + array.nbytes] = np.ascontiguousarray(array).tobytes()
+        return bytes(output)
+
+    def save(self, path):
+        """Write the store to `path` (atomically, through a temp file); returns the bytes written"""
+        data = self.to_bytes()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(path + '.tmp', path)
+        return len(data)
+
+    @classmethod
+    def from_buffer(cls, buffer):
+        """Store viewing a bytes-like or mmap buffer holding a saved store (no copy)"""
+        view = memoryview(buffer)
+        if bytes(view[:len(MAGIC)]) != MAGIC:
+            raise ValueError("Not a provider store")
+        header_length = struct.unpack_from('<Q', view, len(MAGIC))[0]
+        header_start = len(MAGIC) + 8
+        header = json.loads(bytes(view[header_start:header_start + header_length]))
+        if header['version'] != STORE_VERSION:
+            raise ValueError(f"Unsupported provider store version {header['version']}")
+        data_start = _aligned(header_start + header_length)
+        arrays = {
+            name: np.frombuffer(view, dtype=np.dtype(dtype), count=header['rows'], offset=data_start + offset)
+            for name, (dtype, offset) in header['arrays'].items()
+        }
+        return cls(
+            arrays['npi'],
+            {column: arrays[column] for column in DICTIONARY_COLUMNS},
+            header['values'],
+            arrays['enumeration_year'],
+            arrays['is_active'],
+            source=buffer
+        )
+
+    @classmethod
+    def from_file(cls, path):
+        """Memory-map a saved store: pages are read as the arrays are touched"""
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls.from_buffer(mapped)
+
+    def __len__(self):
+        return len(self.npi)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the column arrays (string tables excluded)"""
+        return sum(array.nbytes for array in self._arrays().values())
+
+    def find(self, npi):
+        """Row number of an NPI, or None"""
+        position = int(np.searchsorted(self.npi, np.uint64(npi)))
+        if position < len(self.npi) and self.npi[position] == npi:
+            return position
+        return None
+
+    def lookup(self, npis):
+        """Row number of every NPI in an array (one vectorized binary search), -1 where absent"""
+        npis = np.asarray(npis, dtype=np.uint64)
+        if not len(self.npi):
+            return np.full(len(npis), -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.npi, npis), len(self.npi) - 1)
+        return np.where(self.npi[positions] == npis, positions, -1)
+
+    def code(self, column, value):
+        """Code of a value in a dictionary column (case-insensitive); -1 for None, -2 if absent"""
+        if value is None:
+            return -1
+        return self._lookup[column].get(value.upper(), -2)
+
+    def mask(self, state=None, city=None, specialty=None, active=None, year=None):
+        """Boolean array of the rows matching every given filter"""
+        selected = np.ones(len(self), dtype=bool)
+        for name, value in (('state', state), ('city', city), ('specialty', specialty)):
+            if value is not None:
+                column = FILTERS[name]
+                selected &= self.codes[column] == self.code(column, value)
+        if active is not None:
+            selected &= self.is_active == bool(active)
+        if year is not None:
+            selected &= self.enumeration_year == int(year)
+        return selected
+
+    def filter(self, **filters):
+        """Row numbers (ascending NPI) matching mask(**filters)"""
+        return np.flatnonzero(self.mask(**filters))
+
+    def group_count(self, column, rows=None):
+        """
+        {value: providers} for a dictionary column or enumeration_year,
+        largest first, over `rows` (row numbers or a mask) or every row.
+        NULL (or an unknown year) counts under None.
+        """
+        if column == 'enumeration_year':
+            years = self.enumeration_year if rows is None else self.enumeration_year[rows]
+            keys, counts = np.unique(years, return_counts=True)
+            labels = [int(key) or None for key in keys]
+        else:
+            codes = self.codes[column] if rows is None else self.codes[column][rows]
+            counts = np.bincount(codes.astype(np.int64) + 1, minlength=len(self.values[column]) + 1)
+            labels = [None] + self.values[column]
+        order = np.argsort(-counts, kind='stable')
+        return {labels[position]: int(counts[position]) for position in order if counts[position]}
+
+    def records(self, rows):
+        """Provider dicts for row numbers"""
+        return [
+            {
+                'npi': str(self.npi[row]),
+                **{column: _value(self.values[column], self.codes[column][row]) for column in DICTIONARY_COLUMNS},
+                'enumeration_year': int(self.enumeration_year[row]) or None,
+                'is_active': bool(self.is_active[row]),
+            }
+            for row in rows
+        ]
+
+
+def _value(values, code):
+    return values[code] if code >= 0 else None
+
+
+def main():
+    from dotenv import load_dotenv
+    import connections
+
+    load_dotenv()
+
+    print("=" * 70)
+    print("Provider Store: Build and Map")
+    print("=" * 70)
+
+    path = os.getenv('PROVIDER_STORE_PATH', DEFAULT_STORE_PATH)
+
+    print("\n### Building store from PostgreSQL ###")
+    start = time.perf_counter()
+    with connections.pg_connection() as conn:
+        store = ProviderStore.from_postgres(conn)
+    written = store.save(path)
+    print(f"✓ {len(store):,} providers in {time.perf_counter() - start:.1f}s")
+    print(f"✓ {store.nbytes / 1024**2:.1f} MB of arrays "
+          f"({store.nbytes / max(len(store), 1):.1f} bytes/provider), {written:,} bytes written to {path}")
+    connections.close_all()
+
+    print("\n### Memory-mapped queries ###")
+    start = time.perf_counter()
+    store = ProviderStore.from_file(path)
+    print(f"✓ Mapped in {(time.perf_counter() - start) * 1000:.2f} ms")
+
+    start = time.perf_counter()
+    states = store.group_count('provider_state')
+    print(f"✓ Providers by state ({(time.perf_counter() - start) * 1000:.2f} ms):")
+    for state, count in list(states.items())[:5]:
+        print(f"  {state}: {count:,}")
+
+    if states:
+        state = next(iter(states))
+        start = time.perf_counter()
+        rows = store.filter(state=state, active=True)
+        print(f"✓ {len(rows):,} active providers in {state} ({(time.perf_counter() - start) * 1000:.2f} ms)")
+
+    if len(store):
+        npis = store.npi[::max(len(store) // 1000, 1)]
+        start = time.perf_counter()
+        found = store.lookup(npis)
+        print(f"✓ {int((found >= 0).sum()):,} of {len(npis):,} NPIs looked up "
+              f"in {(time.perf_counter() - start) * 1000:.2f} ms")
+        print(f"✓ Sample: {store.records(found[:1])[0]}")
+
+    print("\n" + "=" * 70)
+    print("Provider store ready!")
+    print("=" * 70)
+
+if __name__ == "__main__":
+    main()
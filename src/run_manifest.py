@@ -0,0 +1,193 @@
+"""
+Run manifest: a JSON object in MinIO recording which pipeline stages have
+finished, the last committed chunk of chunked stages, and the content hashes
+of the objects each stage wrote, so a re-run can skip finished work.
+
+Across runs, the latest successful run of each stage (its input
+fingerprint, summary and objects) is kept in pipeline-runs/latest-stages.json
+so a new run can skip stages whose inputs have not changed.
+"""
+import json
+import threading
+from datetime import datetime, timezone
+
+import connections
+
+MANIFEST_BUCKET = 'processed-data'
+MANIFEST_PREFIX = 'pipeline-runs/'
+HISTORY_KEY = f"{MANIFEST_PREFIX}latest-stages.json"
+
+# store name → client factory, for verifying recorded objects
+STORES = {
+    'minio': connections.get_minio_client,
+    'aws': connections.get_aws_s3_client,
+}
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+
+def new_run_id():
+    """Sortable run id based on the current UTC time"""
+    return datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _verify_objects(objects):
+    """True if every recorded object still exists with the same ETag"""
+    for obj in objects:
+        s3 = STORES[obj['store']]()
+        try:
+            head = s3.head_object(Bucket=obj['bucket'], Key=obj['key'])
+        except Exception:
+            return False
+        if obj['etag'] and head['ETag'] != obj['etag']:
+            return False
+    return True
+
+
+class RunManifest:
+    """Manifest for one run id, saved to MinIO after every change"""
+
+    def __init__(self, s3, run_id, bucket=MANIFEST_BUCKET):
+        self._s3 = s3
+        self._bucket = bucket
+        self._lock = threading.Lock()
+        self.run_id = run_id
+        self.key = f"{MANIFEST_PREFIX}{run_id}.json"
+        self.data = {'run_id': run_id, 'created_at': _now(), 'stages': {}, 'chunks': {}}
+        self.history = {}
+
+    @classmethod
+    def open(cls, s3, run_id, bucket=MANIFEST_BUCKET):
+        """Load the manifest for run_id, or start an empty one"""
+        manifest = cls(s3, run_id, bucket)
+        try:
+            body = s3.get_object(Bucket=bucket, Key=manifest.key)['Body'].read()
+            manifest.data = json.loads(body)
+        except s3.exceptions.NoSuchKey:
+            pass
+        try:
+            body = s3.get_object(Bucket=bucket, Key=HISTORY_KEY)['Body'].read()
+            manifest.history = json.loads(body)
+        except s3.exceptions.NoSuchKey:
+            pass
+        return manifest
+
+    @property
+    def resumed(self):
+        return bool(self.data['stages'] or self.data['chunks'])
+
+    def save(self, history=False):
+        # Held across the PUT so concurrent stages cannot write an older snapshot last
+        with self._lock:
+            documents = [(self.key, self.data)] + ([(HISTORY_KEY, self.history)] if history else [])
+            for key, document in documents:
+                body = json.dumps(document, indent=2, default=str).encode('utf-8')
+                self._s3.put_object(
+                    Bucket=self._bucket, Key=key, Body=body, ContentType='application/json'
+                )
+
+    # Stages
+
+    def is_done(self, stage):
+        return self.data['stages'].get(stage, {}).get('status') == 'done'
+
+    def stage_summary(self, stage):
+        return self.data['stages'].get(stage, {}).get('summary')
+
+    def stage_fingerprint(self, stage):
+        return self.data['stages'].get(stage, {}).get('fingerprint')
+
+    def mark_done(self, stage, summary=None, input_key=None, fingerprint=None):
+        """
+        Record a finished stage. With an input fingerprint it also becomes
+        the stage's latest run, which later runs compare against.
+        """
+        with self._lock:
+            entry = self.data['stages'].setdefault(stage, {})
+            entry.update({'status': 'done', 'finished_at': _now(), 'summary': summary,
+                          'input': input_key, 'fingerprint': fingerprint})
+            self.data['chunks'].pop(stage, None)
+            if input_key is not None:
+                self.history[stage] = {
+                    'run_id': self.run_id,
+                    'input': input_key,
+                    'fingerprint': fingerprint,
+                    'summary': summary,
+                    'objects': entry.get('objects', []),
+                }
+        self.save(history=input_key is not None)
+
+    def unchanged(self, stage, input_key):
+        """
+        True if the stage's latest run had the same input fingerprint and
+        its objects are still in place
+        """
+        previous = self.history.get(stage)
+        return (previous is not None and previous['input'] == input_key
+                and _verify_objects(previous['objects']))
+
+    def previous(self, stage):
+        """The stage's latest run {'run_id', 'input', 'fingerprint', 'summary', 'objects'}, or None"""
+        return self.history.get(stage)
+
+    def adopt_previous(self, stage):
+        """Mark `stage` done with the result of its latest run, which is returned"""
+        previous = self.history[stage]
+        with self._lock:
+            self.data['stages'][stage] = {
+                'status': 'done',
+                'finished_at': _now(),
+                'unchanged_since': previous['run_id'],
+                'summary': previous['summary'],
+                'input': previous['input'],
+                'fingerprint': previous['fingerprint'],
+                'objects': previous['objects'],
+            }
+            self.data['chunks'].pop(stage, None)
+        self.save()
+        return previous
+
+    def record_object(self, stage, store, bucket, key, sha256=None, etag=None, size=None):
+        """Remember an object written by `stage` so a re-run can verify it"""
+        with self._lock:
+            entry = self.data['stages'].setdefault(stage, {})
+            entry.setdefault('objects', []).append({
+                'store': store,
+                'bucket': bucket,
+                'key': key,
+                'sha256': sha256,
+                'etag': etag,
+                'size': size,
+            })
+        self.save()
+
+    def verify(self, stage):
+        """True if every object recorded for `stage` still has the same ETag"""
+        return _verify_objects(self.data['stages'].get(stage, {}).get('objects', []))
+
+    def begin(self, stage):
+        """
+        Mark a stage as running: drop its status and recorded objects but
+        keep its chunk offset, so a chunked stage can continue where it stopped
+        """
+        with self._lock:
+            self.data['stages'][stage] = {'status': 'running', 'started_at': _now()}
+        self.save()
+
+    # Chunk offsets
+
+    def chunk_offset(self, stage):
+        return self.data['chunks'].get(stage, 0)
+
+    def record_chunk(self, stage, offset):
+        with self._lock:
+            self.data['chunks'][stage] = offset
+        self.save()
+
+    def clear_chunks(self, stage):
+        if stage in self.data['chunks']:
+            with self._lock:
+                self.data['chunks'].pop(stage, None)
+            self.save()
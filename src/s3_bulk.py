@@ -0,0 +1,211 @@
+"""
+Bulk object operations for MinIO / S3 on a thread pool: concurrent
+uploads, downloads, gets, puts and heads of many keys, paginated listing,
+batched deletes, and prefix copies that stay server-side when both
+clients talk to the same store. boto3 clients are thread-safe; keep
+S3_BULK_WORKERS at or below S3_MAX_POOL_CONNECTIONS.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+
+import s3_transfer
+
+DEFAULT_WORKERS = 16
+DELETE_BATCH = 1000  # delete_objects accepts at most 1,000 keys
+
+
+def _workers(max_workers=None):
+    return int(max_workers or os.getenv('S3_BULK_WORKERS', DEFAULT_WORKERS))
+
+
+def _transfer_config(part_size=s3_transfer.DEFAULT_PART_SIZE):
+    # Parts per key stay few, since many keys are already in flight
+    return TransferConfig(multipart_threshold=part_size, multipart_chunksize=part_size,
+                          max_concurrency=s3_transfer.DEFAULT_PART_WORKERS)
+
+
+def run(func, items, max_workers=None):
+    """func(*item) for every item on a thread pool; results in item order, first error raised"""
+    items = list(items)
+    if not items:
+        return []
+    with ThreadPoolExecutor(max_workers=min(_workers(max_workers), len(items))) as pool:
+        futures = [pool.submit(func, *item) for item in items]
+        return [future.result() for future in futures]
+
+
+def iter_objects(s3, bucket, prefix=''):
+    """Object summaries (Key, Size, ETag, ...) under a prefix, across all pages"""
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        yield from page.get('Contents', [])
+
+
+def list_keys(s3, bucket, prefix=''):
+    """Every key under a prefix, directory markers excluded"""
+    return [obj['Key'] for obj in iter_objects(s3, bucket, prefix) if not obj['Key'].endswith('/')]
+
+
+def _create_bucket(s3, bucket):
+    # us-east-1 answers CreateBucket on an owned bucket with 200, so check first
+    try:
+        s3.head_bucket(Bucket=bucket)
+        return bucket, False
+    except ClientError as e:
+        if e.response['Error']['Code'] not in ('404', 'NoSuchBucket', 'NotFound'):
+            raise
+    try:
+        s3.create_bucket(Bucket=bucket)
+        return bucket, True
+    except (s3.exceptions.BucketAlreadyOwnedByYou, s3.exceptions.BucketAlreadyExists):
+        return bucket, False
+
+
+def ensure_buckets(s3, buckets, max_workers=None):
+    """Create the buckets that do not exist yet, concurrently; returns {bucket: created}"""
+    return dict(run(_create_bucket, [(s3, bucket) for bucket in dict.fromkeys(buckets)], max_workers))
+
+
+def _head(s3, bucket, key):
+    return key, s3_transfer.head_or_none(s3, bucket, key)
+
+
+def head_objects(s3, bucket, keys, max_workers=None):
+    """{key: head_object response, or None when missing}"""
+    return dict(run(_head, [(s3, bucket, key) for key in keys], max_workers))
+
+
+def _get(s3, bucket, key):
+    return key, s3.get_object(Bucket=bucket, Key=key)['Body'].read()
+
+
+def get_objects(s3, bucket, keys, max_workers=None):
+    """{key: bytes} for small objects read whole"""
+    return dict(run(_get, [(s3, bucket, key) for key in keys], max_workers))
+
+
+def _put(s3, bucket, key, data, content_type):
+    return key, s3.put_object(Bucket=bucket, Key=key, Body=data, ContentType=content_type)['ETag']
+
+
+def put_objects(s3, bucket, objects, content_type='binary/octet-stream', max_workers=None):
+    """Write {key: bytes} concurrently; returns {key: etag}"""
+    return dict(run(_put, [(s3, bucket, key, data, content_type) for key, data in objects.items()],
+                    max_workers))
+
+
+def _upload(s3, path, bucket, key, config):
+    s3.upload_file(path, bucket, key, Config=config)
+    return {'key': key, 'bytes': os.path.getsize(path)}
+
+
+def upload_files(s3, files, bucket, max_workers=None, part_size=s3_transfer.DEFAULT_PART_SIZE):
+    """
+    Upload {key: local path} concurrently (multipart above part_size).
+    Returns {'key', 'bytes'} per file in key order.
+    """
+    config = _transfer_config(part_size)
+    return run(_upload, [(s3, files[key], bucket, key, config) for key in sorted(files)], max_workers)
+
+
+def _download(s3, bucket, key, path, config):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    s3.download_file(bucket, key, path, Config=config)
+    return {'key': key, 'bytes': os.path.getsize(path)}
+
+
+def download_files(s3, bucket, files, max_workers=None, part_size=s3_transfer.DEFAULT_PART_SIZE):
+    """
+    Download {key: local path} concurrently (ranged parts above part_size).
+    Returns {'key', 'bytes'} per file in key order.
+    """
+    config = _transfer_config(part_size)
+    return run(_download, [(s3, bucket, key, files[key], config) for key in sorted(files)], max_workers)
+
+
+def _delete_batch(s3, bucket, keys):
+    response = s3.delete_objects(
+        Bucket=bucket,
+        Delete={'Objects': [{'Key': key} for key in keys], 'Quiet': True}
+    )
+    return response.get('Errors', [])
+
+
+def delete_keys(s3, bucket, keys, max_workers=None):
+    """
+    Delete keys with one delete_objects request per 1,000, requests in
+    parallel. Returns the number of keys deleted; raises RuntimeError if
+    the store refused any.
+    """
+    keys = list(keys)
+    batches = [(s3, bucket, keys[start:start + DELETE_BATCH]) for start in range(0, len(keys), DELETE_BATCH)]
+    errors = [error for batch_errors in run(_delete_batch, batches, max_workers) for error in batch_errors]
+    if errors:
+        raise RuntimeError(f"{len(errors)} of {len(keys)} key(s) not deleted from {bucket}, "
+                           f"e.g. {errors[0]['Key']}: {errors[0].get('Message', errors[0].get('Code'))}")
+    return len(keys)
+
+
+def delete_prefix(s3, bucket, prefix, max_workers=None):
+    """Delete every object under a prefix; returns the number deleted"""
+    return delete_keys(s3, bucket, [obj['Key'] for obj in iter_objects(s3, bucket, prefix)], max_workers)
+
+
+def same_store(src, dst):
+    """True when both clients reach the same endpoint and region, so a copy can stay server-side"""
+    return src is dst or (src.meta.endpoint_url == dst.meta.endpoint_url
+                          and src.meta.region_name == dst.meta.region_name)
+
+
+def _server_copy(s3, src_bucket, src_key, size, bucket, key, config):
+    # copy() issues CopyObject, or UploadPartCopy parts for large objects;
+    # no bytes pass through this process. A multipart copy gets a new ETag,
+    # so the copy records the source's, like s3_transfer.copy_object does,
+    # for is_copy_of to recognize it on the next run.
+    head = s3.head_object(Bucket=src_bucket, Key=src_key)
+    metadata = dict(head.get('Metadata', {}), **{s3_transfer.SOURCE_ETAG_METADATA: head['ETag']})
+    s3.copy({'Bucket': src_bucket, 'Key': src_key}, bucket, key, Config=config, ExtraArgs={
+        'ContentType': head.get('ContentType', 'binary/octet-stream'),
+        'Metadata': metadata,
+        'MetadataDirective': 'REPLACE',
+    })
+    return {'key': key, 'size': size, 'parts': 1, 'resumed_parts': 0, 'server_side': True, 'skipped': False}
+
+
+def _stream_copy(src, src_bucket, src_key, size, dst, bucket, key, copy_options):
+    result = s3_transfer.copy_object(src, src_bucket, src_key, dst, bucket, key, **copy_options)
+    return dict(result, server_side=False, skipped=False)
+
+
+def copy_prefix(src, src_bucket, prefix, dst, bucket, dst_prefix, max_workers=None,
+                part_size=s3_transfer.DEFAULT_PART_SIZE, part_workers=s3_transfer.DEFAULT_PART_WORKERS):
+    """
+    Copy every object under `prefix` to `dst_prefix`, max_workers keys at a
+    time: server-side within one store, otherwise streamed between stores
+    with s3_transfer.copy_object. Targets that already hold the source
+    version (same ETag, or recorded as copied from it) are skipped.
+    Returns the per-key transfer dicts in key order.
+    """
+    objects = [obj for obj in iter_objects(src, src_bucket, prefix) if not obj['Key'].endswith('/')]
+    targets = [dst_prefix + obj['Key'][len(prefix):] for obj in objects]
+    heads = head_objects(dst, bucket, targets, max_workers)
+    results = {
+        target: {'key': target, 'size': obj['Size'], 'parts': 0, 'resumed_parts': 0,
+                 'server_side': False, 'skipped': True}
+        for obj, target in zip(objects, targets) if s3_transfer.is_copy_of(heads[target], obj['ETag'])
+    }
+    pending = [(obj, target) for obj, target in zip(objects, targets) if target not in results]
+    if same_store(src, dst):
+        config = _transfer_config(max(part_size, s3_transfer.MIN_PART_SIZE))
+        items = [(dst, src_bucket, obj['Key'], obj['Size'], bucket, target, config)
+                 for obj, target in pending]
+        copied = run(_server_copy, items, max_workers)
+    else:
+        copy_options = {'part_size': part_size, 'part_workers': part_workers}
+        items = [(src, src_bucket, obj['Key'], obj['Size'], dst, bucket, target, copy_options)
+                 for obj, target in pending]
+        copied = run(_stream_copy, items, max_workers)
+    results.update((result['key'], result) for result in copied)
+    return [results[target] for target in targets]
@@ -0,0 +1,403 @@
+"""
+Streaming S3 transfers: copy objects between stores (AWS S3 ↔ MinIO)
+with parallel, resumable multipart uploads and bounded memory, and
+content-addressed uploads that skip objects already stored unchanged
+"""
+import hashlib
+import io
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+
+DEFAULT_PART_SIZE = 64 * 1024**2
+MIN_PART_SIZE = 5 * 1024**2
+DEFAULT_PART_WORKERS = 4
+DEFAULT_KEY_WORKERS = 4
+DEFAULT_SPOOL_SIZE = 64 * 1024**2
+
+# User metadata (x-amz-meta-*) fingerprinting an object's content
+SHA256_METADATA = 'sha256'
+SOURCE_ETAG_METADATA = 'source-etag'  # ETag of the object a copy was made from
+
+
+def _state_path(bucket, key):
+    """Local file remembering an in-progress multipart upload"""
+    state_dir = os.getenv('TRANSFER_STATE_DIR', os.path.join(tempfile.gettempdir(), 'nppes-transfer-state'))
+    os.makedirs(state_dir, exist_ok=True)
+    digest = hashlib.sha1(f"{bucket}/{key}".encode('utf-8')).hexdigest()
+    return os.path.join(state_dir, f"{digest}.json")
+
+
+def _load_state(bucket, key):
+    path = _state_path(bucket, key)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _save_state(bucket, key, state):
+    with open(_state_path(bucket, key), 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+
+
+def _clear_state(bucket, key):
+    path = _state_path(bucket, key)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _uploaded_parts(dst, bucket, key, upload_id):
+    """{part_number: etag} for parts already stored in an open upload"""
+    parts = {}
+    paginator = dst.get_paginator('list_parts')
+    for page in paginator.paginate(Bucket=bucket, Key=key, UploadId=upload_id):
+        for part in page.get('Parts', []):
+            parts[part['PartNumber']] = part['ETag']
+    return parts
+
+
+def _resume_upload(dst, bucket, key, source_etag, part_size):
+    """
+    Reuse the upload recorded for this destination when it still exists and
+    was started from the same source version; otherwise abort it.
+    Returns (upload_id, done_parts) or (None, {}).
+    """
+    state = _load_state(bucket, key)
+    if not state:
+        return None, {}
+    if state['source_etag'] == source_etag and state['part_size'] == part_size:
+        try:
+            return state['upload_id'], _uploaded_parts(dst, bucket, key, state['upload_id'])
+        except dst.exceptions.NoSuchUpload:
+            pass
+    else:
+        try:
+            dst.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=state['upload_id'])
+        except dst.exceptions.NoSuchUpload:
+            pass
+    _clear_state(bucket, key)
+    return None, {}
+
+
+def _copy_part(src, src_bucket, src_key, source_etag, dst, bucket, key, upload_id,
+               part_number, start, end):
+    """Ranged GET of one part from the source, then upload_part to the target"""
+    response = src.get_object(
+        Bucket=src_bucket,
+        Key=src_key,
+        Range=f"bytes={start}-{end}",
+        IfMatch=source_etag
+    )
+    data = response['Body'].read()
+    result = dst.upload_part(
+        Bucket=bucket,
+        Key=key,
+        UploadId=upload_id,
+        PartNumber=part_number,
+        Body=data
+    )
+    return part_number, result['ETag']
+
+
+def copy_object(src, src_bucket, src_key, dst, bucket, key,
+                part_size=DEFAULT_PART_SIZE, part_workers=DEFAULT_PART_WORKERS,
+                content_type=None):
+    """
+    Copy one object between stores without holding it in memory.
+    Objects up to part_size are streamed in a single upload; larger ones are
+    copied as a multipart upload with part_workers parts in flight, resuming
+    an interrupted upload of the same source version.
+    Returns a dict describing the transfer.
+    """
+    part_size = max(part_size, MIN_PART_SIZE)
+    head = src.head_object(Bucket=src_bucket, Key=src_key)
+    size = head['ContentLength']
+    source_etag = head['ETag']
+    content_type = content_type or head.get('ContentType', 'binary/octet-stream')
+
+    # The copy keeps the source's fingerprint and remembers its ETag
+    metadata = dict(head.get('Metadata', {}), **{SOURCE_ETAG_METADATA: source_etag})
+
+    if size <= part_size:
+        body = src.get_object(Bucket=src_bucket, Key=src_key, IfMatch=source_etag)['Body']
+        dst.upload_fileobj(body, bucket, key, ExtraArgs={'ContentType': content_type, 'Metadata': metadata})
+        return {'key': key, 'size': size, 'parts': 1, 'resumed_parts': 0}
+
+    upload_id, done_parts = _resume_upload(dst, bucket, key, source_etag, part_size)
+    if upload_id is None:
+        upload_id = dst.create_multipart_upload(
+            Bucket=bucket, Key=key, ContentType=content_type, Metadata=metadata
+        )['UploadId']
+        _save_state(bucket, key, {
+            'upload_id': upload_id,
+            'source_etag': source_etag,
+            'part_size': part_size,
+        })
+
+    ranges = [
+        (number, start, min(start + part_size, size) - 1)
+        for number, start in enumerate(range(0, size, part_size), start=1)
+    ]
+    etags = dict(done_parts)
+    with ThreadPoolExecutor(max_workers=part_workers) as pool:
+        futures = [
+            pool.submit(_copy_part, src, src_bucket, src_key, source_etag,
+                        dst, bucket, key, upload_id, number, start, end)
+            for number, start, end in ranges if number not in done_parts
+        ]
+        for future in futures:
+            number, etag = future.result()
+            etags[number] = etag
+
+    dst.complete_multipart_upload(
+        Bucket=bucket,
+        Key=key,
+        UploadId=upload_id,
+        MultipartUpload={'Parts': [
+            {'PartNumber': number, 'ETag': etags[number]} for number in sorted(etags)
+        ]}
+    )
+    _clear_state(bucket, key)
+    return {'key': key, 'size': size, 'parts': len(ranges), 'resumed_parts': len(done_parts)}
+
+
+def head_or_none(s3, bucket, key):
+    """head_object response, or None if the object does not exist"""
+    try:
+        return s3.head_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+            return None
+        raise
+
+
+def is_copy_of(head, source_etag):
+    """True if the object behind `head` already holds the source version with `source_etag`"""
+    return head is not None and source_etag in (
+        head['ETag'], head.get('Metadata', {}).get(SOURCE_ETAG_METADATA)
+    )
+
+
+def put_if_changed(s3, bucket, key, data, content_type='binary/octet-stream', sha256=None):
+    """
+    put_object with a sha256 fingerprint in the metadata, unless the stored
+    object already carries the same fingerprint. `data` is bytes or a
+    pyarrow Buffer; `sha256` overrides the fingerprint of its bytes (e.g. to
+    leave out a build timestamp). Returns {'bytes', 'sha256', 'etag', 'skipped'}.
+    """
+    sha256 = sha256 or hashlib.sha256(data).hexdigest()
+    head = head_or_none(s3, bucket, key)
+    if isinstance(data, bytes):
+        size, body = len(data), data
+    else:
+        import pyarrow as pa
+        size, body = data.size, pa.BufferReader(data)  # zero-copy
+    if head is not None and head.get('Metadata', {}).get(SHA256_METADATA) == sha256:
+        return {'bytes': size, 'sha256': sha256, 'etag': head['ETag'], 'skipped': True}
+    response = s3.put_object(
+        Bucket=bucket,
+        Key=key,
+        Body=body,
+        ContentLength=size,
+        ContentType=content_type,
+        Metadata={SHA256_METADATA: sha256}
+    )
+    return {'bytes': size, 'sha256': sha256, 'etag': response['ETag'], 'skipped': False}
+
+
+class MultipartUploadWriter(io.RawIOBase):
+    """
+    Writable file object that streams into an S3 multipart upload.
+    Parts are uploaded in the background as soon as part_size bytes are
+    buffered, with at most max_in_flight parts held in memory.
+    Leaving a `with` block on an exception aborts the upload.
+    """
+
+    def __init__(self, s3, bucket, key, part_size=DEFAULT_PART_SIZE,
+                 max_in_flight=2, content_type='binary/octet-stream'):
+        super().__init__()
+        self._s3 = s3
+        self._bucket = bucket
+        self._key = key
+        self._part_size = max(part_size, MIN_PART_SIZE)
+        self._max_in_flight = max_in_flight
+        self._buffer = bytearray()
+        self._futures = []
+        self._pool = ThreadPoolExecutor(max_workers=max_in_flight)
+        self._upload_id = s3.create_multipart_upload(
+            Bucket=bucket, Key=key, ContentType=content_type
+        )['UploadId']
+        self._sha256 = hashlib.sha256()
+        self.bytes_written = 0
+        self.etag = None
+        self.skipped = False
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._buffer += data
+        self._sha256.update(data)
+        self.bytes_written += len(data)
+        while len(self._buffer) >= self._part_size:
+            self._submit(bytes(self._buffer[:self._part_size]))
+            del self._buffer[:self._part_size]
+        return len(data)
+
+    def _submit(self, data):
+        in_flight = [future for future in self._futures if not future.done()]
+        if len(in_flight) >= self._max_in_flight:
+            in_flight[0].result()
+        part_number = len(self._futures) + 1
+        self._futures.append(self._pool.submit(self._upload_part, part_number, data))
+
+    def _upload_part(self, part_number, data):
+        result = self._s3.upload_part(
+            Bucket=self._bucket,
+            Key=self._key,
+            UploadId=self._upload_id,
+            PartNumber=part_number,
+            Body=data
+        )
+        return {'PartNumber': part_number, 'ETag': result['ETag']}
+
+    @property
+    def parts(self):
+        return len(self._futures)
+
+    @property
+    def sha256(self):
+        """Hex SHA-256 of everything written so far"""
+        return self._sha256.hexdigest()
+
+    def close(self):
+        """Upload the final part and complete the upload"""
+        if self.closed:
+            return
+        try:
+            if self._buffer or not self._futures:
+                self._submit(bytes(self._buffer))
+                self._buffer = bytearray()
+            parts = [future.result() for future in self._futures]
+            response = self._s3.complete_multipart_upload(
+                Bucket=self._bucket,
+                Key=self._key,
+                UploadId=self._upload_id,
+                MultipartUpload={'Parts': parts}
+            )
+            self.etag = response['ETag']
+        except Exception:
+            self.abort()
+            raise
+        finally:
+            self._pool.shutdown()
+            super().close()
+
+    def abort(self):
+        """Discard every uploaded part"""
+        if self.closed:
+            return
+        self._pool.shutdown(cancel_futures=True)
+        self._s3.abort_multipart_upload(
+            Bucket=self._bucket, Key=self._key, UploadId=self._upload_id
+        )
+        super().close()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+        return False
+
+
+class DedupUploadWriter(io.RawIOBase):
+    """
+    Writable file object that hashes what is written into a spool (memory
+    up to spool_size, then a temp file) and uploads it on close, unless the
+    stored object already has the same sha256 fingerprint. Nothing is sent
+    for unchanged content; the price is that the upload starts only once
+    writing has finished. Same interface as MultipartUploadWriter.
+    """
+
+    def __init__(self, s3, bucket, key, part_size=DEFAULT_PART_SIZE,
+                 max_in_flight=DEFAULT_PART_WORKERS, content_type='binary/octet-stream',
+                 spool_size=DEFAULT_SPOOL_SIZE):
+        super().__init__()
+        self._s3 = s3
+        self._bucket = bucket
+        self._key = key
+        self._part_size = max(part_size, MIN_PART_SIZE)
+        self._max_in_flight = max_in_flight
+        self._content_type = content_type
+        self._spool = tempfile.SpooledTemporaryFile(max_size=spool_size, dir=os.getenv('TRANSFER_SPOOL_DIR'))
+        self._sha256 = hashlib.sha256()
+        self.bytes_written = 0
+        self.etag = None
+        self.skipped = False
+        self.parts = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._spool.write(data)
+        self._sha256.update(data)
+        self.bytes_written += len(data)
+        return len(data)
+
+    @property
+    def sha256(self):
+        """Hex SHA-256 of everything written so far"""
+        return self._sha256.hexdigest()
+
+    def close(self):
+        """Upload the spooled content unless the stored object matches it"""
+        if self.closed:
+            return
+        try:
+            head = head_or_none(self._s3, self._bucket, self._key)
+            if head is not None and head.get('Metadata', {}).get(SHA256_METADATA) == self.sha256:
+                self.skipped = True
+                self.etag = head['ETag']
+                return
+            self._spool.seek(0)
+            self._s3.upload_fileobj(
+                self._spool, self._bucket, self._key,
+                ExtraArgs={'ContentType': self._content_type, 'Metadata': {SHA256_METADATA: self.sha256}},
+                Config=TransferConfig(multipart_threshold=self._part_size, multipart_chunksize=self._part_size,
+                                      max_concurrency=self._max_in_flight)
+            )
+            self.parts = max(1, -(-self.bytes_written // self._part_size))
+            self.etag = self._s3.head_object(Bucket=self._bucket, Key=self._key)['ETag']
+        finally:
+            self._spool.close()
+            super().close()
+
+    def abort(self):
+        """Discard the spooled content"""
+        if self.closed:
+            return
+        self._spool.close()
+        super().close()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+        return False
+
+
+def upload_writer(s3, bucket, key, part_size=DEFAULT_PART_SIZE, content_type='binary/octet-stream'):
+    """
+    Writer for a streamed upload: DedupUploadWriter by default, or with
+    S3_DEDUP=false a MultipartUploadWriter that uploads while writing
+    """
+    if os.getenv('S3_DEDUP', 'true').lower() == 'true':
+        return DedupUploadWriter(s3, bucket, key, part_size=part_size, content_type=content_type)
+    return MultipartUploadWriter(s3, bucket, key, part_size=part_size, content_type=content_type)
@@ -1,50 +1,124 @@
 """
-Step 11: Lambda function that returns a random number (GET request)
+Step 11: Lambda function for provider lookups (GET request)
+
+    ?npi=1234567890                   one provider
+    ?state=TN[&city=NASHVILLE]        providers in a state / city
+    ?taxonomy=207RC0000X              providers with a taxonomy code (any
+                                      matched slot, not only specialty_code)
+    &limit=100&offset=0               page through list results
+
+Lookups are answered from the provider index (provider_index.cached_index),
+downloaded once per container and kept in memory between invocations.
+numpy/pyarrow/boto3 load on the first request, not at init (see
+lambda_runtime.py).
 """
 import json
-import random
+import os
+import time
+
+import lambda_runtime
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+def _int_param(params, name, default, maximum=None):
+    value = int(params.get(name) or default)
+    if value < 0:
+        raise ValueError(f"{name} must not be negative")
+    return min(value, maximum) if maximum else value
+
 
 def lambda_handler(event, context):
     """
-    Lambda function: GET request returns random number
+    Lambda function: GET request looks up providers by NPI, state/city
+    or taxonomy code
     """
-    
-    # Generate random number
-    random_number = random.randint(1, 1000)
-    
-    # Return response
-    return {
-        'statusCode': 200,
-        'headers': {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*'
-        },
-        'body': json.dumps({
-            'message': 'Random number generated',
-            'random_number': random_number,
-            'request_id': context.request_id if context else 'local-test'
-        })
-    }
+    params = (event or {}).get('queryStringParameters') or {}
+    request_id = context.request_id if context else 'local-test'
+
+    npi = params.get('npi')
+    state, city, taxonomy = params.get('state'), params.get('city'), params.get('taxonomy')
+    if npi is not None and not (len(npi) == 10 and npi.isdigit()):
+        return lambda_runtime.response(400, {'error': 'npi must be 10 digits'})
+    if city is not None and state is None:
+        return lambda_runtime.response(400, {'error': 'city requires state'})
+    if npi is None and state is None and taxonomy is None:
+        return lambda_runtime.response(400, {'error': 'Give npi, state (and city) or taxonomy'})
+    try:
+        limit = _int_param(params, 'limit', DEFAULT_LIMIT, MAX_LIMIT)
+        offset = _int_param(params, 'offset', 0)
+    except ValueError as e:
+        return lambda_runtime.response(400, {'error': 'Invalid paging parameter', 'details': str(e)})
+
+    index = lambda_runtime.get_index()
+    if npi is not None:
+        row = index.find_npi(int(npi))
+        if row is None:
+            return lambda_runtime.response(404, {'error': 'NPI not found', 'npi': npi, 'request_id': request_id})
+        return lambda_runtime.response(200, {'provider': index.records([row])[0], 'request_id': request_id})
+
+    rows = index.search(state=state, city=city, taxonomy=taxonomy)
+    return lambda_runtime.response(200, {
+        'count': len(rows),
+        'limit': limit,
+        'offset': offset,
+        'providers': index.records(rows[offset:offset + limit]),
+        'index_built_at': index.metadata['built_at'],
+        'request_id': request_id
+    })
+
+lambda_runtime.preload()
 
 # Local testing
 if __name__ == "__main__":
+    import tempfile
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    import provider_index
+
     print("=" * 70)
-    print("Step 11: GET Lambda - Random Number Generator")
+    print("Step 11: GET Lambda - Provider Lookup")
     print("=" * 70)
-    
+
     # Mock context
     class MockContext:
         request_id = 'test-12345'
-    
-    # Test the lambda
+
+    if not os.getenv('PROVIDER_INDEX_PATH'):
+        # Small local index instead of the published one
+        sample = pa.table({
+            'NPI': [1003000126, 1245319599, 1346336807, 1588667638],
+            'provider_state': ['TN', 'TN', 'CA', 'TX'],
+            'provider_city': ['NASHVILLE', 'MEMPHIS', 'LOS ANGELES', 'HOUSTON'],
+            'specialty_code': ['207RC0000X', '207RI0011X', '207RC0000X', '207RE0101X'],
+            'taxonomy_codes': [['207RC0000X', '207RI0011X'], ['207RI0011X'], ['207RC0000X'], ['207RE0101X']],
+        })
+        os.environ['PROVIDER_INDEX_PATH'] = os.path.join(tempfile.mkdtemp(), 'provider_index.parquet')
+        pq.write_table(provider_index.build_index(provider_index.from_processed(sample)),
+                       os.environ['PROVIDER_INDEX_PATH'])
+
+    test_cases = [
+        {'npi': '1003000126'},
+        {'npi': '9999999999'},
+        {'state': 'TN'},
+        {'state': 'TN', 'city': 'Nashville'},
+        {'taxonomy': '207RC0000X', 'limit': '1'},
+        {'taxonomy': '207RI0011X'},
+        {'city': 'NASHVILLE'},
+    ]
+
     print("\n### Testing Lambda Function ###")
-    for i in range(5):
-        result = lambda_handler({}, MockContext())
+    for i, params in enumerate(test_cases, 1):
+        start = time.perf_counter()
+        result = lambda_handler({'queryStringParameters': params}, MockContext())
+        elapsed_ms = (time.perf_counter() - start) * 1000
         body = json.loads(result['body'])
-        print(f"Test {i+1}: Random number = {body['random_number']}")
-    
+        found = body.get('count', 1 if 'provider' in body else 0)
+        print(f"Test {i}: {params} → {result['statusCode']}, {found} provider(s), {elapsed_ms:.2f} ms")
+
     print("\n" + "=" * 70)
     print("Step 11 Complete!")
     print("=" * 70)
     print("✓ Lambda function ready for deployment")
-    print("✓ Returns random number on GET request")
\ No newline at end of file
+    print("✓ Looks up providers by NPI, state/city and taxonomy")
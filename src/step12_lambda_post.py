@@ -1,89 +1,218 @@
 """
-Step 12: Lambda function that returns data from POST body back to caller
+Step 12: Lambda function for bulk NPI validation and enrichment (POST request)
+
+The body is a JSON array of NPIs (strings, numbers or {"npi": ...}
+objects) or NDJSON with one per line, optionally gzip-compressed
+(Content-Encoding: gzip). Each NPI is checked (10 digits, check digit)
+and enriched with its state, city, taxonomy and active flag in one
+vectorized join against the provider index. Results are returned a page
+at a time (?offset=&limit=), gzipped when the caller accepts it.
+numpy/pyarrow/boto3 load on the first request, not at init (see
+lambda_runtime.py).
 """
+import base64
+import binascii
+import gzip
 import json
+import zlib
+
+import lambda_runtime
+
+MAX_BATCH = 50_000
+DEFAULT_PAGE_SIZE = 10_000
+MAX_PAGE_SIZE = 10_000
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def _headers(event):
+    return {name.lower(): value for name, value in (event.get('headers') or {}).items()}
+
+
+def read_body(event):
+    """Request body as text, undoing API Gateway base64 and gzip"""
+    body = event.get('body') or ''
+    if event.get('isBase64Encoded'):
+        try:
+            data = base64.b64decode(body, validate=True)
+        except (binascii.Error, ValueError) as e:
+            raise BadRequest(f"Invalid base64 in request body: {e}")
+    else:
+        data = body.encode('utf-8') if isinstance(body, str) else body
+    if _headers(event).get('content-encoding') == 'gzip' or data[:2] == b'\x1f\x8b':
+        try:
+            data = gzip.decompress(data)
+        except (gzip.BadGzipFile, OSError, EOFError, zlib.error) as e:
+            raise BadRequest(f"Invalid gzip in request body: {e}")
+    try:
+        return data.decode('utf-8')
+    except UnicodeDecodeError as e:
+        raise BadRequest(f"Request body is not UTF-8: {e}")
+
+
+def parse_items(text):
+    """NPIs as given by the caller: a JSON array or NDJSON lines"""
+    text = text.strip()
+    try:
+        if not text.startswith('['):
+            # NDJSON: parse all lines in one call
+            text = '[' + ','.join(line for line in text.splitlines() if line.strip()) + ']'
+        items = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise BadRequest(f"Invalid JSON in request body: {e}")
+    return [item.get('npi') if isinstance(item, dict) else item for item in items]
+
+
+def to_npi_array(items):
+    """(int64 NPIs, valid mask); malformed entries are 0 and invalid"""
+    import numpy as np
+    import provider_index
+
+    text = np.array([str(item) if item is not None else '' for item in items], dtype=str)
+    well_formed = (np.char.str_len(text) == 10) & np.char.isdigit(text) if len(text) else np.zeros(0, bool)
+    npis = np.zeros(len(text), dtype=np.int64)
+    npis[well_formed] = text[well_formed].astype(np.int64)
+    return npis, well_formed & provider_index.valid_npis(npis)
+
+
+def enrich(index, items):
+    """One result dict per item, in request order"""
+    import numpy as np
+
+    npis, valid = to_npi_array(items)
+    rows = np.where(valid, index.lookup(npis), -1)
+    found = rows >= 0
+    hits = rows[found]
+    states, cities, taxonomies = (np.full(len(rows), -1, dtype=np.int32) for _ in range(3))
+    active = np.zeros(len(rows), dtype=bool)
+    states[found] = index.states[hits]
+    cities[found] = index.cities[hits]
+    taxonomies[found] = index.taxonomies[hits]
+    active[found] = index.is_active[hits]
+    return [
+        {
+            'npi': item,
+            'valid': bool(is_valid),
+            'found': bool(is_found),
+            'provider_state': index.state_values[state] if state >= 0 else None,
+            'provider_city': index.city_values[city] if city >= 0 else None,
+            'specialty_code': index.taxonomy_values[taxonomy] if taxonomy >= 0 else None,
+            'is_active': bool(is_active) if is_found else None,
+        }
+        for item, is_valid, is_found, state, city, taxonomy, is_active
+        in zip(items, valid.tolist(), found.tolist(), states.tolist(), cities.tolist(),
+               taxonomies.tolist(), active.tolist())
+    ]
+
 
 def lambda_handler(event, context):
     """
-    Lambda function: POST request echoes back the body
+    Lambda function: POST request validates and enriches a batch of NPIs
     """
-    
-    # Parse the body from the event
+    event = event or {}
+    params = event.get('queryStringParameters') or {}
+    request_id = context.request_id if context else 'local-test'
+    accepts_gzip = 'gzip' in _headers(event).get('accept-encoding', '')
+
     try:
-        if 'body' in event:
-            # If body is a string, parse it as JSON
-            if isinstance(event['body'], str):
-                body = json.loads(event['body'])
-            else:
-                body = event['body']
-        else:
-            body = {}
-        
-        # Echo back the received data
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({
-                'message': 'Data received and echoed back',
-                'received_data': body,
-                'data_type': str(type(body).__name__),
-                'request_id': context.request_id if context else 'local-test'
-            })
-        }
-    
-    except json.JSONDecodeError as e:
-        return {
-            'statusCode': 400,
-            'body': json.dumps({
-                'error': 'Invalid JSON in request body',
-                'details': str(e)
-            })
-        }
+        items = parse_items(read_body(event))
+        offset = int(params.get('offset') or 0)
+        limit = min(int(params.get('limit') or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE)
+        if offset < 0 or limit < 1:
+            raise BadRequest("offset must be >= 0 and limit >= 1")
+    except BadRequest as e:
+        return lambda_runtime.response(400, {'error': 'Invalid request', 'details': str(e)})
+    except ValueError as e:
+        return lambda_runtime.response(400, {'error': 'Invalid paging parameter', 'details': str(e)})
+    if len(items) > MAX_BATCH:
+        return lambda_runtime.response(413, {'error': f'At most {MAX_BATCH:,} NPIs per request', 'count': len(items)})
+
+    # Only the requested page is joined and serialized
+    page = items[offset:offset + limit]
+    results = enrich(lambda_runtime.get_index(), page)
+    next_offset = offset + limit if offset + limit < len(items) else None
+    return lambda_runtime.response(200, {
+        'count': len(items),
+        'offset': offset,
+        'limit': limit,
+        'next_offset': next_offset,
+        'found': sum(result['found'] for result in results),
+        'results': results,
+        'request_id': request_id
+    }, gzip_body=accepts_gzip)
+
+lambda_runtime.preload()
 
 # Local testing
 if __name__ == "__main__":
+    import os
+    import tempfile
+    import time
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    import provider_index
+
     print("=" * 70)
-    print("Step 12: POST Lambda - Echo Request Body")
+    print("Step 12: POST Lambda - Bulk NPI Enrichment")
     print("=" * 70)
-    
+
     # Mock context
     class MockContext:
         request_id = 'test-67890'
-    
-    # Test cases
+
+    if not os.getenv('PROVIDER_INDEX_PATH'):
+        # Small local index instead of the published one
+        sample = pa.table({
+            'NPI': [1003000126, 1245319599, 1346336807],
+            'provider_state': ['TN', 'TN', 'CA'],
+            'provider_city': ['NASHVILLE', 'MEMPHIS', 'LOS ANGELES'],
+            'specialty_code': ['207RC0000X', '207RI0011X', '207RC0000X'],
+        })
+        os.environ['PROVIDER_INDEX_PATH'] = os.path.join(tempfile.mkdtemp(), 'provider_index.parquet')
+        pq.write_table(provider_index.build_index(provider_index.from_processed(sample)),
+                       os.environ['PROVIDER_INDEX_PATH'])
+
+    batch = ['1003000126', 1245319599, {'npi': '1234567893'}, '1234567890', 'abc']
+    ndjson = '\n'.join(json.dumps(npi) for npi in [1003000126, 1346336807] * 20_000)
     test_cases = [
         {
-            'name': 'Simple JSON',
-            'body': json.dumps({'name': 'Jing', 'role': 'Data Engineer'})
+            'name': 'JSON array',
+            'event': {'body': json.dumps(batch)}
         },
         {
-            'name': 'Nested JSON',
-            'body': json.dumps({
-                'user': {'name': 'Jing', 'location': 'Nashville'},
-                'data': {'specialists': 1000, 'states': 50}
-            })
+            'name': 'NDJSON, gzip request (40,000 NPIs, first page)',
+            'event': {
+                'headers': {'Content-Encoding': 'gzip'},
+                'isBase64Encoded': True,
+                'body': base64.b64encode(gzip.compress(ndjson.encode('utf-8'))).decode('ascii')
+            }
         },
         {
-            'name': 'Array',
-            'body': json.dumps({'items': [1, 2, 3, 4, 5]})
+            'name': 'Invalid JSON',
+            'event': {'body': '[1003000126,'}
         }
     ]
-    
+
     print("\n### Testing Lambda Function ###")
     for i, test in enumerate(test_cases, 1):
         print(f"\nTest {i}: {test['name']}")
-        event = {'body': test['body']}
-        result = lambda_handler(event, MockContext())
-        
+        start = time.perf_counter()
+        result = lambda_handler(test['event'], MockContext())
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
         body = json.loads(result['body'])
-        print(f"  Status: {result['statusCode']}")
-        print(f"  Received: {json.dumps(body['received_data'], indent=2)}")
-    
+        print(f"  Status: {result['statusCode']} ({elapsed_ms:.1f} ms)")
+        if result['statusCode'] == 200:
+            print(f"  Found: {body['found']:,} of {len(body['results']):,} "
+                  f"(total {body['count']:,}, next offset {body['next_offset']})")
+            print(f"  First: {json.dumps(body['results'][0])}")
+        else:
+            print(f"  Error: {body['details']}")
+
     print("\n" + "=" * 70)
     print("Step 12 Complete!")
     print("=" * 70)
     print("✓ Lambda function ready for deployment")
-    print("✓ Echoes POST body back to caller")
\ No newline at end of file
+    print("✓ Validates and enriches NPI batches against the provider index")
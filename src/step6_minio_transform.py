@@ -2,114 +2,242 @@
 Step 6: Move data from MinIO to memory, change column name, move back to MinIO
 """
 import os
-import pandas as pd  
 from dotenv import load_dotenv
-import boto3
-from botocore.client import Config
-import duckdb
-import io
+
+import connections
+import frame_io
+import metrics
+import nppes_extract
+import object_cache
+import parallel_extract
+import s3_bulk
+import s3_transfer
+import transform_spec
 
 load_dotenv()
 
-def main():
-    print("=" * 70)
-    print("Step 6: MinIO → Memory → Transform → MinIO")
-    print("=" * 70)
-    
-    # Setup MinIO client
-    s3 = boto3.client(
-        's3',
-        endpoint_url=os.getenv('MINIO_ENDPOINT'),
-        aws_access_key_id=os.getenv('MINIO_ACCESS_KEY'),
-        aws_secret_access_key=os.getenv('MINIO_SECRET_KEY'),
-        config=Config(signature_version='s3v4'),
-        region_name='us-east-1'
+SOURCE_BUCKET = 'raw-data'
+TARGET_BUCKET = 'processed-data'
+SAMPLE_KEY = 'cardiology_sample.parquet'
+PROCESSED_KEY = 'cardiology_processed.parquet'
+
+def compiled_transform(conn, source):
+    """
+    Load TRANSFORM_SPEC, validate it against the source columns and compile
+    it to a SELECT list; fails before any data is scanned
+    """
+    spec = transform_spec.load_spec()
+    transform_spec.validate_spec(spec, transform_spec.describe_columns(conn, source))
+    return spec, transform_spec.select_sql(spec)
+
+@metrics.instrumented('step6.extract_table')
+def extract_table(local_file, limit=None):
+    """
+    Extract the processed cardiology schema as an Arrow table.
+    Used by the pipeline runner to hand rows to the next stage in memory.
+    """
+    conn = nppes_extract.connect(minio=nppes_extract.is_s3_url(local_file))
+    source, _ = nppes_extract.nppes_source(local_file)
+    _, select_sql = compiled_transform(conn, source)
+    query = nppes_extract.cardiology_query(
+        source, limit=limit, taxonomy_index=nppes_extract.taxonomy_index_path(),
+        select_sql=select_sql
     )
+    # Sorted so re-runs produce identical checkpoints and chunk offsets
+    table = conn.execute(f"SELECT * FROM ({query}) ORDER BY NPI").fetch_arrow_table()
+    conn.close()
+    metrics.record(rows_out=table.num_rows)
+    return frame_io.to_processed(table)
+
+@metrics.instrumented('step6.save_table')
+def save_table(s3, table, bucket=TARGET_BUCKET, key=PROCESSED_KEY):
+    """
+    Checkpoint a processed table to MinIO as Parquet, skipping the upload
+    when the stored checkpoint has the same content.
+    Returns {'bytes', 'sha256', 'etag', 'skipped'} for the run manifest.
+    """
+    buffer = frame_io.to_parquet_buffer(table)
+    result = s3_transfer.put_if_changed(s3, bucket, key, buffer, content_type='application/vnd.apache.parquet')
+    metrics.record(rows_in=table.num_rows, bytes_written=0 if result['skipped'] else buffer.size)
+    return result
+
+@metrics.instrumented('step6.read_table')
+def read_table(s3, bucket=TARGET_BUCKET, key=PROCESSED_KEY):
+    """
+    Read a checkpointed processed table back from MinIO, through the local
+    object cache when it is enabled (an unchanged checkpoint is not
+    downloaded again)
+    """
+    cache = object_cache.default_cache()
+    if cache is None:
+        data = s3.get_object(Bucket=bucket, Key=key)['Body'].read()
+        downloaded = len(data)
+    else:
+        cached = cache.get(s3, bucket, key)
+        data, downloaded = cached.buffer(), cached.downloaded
+    table = frame_io.read_parquet_bytes(data)
+    metrics.record(bytes_read=downloaded, rows_out=table.num_rows)
+    return table
+
+def path_bytes(s3, path):
+    """Size of a local file/directory or of every MinIO object under an s3:// prefix"""
+    if nppes_extract.is_s3_url(path):
+        bucket, _, prefix = path[len('s3://'):].partition('/')
+        return sum(obj['Size'] for obj in s3_bulk.iter_objects(s3, bucket, prefix))
+    if os.path.isdir(path):
+        return sum(
+            os.path.getsize(os.path.join(root, name))
+            for root, _, names in os.walk(path)
+            for name in names
+        )
+    return os.path.getsize(path)
+
+@metrics.instrumented('step6.full_extract')
+def run_full_extract(s3, target_bucket, local_file):
+    """
+    Production mode: scan the whole NPPES file in bounded memory.
+    DuckDB filters and projects while writing Parquet straight to MinIO
+    over httpfs; the source may be local or an s3://raw-data/... URL.
+    Returns {'rows', 'seconds', 'input_bytes'}.
+    """
+    print("\n### Full Extract: NPPES → processed-data ###")
+    conn = nppes_extract.connect(minio=True)
+    memory_limit = conn.execute("SELECT current_setting('memory_limit')").fetchone()[0]
+    threads = conn.execute("SELECT current_setting('threads')").fetchone()[0]
+    print(f"✓ DuckDB memory_limit={memory_limit}, threads={threads}")
     
-    source_bucket = 'raw-data'
-    target_bucket = 'processed-data'
+    source, partition_column = nppes_extract.nppes_source(local_file)
+    if source.startswith('read_parquet'):
+        print(f"✓ Reading compiled Parquet (partitioned by {partition_column})")
+        input_bytes = path_bytes(s3, os.getenv('NPPES_PARQUET_PATH'))
+    else:
+        input_bytes = path_bytes(s3, local_file)
+    taxonomy_index = nppes_extract.taxonomy_index_path()
+    if taxonomy_index:
+        print(f"✓ Using taxonomy index: {taxonomy_index}")
+    print(f"✓ Taxonomy codes: {', '.join(nppes_extract.taxonomy_codes())}")
+    spec, select_sql = compiled_transform(conn, source)
+    print(f"✓ Transform spec: {len(spec)} rules → {', '.join(rule['output'] for rule in spec)}")
+    query = nppes_extract.cardiology_query(
+        source, taxonomy_index=taxonomy_index, select_sql=select_sql
+    )
     
-    # Create buckets if not exist
-    for bucket in [source_bucket, target_bucket]:
-        try:
-            s3.create_bucket(Bucket=bucket)
-            print(f"✓ Created bucket: {bucket}")
-        except Exception as e:
-            print(f"✓ Bucket exists: {bucket}")
+    output_url = f"s3://{target_bucket}/{PROCESSED_KEY}"
+    workers = int(os.getenv('EXTRACT_WORKERS', '1'))
+    if workers > 1 and source.startswith('read_csv') and not nppes_extract.is_s3_url(local_file):
+        # Record-aligned byte ranges filtered in a process pool, merged in file order
+        table, stats = parallel_extract.parallel_extract(
+            local_file, workers, select_sql=select_sql,
+            include_columns=transform_spec.source_columns(spec), taxonomy_index=taxonomy_index
+        )
+        print(f"✓ {stats['workers']} workers over {stats['ranges']} ranges "
+              f"(split in {stats['split_seconds']:.1f}s)")
+        conn.register('parallel_extract', table)
+        row_count, copy_seconds = nppes_extract.copy_to_parquet(
+            conn, "SELECT * FROM parallel_extract", output_url
+        )
+        seconds = stats['seconds'] + copy_seconds
+    else:
+        row_count, seconds = nppes_extract.copy_to_parquet(conn, query, output_url)
+    conn.close()
     
+    print(f"✓ Extracted {row_count:,} records in {seconds:.1f}s")
+    print(f"✓ Throughput: {row_count / seconds:,.0f} rows/s written, "
+          f"{input_bytes / seconds / 1024**2:,.1f} MB/s scanned")
+    print(f"✓ Saved extract to: {output_url}")
+    metrics.record(bytes_read=input_bytes, rows_out=row_count)
+    return {'rows': row_count, 'seconds': seconds, 'input_bytes': input_bytes}
+
+@metrics.instrumented('step6.sample_extract')
+def run_sample_extract(s3, source_bucket, target_bucket, local_file):
+    """
+    Sample mode: copy 1000 matching providers to MinIO, transform them in
+    place with DuckDB and write the processed sample to target_bucket.
+    Returns {'rows', 'seconds'}.
+    """
     # Step 1: Upload sample data to MinIO (from local)
     print("\n### Step 1: Upload sample to MinIO ###")
-    local_file = os.getenv('NPPES_FILE_PATH')
+    sample_url = f"s3://{source_bucket}/{SAMPLE_KEY}"
+    processed_url = f"s3://{target_bucket}/{PROCESSED_KEY}"
     
-    # Use DuckDB to create a small sample
-    conn = duckdb.connect(':memory:')
-    sample_data = conn.execute(f"""
-        SELECT 
-            NPI,
-            "Provider Business Practice Location Address State Name" as State,
-            "Provider Business Practice Location Address City Name" as City,
-            "Healthcare Provider Taxonomy Code_1" as Taxonomy
-        FROM read_csv_auto('{local_file}')
-        WHERE "Healthcare Provider Taxonomy Code_1" = '207RC0000X'
-        LIMIT 1000
-    """).df()
-    
-    # Save to CSV in memory
-    csv_buffer = io.StringIO()
-    sample_data.to_csv(csv_buffer, index=False)
-    csv_buffer.seek(0)
-    
-    # Upload to MinIO
-    s3.put_object(
-        Bucket=source_bucket,
-        Key='cardiology_sample.csv',
-        Body=csv_buffer.getvalue()
+    # DuckDB reads the NPPES file and writes the sample to MinIO itself,
+    # keeping the original columns the transform spec reads
+    conn = nppes_extract.connect(minio=True)
+    source, _ = nppes_extract.nppes_source(local_file)
+    spec, select_sql = compiled_transform(conn, source)
+    codes = nppes_extract.taxonomy_codes()
+    taxonomy_filter = nppes_extract.taxonomy_filter_sql(
+        codes, nppes_extract.taxonomy_index_path()
     )
-    print(f"✓ Uploaded {len(sample_data)} records to MinIO")
+    sample_columns = ', '.join(f'"{column}"' for column in transform_spec.source_columns(spec))
+    sample_rows, _ = nppes_extract.copy_to_parquet(conn, f"""
+        SELECT {sample_columns}
+        FROM {source}
+        WHERE {taxonomy_filter}
+        LIMIT 1000
+    """, sample_url)
+    print(f"✓ Uploaded {sample_rows} records to {sample_url}")
     
-    # Step 2: Read from MinIO to memory
-    print("\n### Step 2: Read from MinIO to Memory ###")
-    response = s3.get_object(Bucket=source_bucket, Key='cardiology_sample.csv')
-    csv_data = response['Body'].read().decode('utf-8')
+    # Step 2: Query the sample in place on MinIO
+    print("\n### Step 2: Read from MinIO (DuckDB httpfs) ###")
+    sample_source = nppes_extract.parquet_source_file(sample_url)
+    columns = transform_spec.describe_columns(conn, sample_source)
+    print(f"✓ Original columns: {len(columns)} ({columns[0]}, ...)")
 
-# Use pandas to read CSV from string
-    import pandas as pd
-    df = pd.read_csv(io.StringIO(csv_data))
-    print(f"✓ Loaded {len(df)} records into memory")
-    print(f"✓ Original columns: {list(df.columns)}")
-
-    # Step 3: Transform - rename columns
+    # Step 3: Transform - every spec rule compiles into one SELECT
     print("\n### Step 3: Transform Data ###")
-    df = df.rename(columns={
-        'State': 'provider_state',
-        'City': 'provider_city',
-        'Taxonomy': 'specialty_code'
-    })
-    print(f"✓ Renamed columns")
-    print(f"✓ New columns: {list(df.columns)}")
+    transform_query = f"""
+        SELECT
+            {select_sql}
+        FROM {sample_source}
+        ORDER BY NPI
+    """
+    print(f"✓ Compiled {len(spec)} transform rules (TRANSFORM_SPEC={os.getenv('TRANSFORM_SPEC', 'processed')})")
     
-    # Step 4: Save back to MinIO (different bucket)
+    # Step 4: Stream the result to the processed bucket in one pass
     print("\n### Step 4: Save to Different MinIO Bucket ###")
-    csv_buffer = io.StringIO()
-    df.to_csv(csv_buffer, index=False)
-    csv_buffer.seek(0)
-    
-    s3.put_object(
-        Bucket=target_bucket,
-        Key='cardiology_processed.csv',
-        Body=csv_buffer.getvalue()
-    )
-    print(f"✓ Saved transformed data to: s3://{target_bucket}/cardiology_processed.csv")
+    row_count, seconds = nppes_extract.copy_to_parquet(conn, transform_query, processed_url)
+    print(f"✓ Saved {row_count} transformed records to: {processed_url} in {seconds:.2f}s")
     
     # Verify
     print("\n### Step 5: Verify ###")
+    processed_source = nppes_extract.parquet_source_file(processed_url)
+    count = conn.execute(f"SELECT COUNT(*) FROM {processed_source}").fetchone()[0]
+    columns = transform_spec.describe_columns(conn, processed_source)
     print(f"✓ Source bucket ({source_bucket}):")
-    print(f"  - cardiology_sample.csv")
+    print(f"  - {SAMPLE_KEY}")
     print(f"✓ Target bucket ({target_bucket}):")
-    print(f"  - cardiology_processed.csv")
-    print(f"✓ Columns renamed: State→provider_state, City→provider_city")
+    print(f"  - {PROCESSED_KEY} ({count} records)")
+    print(f"✓ New columns: {columns}")
+    metrics.record(rows_in=sample_rows, rows_out=row_count)
     
     conn.close()
+    return {'rows': row_count, 'seconds': seconds}
+
+def main():
+    print("=" * 70)
+    print("Step 6: MinIO → DuckDB Transform → MinIO")
+    print("=" * 70)
+    
+    # Setup MinIO client
+    s3 = connections.get_minio_client()
+    
+    source_bucket = SOURCE_BUCKET
+    target_bucket = TARGET_BUCKET
+    
+    # Create buckets if not exist
+    for bucket, created in s3_bulk.ensure_buckets(s3, [source_bucket, target_bucket]).items():
+        print(f"✓ Created bucket: {bucket}" if created else f"✓ Bucket exists: {bucket}")
+    
+    # Full mode skips the 1000-row sample round trip
+    if os.getenv('STEP6_MODE', 'sample') == 'full':
+        run_full_extract(s3, target_bucket, os.getenv('NPPES_FILE_PATH'))
+        print("\n" + "=" * 70)
+        print("Step 6 Complete!")
+        print("=" * 70)
+        return
+    
+    run_sample_extract(s3, source_bucket, target_bucket, os.getenv('NPPES_FILE_PATH'))
     
     print("\n" + "=" * 70)
     print("Step 6 Complete!")
@@ -3,118 +3,202 @@ Step 7: Move data from MinIO to PostgreSQL
 """
 import os
 from dotenv import load_dotenv
-import boto3
-from botocore.client import Config
-import pandas as pd
-import psycopg2
 from psycopg2 import sql
-import io
+
+import connections
+import frame_io
+import metrics
+import nppes_extract
+import nppes_incremental
+import object_cache
+import pg_bulk_load
+import pg_rollups
+import pg_schema
 
 load_dotenv()
 
+TABLE = 'cardiology_providers'
+COLUMNS = ['npi', 'provider_state', 'provider_city', 'specialty_code', 'enumeration_year', 'is_active',
+           'taxonomy_codes']
+
+# Columns added to the extract later → value for extracts written before
+LATER_COLUMNS = {
+    'enumeration_year': 'NULL',
+    'is_active': 'TRUE',
+    'taxonomy_codes': "CASE WHEN specialty_code IS NULL THEN []::VARCHAR[] ELSE [specialty_code] END",
+}
+
+def ensure_table(conn):
+    """Create or upgrade cardiology_providers (see pg_schema.MIGRATIONS)"""
+    pg_schema.migrate(conn)
+
+def table_state(conn, table=TABLE):
+    """
+    Marker of the table's current contents: the rollup load version, which
+    every full or incremental load bumps, and the row count
+    """
+    cursor = conn.cursor()
+    version = pg_rollups.load_version(cursor)
+    cursor.execute(sql.SQL("SELECT COUNT(*) FROM {}").format(sql.Identifier(table)))
+    rows = cursor.fetchone()[0]
+    cursor.close()
+    return {'load_version': version, 'rows': rows}
+
+@metrics.instrumented('step7.load_table')
+def load_table(conn, table, batch_size=None, resume_rows=0, on_batch=None):
+    """
+    Bulk load a processed Arrow table handed over in memory.
+    Same COPY → staging → merge path as the MinIO load, fed from the table;
+    resume_rows/on_batch let a re-run continue from the last committed batch.
+    """
+    ensure_table(conn)
+    # Extra transform spec outputs stay in the checkpoint and backup only
+    table = table.select(frame_io.PROCESSED_SCHEMA.names)
+    stats = load_batches(conn, frame_io.table_batches(table), batch_size, resume_rows, on_batch)
+    metrics.record(rows_in=table.num_rows, rows_out=stats['copied'] - stats['resumed_rows'])
+    return stats
+
+def load_batches(conn, batches, batch_size=None, resume_rows=0, on_batch=None):
+    """Bulk load Arrow record batches, rendered to CSV only as COPY reads them"""
+    return load_stream(conn, frame_io.CsvStream(batches), batch_size, resume_rows, on_batch)
+
+def load_stream(conn, stream, batch_size=None, resume_rows=0, on_batch=None):
+    """
+    Full reload from a CSV stream with the secondary indexes dropped for
+    the COPY and merge, and rebuilt once afterwards; the rollups are
+    refreshed once the load is committed
+    """
+    with pg_schema.indexes_dropped(conn):
+        stats = pg_bulk_load.load_csv_stream(
+            conn,
+            stream,
+            TABLE,
+            COLUMNS,
+            key='npi',
+            batch_size=batch_size,
+            replace=True,
+            resume_rows=resume_rows,
+            on_batch=on_batch,
+            upsert=not pg_schema.is_partitioned(conn)
+        )
+    pg_rollups.refresh(conn)
+    return stats
+
+@metrics.instrumented('step7.load_object')
+def load_object(conn, s3, bucket, key, batch_size=None):
+    """
+    Bulk load a processed object from MinIO: Parquet through DuckDB, anything
+    else as a CSV stream. With the object cache enabled the object is read
+    from local disk, downloaded only when its ETag has changed. Returns the
+    load_csv_stream stats.
+    """
+    cache = object_cache.default_cache()
+    cached = cache.get(s3, bucket, key) if cache is not None else None
+    if cached is not None:
+        metrics.record(bytes_read=cached.downloaded)
+    if key.endswith('.parquet'):
+        # Without the cache DuckDB reads the object over httpfs with ranged
+        # GETs; either way it hands back Arrow batches
+        duck = nppes_extract.connect(minio=cached is None)
+        try:
+            source = nppes_extract.parquet_source_file(cached.path if cached else f's3://{bucket}/{key}')
+            available = {row[0].lower() for row in duck.execute(f"DESCRIBE SELECT * FROM {source}").fetchall()}
+            missing = [column for column in COLUMNS if column not in available and column not in LATER_COLUMNS]
+            if missing:
+                raise ValueError(f"s3://{bucket}/{key} is missing required columns: {', '.join(missing)}")
+            select = ', '.join(
+                column if column in available else f"{LATER_COLUMNS[column]} AS {column}" for column in COLUMNS
+            )
+            batches = duck.execute(f"""
+                SELECT {select}
+                FROM {source}
+            """).fetch_record_batch(frame_io.DEFAULT_CHUNK_ROWS)
+            stats = load_batches(conn, batches, batch_size)
+        finally:
+            duck.close()
+    elif cached is not None:
+        with cached.open() as stream:
+            stats = load_stream(conn, stream, batch_size)
+    else:
+        stats = load_stream(conn, s3.get_object(Bucket=bucket, Key=key)['Body'], batch_size)
+    metrics.record(rows_out=stats['copied'])
+    return stats
+
 def main():
     print("=" * 70)
     print("Step 7: MinIO → PostgreSQL")
     print("=" * 70)
     
     # Setup MinIO client
-    s3 = boto3.client(
-        's3',
-        endpoint_url=os.getenv('MINIO_ENDPOINT'),
-        aws_access_key_id=os.getenv('MINIO_ACCESS_KEY'),
-        aws_secret_access_key=os.getenv('MINIO_SECRET_KEY'),
-        config=Config(signature_version='s3v4'),
-        region_name='us-east-1'
-    )
-    
-    # Setup PostgreSQL connection
-    conn = psycopg2.connect(
-        host=os.getenv('POSTGRES_HOST'),
-        port=os.getenv('POSTGRES_PORT'),
-        database=os.getenv('POSTGRES_DB'),
-        user=os.getenv('POSTGRES_USER'),
-        password=os.getenv('POSTGRES_PASSWORD')
-    )
-    cursor = conn.cursor()
-    
-    # Step 1: Read data from MinIO
-    print("\n### Step 1: Read from MinIO ###")
-    bucket = 'processed-data'
-    key = 'cardiology_processed.csv'
-    
-    response = s3.get_object(Bucket=bucket, Key=key)
-    csv_data = response['Body'].read().decode('utf-8')
-    df = pd.read_csv(io.StringIO(csv_data))
-    
-    print(f"✓ Read {len(df)} records from MinIO")
-    print(f"✓ Columns: {list(df.columns)}")
-    
-    # Step 2: Create table in PostgreSQL
-    print("\n### Step 2: Create PostgreSQL Table ###")
-    
-    create_table_query = """
-    CREATE TABLE IF NOT EXISTS cardiology_providers (
-        npi VARCHAR(10) PRIMARY KEY,
-        provider_state VARCHAR(2),
-        provider_city VARCHAR(100),
-        specialty_code VARCHAR(20),
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    """
-    
-    cursor.execute(create_table_query)
-    conn.commit()
-    print("✓ Table 'cardiology_providers' created/verified")
-    
-    # Step 3: Insert data into PostgreSQL
-    print("\n### Step 3: Insert Data ###")
-    
-    # Clear existing data
-    cursor.execute("DELETE FROM cardiology_providers")
-    
-    # Insert data
-    insert_query = """
-    INSERT INTO cardiology_providers (npi, provider_state, provider_city, specialty_code)
-    VALUES (%s, %s, %s, %s)
-    ON CONFLICT (npi) DO NOTHING
-    """
-    
-    records = df[['NPI', 'provider_state', 'provider_city', 'specialty_code']].values.tolist()
-    cursor.executemany(insert_query, records)
-    conn.commit()
-    
-    print(f"✓ Inserted {len(records)} records")
-    
-    # Step 4: Verify data in PostgreSQL
-    print("\n### Step 4: Verify Data ###")
-    
-    cursor.execute("SELECT COUNT(*) FROM cardiology_providers")
-    count = cursor.fetchone()[0]
-    print(f"✓ Total records in PostgreSQL: {count}")
-    
-    cursor.execute("SELECT * FROM cardiology_providers LIMIT 5")
-    sample = cursor.fetchall()
-    print("\n✓ Sample records:")
-    for row in sample:
-        print(f"  NPI: {row[0]}, State: {row[1]}, City: {row[2]}")
-    
-    # Step 5: Summary statistics
-    print("\n### Step 5: Summary Statistics ###")
-    
-    cursor.execute("""
-        SELECT provider_state, COUNT(*) as count
-        FROM cardiology_providers
-        GROUP BY provider_state
-        ORDER BY count DESC
-        LIMIT 5
-    """)
-    
-    print("✓ Top 5 states:")
-    for row in cursor.fetchall():
-        print(f"  {row[0]}: {row[1]} providers")
-    
-    cursor.close()
-    conn.close()
+    s3 = connections.get_minio_client()
+    
+    # Borrow a pooled PostgreSQL connection; it goes back (rolled back)
+    # even if the load fails
+    with connections.pg_connection() as conn:
+        cursor = conn.cursor()
+        
+        # Step 1: Locate source object in MinIO (streamed later, never buffered)
+        print("\n### Step 1: Locate Source in MinIO ###")
+        bucket = 'processed-data'
+        key = os.getenv('STEP7_SOURCE_KEY', 'cardiology_processed.parquet')
+        
+        incremental = os.getenv('STEP7_MODE', 'full') == 'incremental'
+        if incremental:
+            for feed, prefix in nppes_incremental.FEEDS.items():
+                print(f"✓ Source ({feed}): s3://{nppes_incremental.RAW_BUCKET}/{prefix}")
+        else:
+            response = s3.head_object(Bucket=bucket, Key=key)
+            print(f"✓ Source: s3://{bucket}/{key} ({response['ContentLength']:,} bytes)")
+        
+        # Step 2: Create table in PostgreSQL
+        print("\n### Step 2: Create PostgreSQL Table ###")
+        
+        ensure_table(conn)
+        print("✓ Table 'cardiology_providers' created/verified")
+        
+        if incremental:
+            # Step 3: Apply weekly deltas / deactivations newer than the watermark
+            print("\n### Step 3: Apply Incremental Deltas ###")
+            
+            applied = nppes_incremental.apply_pending(conn, s3, TABLE)
+            for feed, delta_key, counts in applied:
+                print(f"✓ [{feed}] {delta_key}: {counts['upserted']:,} upserted, "
+                      f"{counts['deleted']:,} removed, {counts['deactivated']:,} deactivated")
+            if not applied:
+                print("✓ No new delta files since the last watermark")
+        else:
+            # Step 3: Bulk load via COPY → staging table → merge
+            print("\n### Step 3: Bulk Load Data ###")
+            
+            batch_size = os.getenv('COPY_BATCH_SIZE')
+            batch_size = int(batch_size) if batch_size else None
+            stats = load_object(conn, s3, bucket, key, batch_size)
+            
+            print(f"✓ Copied {stats['copied']:,} records into staging in {stats['copy_seconds']:.1f}s")
+            print(f"✓ Merged {stats['upserted']:,} records, removed {stats['deleted']:,} stale "
+                  f"in {stats['merge_seconds']:.1f}s")
+        
+        # Step 4: Verify data in PostgreSQL
+        print("\n### Step 4: Verify Data ###")
+        
+        cursor.execute("SELECT COUNT(*) FROM cardiology_providers")
+        count = cursor.fetchone()[0]
+        print(f"✓ Total records in PostgreSQL: {count}")
+        
+        cursor.execute("SELECT * FROM cardiology_providers LIMIT 5")
+        sample = cursor.fetchall()
+        print("\n✓ Sample records:")
+        for row in sample:
+            print(f"  NPI: {row[0]}, State: {row[1]}, City: {row[2]}")
+        
+        # Step 5: Summary statistics (from the rollups, not the raw table)
+        print("\n### Step 5: Summary Statistics ###")
+        
+        print("✓ Top 5 states:")
+        for row in pg_rollups.counts(conn, 'state', limit=5):
+            print(f"  {row['provider_state']}: {row['providers']} providers")
+        
+        cursor.close()
     
     print("\n" + "=" * 70)
     print("Step 7 Complete!")
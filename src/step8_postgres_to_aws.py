@@ -2,69 +2,157 @@
 Step 8: Move data from PostgreSQL to AWS S3
 """
 import os
+import gzip
 from dotenv import load_dotenv
-import boto3
-import psycopg2
-import pandas as pd
-import io
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import connections
+import frame_io
+import metrics
+import s3_bulk
+import s3_transfer
 
 load_dotenv()
 
+EXPORT_COLUMNS = ['npi', 'provider_state', 'provider_city', 'specialty_code', 'enumeration_year', 'is_active',
+                  'taxonomy_codes']
+
+# Ordered so unchanged tables export byte-identical files (see S3_DEDUP);
+# explicit columns keep schema additions out of the export
+EXPORT_QUERY = (f"COPY (SELECT {', '.join(EXPORT_COLUMNS)} FROM cardiology_providers ORDER BY npi) "
+                "TO STDOUT WITH (FORMAT csv, HEADER true)")
+EXPORT_FETCH_ROWS = 100_000
+
+@metrics.instrumented('step8.upload_table')
+def upload_table(s3, bucket, key, table):
+    """
+    Stream an Arrow table handed over in memory to S3 as Parquet; an
+    unchanged backup is not uploaded again.
+    Returns {'bytes', 'sha256', 'etag', 'skipped'} of the object.
+    """
+    with s3_transfer.upload_writer(
+        s3, bucket, key, content_type='application/vnd.apache.parquet'
+    ) as writer:
+        with pq.ParquetWriter(writer, table.schema, compression='zstd') as parquet_writer:
+            for batch in frame_io.table_batches(table):
+                parquet_writer.write_batch(batch)
+    metrics.record(rows_in=table.num_rows, bytes_written=0 if writer.skipped else writer.bytes_written)
+    return {'bytes': writer.bytes_written, 'sha256': writer.sha256, 'etag': writer.etag,
+            'skipped': writer.skipped}
+
+def export_parquet(conn, writer, fetch_rows=EXPORT_FETCH_ROWS):
+    """
+    Write cardiology_providers to `writer` as Parquet, one row group per
+    fetch from a server-side cursor. Returns the number of rows written.
+    """
+    schema = frame_io.PROCESSED_SCHEMA
+    cursor = conn.cursor(name='cardiology_export')
+    cursor.execute(f"SELECT {', '.join(EXPORT_COLUMNS)} FROM cardiology_providers ORDER BY npi")
+    rows = 0
+    with pq.ParquetWriter(writer, schema, compression='zstd') as parquet_writer:
+        while True:
+            records = cursor.fetchmany(fetch_rows)
+            if not records:
+                break
+            columns = list(zip(*records))
+            batch = pa.RecordBatch.from_arrays(
+                [pa.array([int(npi) for npi in columns[0]], pa.int64())]
+                + [pa.array(values, pa.string()).dictionary_encode() for values in columns[1:4]]
+                + [pa.array(columns[4], pa.int16()), pa.array(columns[5], pa.bool_()),
+                   pa.array(columns[6], pa.list_(pa.string()))],
+                names=schema.names
+            )
+            parquet_writer.write_batch(batch.cast(schema))
+            rows += len(records)
+    cursor.close()
+    return rows
+
+def export_key(export_format='csv', compression='gzip'):
+    """S3 key under postgres-backup/ and the effective compression"""
+    if export_format == 'parquet':
+        return 'postgres-backup/cardiology_providers.parquet', 'zstd'
+    if compression == 'gzip':
+        return 'postgres-backup/cardiology_providers.csv.gz', 'gzip'
+    return 'postgres-backup/cardiology_providers.csv', 'none'
+
+@metrics.instrumented('step8.export')
+def export_to_s3(conn, s3, bucket, key, export_format='csv', compression='gzip',
+                 part_size=s3_transfer.DEFAULT_PART_SIZE):
+    """
+    Stream cardiology_providers into an S3 upload: CSV from COPY ... TO
+    STDOUT (optionally gzipped) or Parquet from a server-side cursor. An
+    export identical to the stored object is not uploaded (S3_DEDUP).
+    Returns {'rows', 'bytes', 'parts', 'sha256', 'etag', 'skipped'}.
+    """
+    if export_format == 'parquet':
+        content_type = 'application/vnd.apache.parquet'
+    elif compression == 'gzip':
+        content_type = 'application/gzip'
+    else:
+        content_type = 'text/csv'
+    
+    cursor = conn.cursor()
+    with s3_transfer.upload_writer(
+        s3, bucket, key, part_size=part_size, content_type=content_type
+    ) as writer:
+        if export_format == 'parquet':
+            rows = export_parquet(conn, writer)
+        elif compression == 'gzip':
+            # mtime=0 keeps the gzip header, and so the fingerprint, stable
+            with gzip.GzipFile(fileobj=writer, mode='wb', mtime=0) as compressed:
+                cursor.copy_expert(EXPORT_QUERY, compressed)
+        else:
+            cursor.copy_expert(EXPORT_QUERY, writer)
+    if export_format != 'parquet':
+        rows = cursor.rowcount
+    cursor.close()
+    metrics.record(rows_in=rows, bytes_written=0 if writer.skipped else writer.bytes_written)
+    return {
+        'rows': rows,
+        'bytes': writer.bytes_written,
+        'parts': writer.parts,
+        'sha256': writer.sha256,
+        'etag': writer.etag,
+        'skipped': writer.skipped,
+    }
+
 def main():
     print("=" * 70)
     print("Step 8: PostgreSQL → AWS S3")
     print("=" * 70)
     
     # Setup AWS S3 client (uses AWS profile from .env)
-    session = boto3.Session(profile_name=os.getenv('AWS_PROFILE'))
-    s3 = session.client('s3', region_name=os.getenv('AWS_REGION'))
+    s3 = connections.get_aws_s3_client()
     
     aws_bucket = os.getenv('AWS_BUCKET')
-    
-    # Step 1: Read data from PostgreSQL
-    print("\n### Step 1: Read from PostgreSQL ###")
-    
-    conn = psycopg2.connect(
-        host=os.getenv('POSTGRES_HOST'),
-        port=os.getenv('POSTGRES_PORT'),
-        database=os.getenv('POSTGRES_DB'),
-        user=os.getenv('POSTGRES_USER'),
-        password=os.getenv('POSTGRES_PASSWORD')
-    )
-    
-    query = "SELECT * FROM cardiology_providers"
-    df = pd.read_sql(query, conn)
-    
-    print(f"✓ Read {len(df)} records from PostgreSQL")
-    print(f"✓ Columns: {list(df.columns)}")
-    
-    conn.close()
-    
-    # Step 2: Convert to CSV in memory
-    print("\n### Step 2: Prepare Data for Upload ###")
-    
-    csv_buffer = io.StringIO()
-    df.to_csv(csv_buffer, index=False)
-    csv_buffer.seek(0)
-    
-    print(f"✓ Data prepared ({len(csv_buffer.getvalue())} bytes)")
-    
-    # Step 3: Upload to AWS S3
-    print("\n### Step 3: Upload to AWS S3 ###")
-    
-    s3_key = 'postgres-backup/cardiology_providers.csv'
-    
-    s3.put_object(
-        Bucket=aws_bucket,
-        Key=s3_key,
-        Body=csv_buffer.getvalue(),
-        ContentType='text/csv'
-    )
-    
+    export_format = os.getenv('EXPORT_FORMAT', 'csv')
+    compression = os.getenv('EXPORT_COMPRESSION', 'gzip')
+    part_size = int(os.getenv('TRANSFER_PART_SIZE_MB', '64')) * 1024**2
+    
+    # Step 1: Connect to PostgreSQL
+    print("\n### Step 1: Connect to PostgreSQL ###")
+    
+    # The pooled connection goes back (rolled back) even if the export fails
+    with connections.pg_connection() as conn:
+        print("✓ Connected; rows will stream via COPY ... TO STDOUT")
+        
+        # Step 2: Stream COPY output → (gzip) → S3 multipart upload
+        print("\n### Step 2: Stream Export to AWS S3 ###")
+        
+        s3_key, compression = export_key(export_format, compression)
+        result = export_to_s3(conn, s3, aws_bucket, s3_key, export_format, compression, part_size)
+        record_count = result['rows']
+    
+    print(f"✓ Streamed {record_count:,} records ({compression})")
+    if result['skipped']:
+        print(f"✓ Unchanged since the last export ({result['bytes']:,} bytes, sha256 {result['sha256'][:12]}), upload skipped")
+    else:
+        print(f"✓ Uploaded {result['bytes']:,} bytes in {result['parts']} part(s)")
     print(f"✓ Uploaded to: s3://{aws_bucket}/{s3_key}")
     
-    # Step 4: Verify upload
-    print("\n### Step 4: Verify Upload ###")
+    # Step 3: Verify upload
+    print("\n### Step 3: Verify Upload ###")
     
     response = s3.head_object(Bucket=aws_bucket, Key=s3_key)
     file_size = response['ContentLength']
@@ -72,14 +160,14 @@ def main():
     print(f"✓ File size: {file_size:,} bytes")
     print(f"✓ Last modified: {response['LastModified']}")
     
-    # Step 5: List objects in bucket
-    print("\n### Step 5: List S3 Bucket Contents ###")
+    # Step 4: List objects in bucket
+    print("\n### Step 4: List S3 Bucket Contents ###")
     
-    response = s3.list_objects_v2(Bucket=aws_bucket)
+    objects = list(s3_bulk.iter_objects(s3, aws_bucket))
     
-    if 'Contents' in response:
+    if objects:
         print(f"✓ Objects in bucket '{aws_bucket}':")
-        for obj in response['Contents']:
+        for obj in objects:
             print(f"  - {obj['Key']} ({obj['Size']} bytes)")
     else:
         print("✓ Bucket is empty")
@@ -89,7 +177,7 @@ def main():
     print("=" * 70)
     print(f"✓ Data successfully moved from PostgreSQL to AWS S3")
     print(f"✓ Location: s3://{aws_bucket}/{s3_key}")
-    print(f"✓ Records: {len(df)}")
+    print(f"✓ Records: {record_count:,}")
 
 if __name__ == "__main__":
     main()
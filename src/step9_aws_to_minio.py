@@ -3,92 +3,108 @@ Step 9: Move data from AWS S3 back to MinIO
 """
 import os
 from dotenv import load_dotenv
-import boto3
-from botocore.client import Config
+
+import connections
+import metrics
+import s3_bulk
+import s3_transfer
 
 load_dotenv()
 
+MINIO_BUCKET = 'aws-backup'
+MINIO_PREFIX = 'from-aws/'
+
+def ensure_bucket(s3, bucket):
+    """Create a bucket unless it already exists; returns True if created"""
+    return s3_bulk.ensure_buckets(s3, [bucket])[bucket]
+
+@metrics.instrumented('step9.mirror')
+def mirror_prefix(aws_s3, minio_s3, aws_bucket, s3_prefix, minio_bucket=MINIO_BUCKET,
+                  minio_prefix=MINIO_PREFIX):
+    """
+    Copy every object under s3_prefix into MinIO (streamed, or server-side
+    when both clients reach the same store); returns per-key results
+    """
+    ensure_bucket(minio_s3, minio_bucket)
+    results = s3_bulk.copy_prefix(
+        aws_s3, aws_bucket, s3_prefix,
+        minio_s3, minio_bucket, minio_prefix,
+        max_workers=int(os.getenv('TRANSFER_KEY_WORKERS', s3_transfer.DEFAULT_KEY_WORKERS)),
+        part_size=int(os.getenv('TRANSFER_PART_SIZE_MB', '64')) * 1024**2,
+        part_workers=int(os.getenv('TRANSFER_PART_WORKERS', s3_transfer.DEFAULT_PART_WORKERS))
+    )
+    copied = sum(result['size'] for result in results if not result['skipped'])
+    metrics.record(bytes_read=copied, bytes_written=copied, objects=len(results))
+    return results
+
 def main():
     print("=" * 70)
     print("Step 9: AWS S3 → MinIO")
     print("=" * 70)
     
     # Setup AWS S3 client
-    aws_session = boto3.Session(profile_name=os.getenv('AWS_PROFILE'))
-    aws_s3 = aws_session.client('s3', region_name=os.getenv('AWS_REGION'))
+    aws_s3 = connections.get_aws_s3_client()
     
     # Setup MinIO client
-    minio_s3 = boto3.client(
-        's3',
-        endpoint_url=os.getenv('MINIO_ENDPOINT'),
-        aws_access_key_id=os.getenv('MINIO_ACCESS_KEY'),
-        aws_secret_access_key=os.getenv('MINIO_SECRET_KEY'),
-        config=Config(signature_version='s3v4'),
-        region_name='us-east-1'
-    )
+    minio_s3 = connections.get_minio_client()
     
     aws_bucket = os.getenv('AWS_BUCKET')
-    minio_bucket = 'aws-backup'
+    minio_bucket = MINIO_BUCKET
     
     # Step 1: Create MinIO bucket
     print("\n### Step 1: Prepare MinIO Bucket ###")
-    try:
-        minio_s3.create_bucket(Bucket=minio_bucket)
+    if ensure_bucket(minio_s3, minio_bucket):
         print(f"✓ Created bucket: {minio_bucket}")
-    except Exception:
+    else:
         print(f"✓ Bucket exists: {minio_bucket}")
     
-    # Step 2: Download from AWS S3
-    print("\n### Step 2: Download from AWS S3 ###")
+    # Step 2: Stream objects from AWS S3 into MinIO (multipart, parallel)
+    print("\n### Step 2: Stream AWS S3 → MinIO ###")
     
-    s3_key = 'postgres-backup/cardiology_providers.csv'
+    s3_prefix = os.getenv('AWS_COPY_PREFIX', 'postgres-backup/')
+    minio_prefix = MINIO_PREFIX
     
-    response = aws_s3.get_object(Bucket=aws_bucket, Key=s3_key)
-    data = response['Body'].read()
-    
-    print(f"✓ Downloaded from AWS: s3://{aws_bucket}/{s3_key}")
-    print(f"✓ Size: {len(data):,} bytes")
-    
-    # Step 3: Upload to MinIO
-    print("\n### Step 3: Upload to MinIO ###")
-    
-    minio_key = 'from-aws/cardiology_providers.csv'
-    
-    minio_s3.put_object(
-        Bucket=minio_bucket,
-        Key=minio_key,
-        Body=data,
-        ContentType='text/csv'
-    )
+    results = mirror_prefix(aws_s3, minio_s3, aws_bucket, s3_prefix, minio_bucket, minio_prefix)
     
-    print(f"✓ Uploaded to MinIO: s3://{minio_bucket}/{minio_key}")
+    for result in results:
+        resumed = f", {result['resumed_parts']} resumed" if result['resumed_parts'] else ""
+        if result['skipped']:
+            print(f"✓ {result['key']}: {result['size']:,} bytes, unchanged (skipped)")
+        elif result['server_side']:
+            print(f"✓ {result['key']}: {result['size']:,} bytes (server-side copy)")
+        else:
+            print(f"✓ {result['key']}: {result['size']:,} bytes in {result['parts']} part(s){resumed}")
+    print(f"✓ Copied {len(results)} object(s) from s3://{aws_bucket}/{s3_prefix}")
     
-    # Step 4: Verify in MinIO
-    print("\n### Step 4: Verify in MinIO ###")
+    # Step 3: Verify in MinIO
+    print("\n### Step 3: Verify in MinIO ###")
     
-    response = minio_s3.head_object(Bucket=minio_bucket, Key=minio_key)
-    print(f"✓ File size: {response['ContentLength']:,} bytes")
+    heads = s3_bulk.head_objects(minio_s3, minio_bucket, [result['key'] for result in results])
+    for result in results:
+        size = heads[result['key']]['ContentLength'] if heads[result['key']] else 0
+        status = "✓" if size == result['size'] else "✗"
+        print(f"{status} {result['key']}: {size:,} bytes")
     
-    # Step 5: List MinIO buckets and contents
-    print("\n### Step 5: MinIO Summary ###")
+    # Step 4: List MinIO buckets and contents
+    print("\n### Step 4: MinIO Summary ###")
     
     buckets = minio_s3.list_buckets()
     print(f"✓ MinIO buckets:")
     for bucket in buckets['Buckets']:
         print(f"  - {bucket['Name']}")
     
-    response = minio_s3.list_objects_v2(Bucket=minio_bucket)
-    if 'Contents' in response:
+    objects = list(s3_bulk.iter_objects(minio_s3, minio_bucket))
+    if objects:
         print(f"\n✓ Contents of '{minio_bucket}':")
-        for obj in response['Contents']:
+        for obj in objects:
             print(f"  - {obj['Key']} ({obj['Size']:,} bytes)")
     
     print("\n" + "=" * 70)
     print("Step 9 Complete!")
     print("=" * 70)
     print(f"✓ Data successfully moved from AWS S3 to MinIO")
-    print(f"✓ AWS location: s3://{aws_bucket}/{s3_key}")
-    print(f"✓ MinIO location: s3://{minio_bucket}/{minio_key}")
+    print(f"✓ AWS location: s3://{aws_bucket}/{s3_prefix}")
+    print(f"✓ MinIO location: s3://{minio_bucket}/{minio_prefix}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,83 @@
+"""
+NPI → taxonomy index: a compact Parquet sidecar with one row per (NPI, slot)
+that answers "which NPIs have any code in set S" without rescanning the CSV
+"""
+import os
+import time
+from dotenv import load_dotenv
+
+import nppes_extract
+
+load_dotenv()
+
+DEFAULT_INDEX_PATH = 'data/npi_taxonomy_index.parquet'
+
+
+def build_index(conn, source, index_path):
+    """
+    Unpivot the 15 taxonomy slots into (npi, slot, taxonomy_code) rows.
+    Rows are sorted by taxonomy_code so Parquet row-group statistics let
+    an IN (...) lookup skip everything outside the requested codes.
+    Returns (row_count, seconds).
+    """
+    slot_columns = ', '.join(f'"{column}"' for column in nppes_extract.TAXONOMY_COLUMNS)
+    start = time.perf_counter()
+    row_count = conn.execute(f"""
+        COPY (
+            SELECT
+                CAST("{nppes_extract.NPI_COLUMN}" AS BIGINT) AS npi,
+                CAST(regexp_extract(slot_name, '_(\\d+)$', 1) AS UTINYINT) AS slot,
+                taxonomy_code
+            FROM (
+                UNPIVOT (SELECT "{nppes_extract.NPI_COLUMN}", {slot_columns} FROM {source})
+                ON {slot_columns}
+                INTO NAME slot_name VALUE taxonomy_code
+            )
+            WHERE taxonomy_code <> ''
+            ORDER BY taxonomy_code, npi
+        ) TO '{index_path}' (FORMAT PARQUET, COMPRESSION ZSTD)
+    """).fetchone()[0]
+    return row_count, time.perf_counter() - start
+
+
+def npis_with_any(conn, index_path, codes):
+    """Sorted NPIs that list any of `codes` in any taxonomy slot"""
+    codes = nppes_extract.taxonomy_codes(codes)
+    rows = conn.execute(f"""
+        SELECT DISTINCT npi
+        FROM read_parquet('{index_path}')
+        WHERE taxonomy_code IN ({', '.join(f"'{code}'" for code in codes)})
+        ORDER BY npi
+    """).fetchall()
+    return [row[0] for row in rows]
+
+
+def main():
+    print("=" * 70)
+    print("Build NPI → Taxonomy Index")
+    print("=" * 70)
+
+    index_path = os.getenv('TAXONOMY_INDEX_PATH', DEFAULT_INDEX_PATH)
+    conn = nppes_extract.connect()
+    source, _ = nppes_extract.nppes_source(os.getenv('NPPES_FILE_PATH'))
+
+    print("\n### Step 1: Build Index ###")
+    row_count, seconds = build_index(conn, source, index_path)
+    print(f"✓ Indexed {row_count:,} (NPI, taxonomy) pairs in {seconds:.1f}s")
+    print(f"✓ Index size: {os.path.getsize(index_path) / 1024**2:.1f} MB at {index_path}")
+
+    print("\n### Step 2: Verify Lookup ###")
+    codes = nppes_extract.taxonomy_codes()
+    start = time.perf_counter()
+    npis = npis_with_any(conn, index_path, codes)
+    print(f"✓ {len(npis):,} NPIs match {', '.join(codes)} "
+          f"({(time.perf_counter() - start) * 1000:.0f} ms)")
+    conn.close()
+
+    print("\n" + "=" * 70)
+    print("Index Complete!")
+    print("=" * 70)
+    print(f"✓ Set TAXONOMY_INDEX_PATH={index_path} so step 6 uses the index")
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,9 @@
 """
 Test connections to MinIO and PostgreSQL
 """
-import os
 from dotenv import load_dotenv
-import boto3
-from botocore.client import Config
-import psycopg2
+
+import connections
 
 load_dotenv()
 
@@ -13,13 +11,7 @@ def test_minio():
     """Test MinIO connection"""
     print("\n### Testing MinIO Connection ###")
     try:
-        s3 = boto3.client(
-            's3',
-            endpoint_url=os.getenv('MINIO_ENDPOINT'),
-            aws_access_key_id=os.getenv('MINIO_ACCESS_KEY'),
-            aws_secret_access_key=os.getenv('MINIO_SECRET_KEY'),
-            config=Config(signature_version='s3v4')
-        )
+        s3 = connections.get_minio_client()
         
         buckets = s3.list_buckets()
         print(f"✓ MinIO connected successfully")
@@ -33,23 +25,15 @@ def test_postgres():
     """Test PostgreSQL connection"""
     print("\n### Testing PostgreSQL Connection ###")
     try:
-        conn = psycopg2.connect(
-            host=os.getenv('POSTGRES_HOST'),
-            port=os.getenv('POSTGRES_PORT'),
-            database=os.getenv('POSTGRES_DB'),
-            user=os.getenv('POSTGRES_USER'),
-            password=os.getenv('POSTGRES_PASSWORD')
-        )
-        
-        cursor = conn.cursor()
-        cursor.execute("SELECT version();")
-        version = cursor.fetchone()[0]
-        
-        print(f"✓ PostgreSQL connected")
-        print(f"✓ Version: {version[:60]}")
-        
-        cursor.close()
-        conn.close()
+        with connections.pg_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT version();")
+            version = cursor.fetchone()[0]
+            
+            print(f"✓ PostgreSQL connected")
+            print(f"✓ Version: {version[:60]}")
+            
+            cursor.close()
         return True
     except Exception as e:
         print(f"✗ PostgreSQL failed: {e}")
@@ -62,6 +46,7 @@ def main():
     
     minio_ok = test_minio()
     postgres_ok = test_postgres()
+    connections.close_all()
     
     print("\n" + "=" * 70)
     if minio_ok and postgres_ok:
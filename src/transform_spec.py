@@ -0,0 +1,239 @@
+"""
+Declarative column transforms for the step 6 extract.
+A spec is a list of rules {'output', 'rule', 'source', ...options}, written
+in Python or loaded from YAML/JSON. Each rule compiles to one DuckDB SQL
+expression and the whole spec to a single SELECT list, so every derived
+field is computed in the same vectorized pass over the source.
+"""
+import json
+import os
+import re
+
+import nppes_extract
+
+# Columns every processed spec must produce (the frame_io / step 7 schema)
+REQUIRED_OUTPUTS = ('NPI', 'provider_state', 'provider_city', 'specialty_code')
+
+IDENTIFIER_PATTERN = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+# US Census Bureau regions; territories and military addresses map to NULL
+STATE_REGIONS = {
+    'Northeast': ('CT', 'ME', 'MA', 'NH', 'RI', 'VT', 'NJ', 'NY', 'PA'),
+    'Midwest': ('IL', 'IN', 'MI', 'OH', 'WI', 'IA', 'KS', 'MN', 'MO', 'NE', 'ND', 'SD'),
+    'South': ('DE', 'DC', 'FL', 'GA', 'MD', 'NC', 'SC', 'VA', 'WV', 'AL', 'KY', 'MS', 'TN',
+              'AR', 'LA', 'OK', 'TX'),
+    'West': ('AZ', 'CO', 'ID', 'MT', 'NV', 'NM', 'UT', 'WY', 'AK', 'CA', 'HI', 'OR', 'WA'),
+}
+
+
+def _quoted(column):
+    return '"' + column.replace('"', '""') + '"'
+
+
+def _digits(column):
+    return f"regexp_replace(coalesce({_quoted(column)}, ''), '[^0-9]', '', 'g')"
+
+
+def _column_sql(rule, codes):
+    return _quoted(rule['source'])
+
+
+def _bigint_sql(rule, codes):
+    return f"CAST({_quoted(rule['source'])} AS BIGINT)"
+
+
+def _name_sql(rule, codes):
+    # Upper case, keep letters/hyphen/apostrophe/space, collapse whitespace
+    cleaned = f"regexp_replace(upper({_quoted(rule['source'])}), '[^A-Z\\-'' ]', '', 'g')"
+    return f"nullif(trim(regexp_replace({cleaned}, '\\s+', ' ', 'g')), '')"
+
+
+def _zip5_sql(rule, codes):
+    return f"nullif(regexp_extract({_quoted(rule['source'])}, '^\\s*([0-9]{{5}})', 1), '')"
+
+
+def _phone_sql(rule, codes):
+    # 10-digit NANP number; a leading country code 1 is dropped
+    digits = _digits(rule['source'])
+    return f"""CASE
+            WHEN length({digits}) = 10 THEN {digits}
+            WHEN length({digits}) = 11 AND starts_with({digits}, '1') THEN {digits}[2:]
+        END"""
+
+
+def _credential_sql(rule, codes):
+    # "M.D., FACC" → ['MD', 'FACC']; with first: true only the first one
+    tokens = (f"list_filter(regexp_split_to_array(regexp_replace(upper(coalesce("
+              f"{_quoted(rule['source'])}, '')), '[.]', '', 'g'), '[,;/ ]+'), c -> c <> '')")
+    return f"{tokens}[1]" if rule.get('first') else tokens
+
+
+def _region_sql(rule, codes):
+    source = _quoted(rule['source'])
+    cases = ' '.join(
+        f"WHEN upper(trim({source})) IN ({', '.join(repr(state) for state in states)}) THEN '{region}'"
+        for region, states in STATE_REGIONS.items()
+    )
+    return f"CASE {cases} END"
+
+
+def _year_sql(rule, codes):
+    return nppes_extract.enumeration_year_sql(rule['source'])
+
+
+def _taxonomy_sql(rule, codes):
+    return nppes_extract.matched_taxonomy_sql(codes)
+
+
+def _taxonomies_sql(rule, codes):
+    return nppes_extract.taxonomy_codes_sql(codes)
+
+
+def _active_sql(rule, codes):
+    return nppes_extract.active_sql()
+
+
+# rule name → (compiler, takes a source column)
+RULES = {
+    'column': (_column_sql, True),
+    'bigint': (_bigint_sql, True),
+    'name': (_name_sql, True),
+    'zip5': (_zip5_sql, True),
+    'phone': (_phone_sql, True),
+    'credential': (_credential_sql, True),
+    'region': (_region_sql, True),
+    'year': (_year_sql, True),
+    'taxonomy': (_taxonomy_sql, False),
+    'taxonomies': (_taxonomies_sql, False),
+    'active': (_active_sql, False),
+}
+
+# Source columns read by rules that take no source column
+RULE_COLUMNS = {
+    'taxonomy': nppes_extract.TAXONOMY_COLUMNS,
+    'taxonomies': nppes_extract.TAXONOMY_COLUMNS,
+    'active': [nppes_extract.DEACTIVATION_DATE_COLUMN, nppes_extract.REACTIVATION_DATE_COLUMN],
+}
+
+RULE_OPTIONS = {'output', 'rule', 'source', 'first'}
+
+# The processed cardiology schema (what step 6 has always produced)
+PROCESSED_SPEC = [
+    {'output': 'NPI', 'rule': 'bigint', 'source': nppes_extract.NPI_COLUMN},
+    {'output': 'provider_state', 'rule': 'column', 'source': nppes_extract.STATE_COLUMN},
+    {'output': 'provider_city', 'rule': 'column', 'source': nppes_extract.CITY_COLUMN},
+    {'output': 'specialty_code', 'rule': 'taxonomy'},
+    {'output': 'enumeration_year', 'rule': 'year', 'source': nppes_extract.ENUMERATION_DATE_COLUMN},
+    {'output': 'is_active', 'rule': 'active'},
+    {'output': 'taxonomy_codes', 'rule': 'taxonomies'},
+]
+
+# Processed schema plus derived provider fields
+ENRICHED_SPEC = PROCESSED_SPEC + [
+    {'output': 'last_name', 'rule': 'name', 'source': 'Provider Last Name (Legal Name)'},
+    {'output': 'first_name', 'rule': 'name', 'source': 'Provider First Name'},
+    {'output': 'credentials', 'rule': 'credential', 'source': 'Provider Credential Text'},
+    {'output': 'practice_zip5', 'rule': 'zip5',
+     'source': 'Provider Business Practice Location Address Postal Code'},
+    {'output': 'practice_phone', 'rule': 'phone',
+     'source': 'Provider Business Practice Location Address Telephone Number'},
+    {'output': 'practice_region', 'rule': 'region', 'source': nppes_extract.STATE_COLUMN},
+]
+
+SPECS = {
+    'processed': PROCESSED_SPEC,
+    'enriched': ENRICHED_SPEC,
+}
+
+
+def load_spec(name_or_path=None):
+    """
+    Spec from the argument or TRANSFORM_SPEC: a built-in name (see SPECS)
+    or a .yaml/.yml/.json file holding a list of rules
+    """
+    name_or_path = name_or_path or os.getenv('TRANSFORM_SPEC', 'processed')
+    if name_or_path in SPECS:
+        return SPECS[name_or_path]
+    with open(name_or_path, encoding='utf-8') as spec_file:
+        if name_or_path.endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("YAML transform specs need PyYAML (pip install pyyaml)")
+            spec = yaml.safe_load(spec_file)
+        else:
+            spec = json.load(spec_file)
+    if isinstance(spec, dict):
+        spec = spec.get('rules')
+    return spec
+
+
+def source_columns(spec):
+    """NPPES columns the spec reads (taxonomy rules read all 15 slots)"""
+    columns = []
+    for rule in spec:
+        needed = RULE_COLUMNS.get(rule['rule'], [rule.get('source')])
+        columns.extend(column for column in needed if column not in columns)
+    return columns
+
+
+def validate_spec(spec, available_columns=None):
+    """
+    Check a spec before any data is read; raises ValueError listing every
+    problem. With available_columns (e.g. from DESCRIBE on the source),
+    source columns are checked to exist too.
+    """
+    errors = []
+    if not isinstance(spec, list) or not spec:
+        raise ValueError("Transform spec must be a non-empty list of rules")
+
+    outputs = []
+    for index, rule in enumerate(spec):
+        where = f"rule {index + 1}"
+        if not isinstance(rule, dict):
+            errors.append(f"{where}: expected a mapping, got {type(rule).__name__}")
+            continue
+        output = rule.get('output')
+        where = f"rule {index + 1} ({output})"
+        if not isinstance(output, str) or not IDENTIFIER_PATTERN.match(output):
+            errors.append(f"{where}: output must be a plain identifier")
+        elif output in outputs:
+            errors.append(f"{where}: duplicate output")
+        outputs.append(output)
+
+        unknown = set(rule) - RULE_OPTIONS
+        if unknown:
+            errors.append(f"{where}: unknown option(s) {', '.join(sorted(unknown))}")
+        if rule.get('rule') not in RULES:
+            errors.append(f"{where}: unknown rule '{rule.get('rule')}' "
+                          f"(expected one of {', '.join(RULES)})")
+            continue
+        _, takes_source = RULES[rule['rule']]
+        source = rule.get('source')
+        if takes_source and not isinstance(source, str):
+            errors.append(f"{where}: '{rule['rule']}' needs a source column")
+        elif not takes_source and source is not None:
+            errors.append(f"{where}: '{rule['rule']}' takes no source column")
+        elif takes_source and available_columns is not None and source not in available_columns:
+            errors.append(f"{where}: source column '{source}' not in input")
+
+    missing = [column for column in REQUIRED_OUTPUTS if column not in outputs]
+    if missing:
+        errors.append(f"missing required output(s): {', '.join(missing)}")
+    if errors:
+        raise ValueError("Invalid transform spec:\n  " + "\n  ".join(errors))
+    return spec
+
+
+def select_sql(spec, codes=None):
+    """Compile a validated spec to one SELECT list (expression AS output, ...)"""
+    codes = nppes_extract.taxonomy_codes(codes)
+    return ',\n            '.join(
+        f"{RULES[rule['rule']][0](rule, codes)} AS {_quoted(rule['output'])}"
+        for rule in spec
+    )
+
+
+def describe_columns(conn, source):
+    """Column names of a DuckDB source relation (reads only the header/footer)"""
+    return [row[0] for row in conn.execute(f"DESCRIBE SELECT * FROM {source}").fetchall()]
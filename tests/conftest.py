@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The pipeline modules import each other as top-level modules from src/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+# Unit tests never emit stage metrics
+os.environ.setdefault('METRICS', 'off')
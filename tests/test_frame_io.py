@@ -0,0 +1,68 @@
+import pyarrow as pa
+import pytest
+
+import frame_io
+import nppes_synthetic
+import step6_minio_transform as step6
+
+
+@pytest.fixture
+def enriched_extract(tmp_path, monkeypatch):
+    path = str(tmp_path / 'nppes.csv')
+    nppes_synthetic.generate(path, 400, seed=1, cardiology_share=0.5)
+    monkeypatch.setenv('TRANSFORM_SPEC', 'enriched')
+    monkeypatch.delenv('TAXONOMY_INDEX_PATH', raising=False)
+    monkeypatch.delenv('NPPES_PARQUET_PATH', raising=False)
+    return step6.extract_table(path), path
+
+
+def test_content_sha256_of_enriched_extract(enriched_extract):
+    table, path = enriched_extract
+    assert any(pa.types.is_list(field.type) for field in table.schema)
+
+    fingerprint = frame_io.content_sha256(table)
+    assert fingerprint == frame_io.content_sha256(step6.extract_table(path))
+    assert fingerprint != frame_io.content_sha256(table.slice(1))
+
+
+def test_content_sha256_ignores_chunking_and_dictionaries():
+    table = pa.table({
+        'NPI': pa.array([1003000126, 1003000134, 1003000142], pa.int64()),
+        'provider_state': pa.array(['TN', None, 'NY']).dictionary_encode(),
+        'credentials': pa.array([['MD'], [], None], pa.list_(pa.string())),
+    })
+    plain = table.set_column(1, 'provider_state', pa.array(['TN', None, 'NY']))
+    rechunked = pa.concat_tables([table.slice(0, 1), table.slice(1)])
+
+    fingerprint = frame_io.content_sha256(table)
+    assert frame_io.content_sha256(plain) == fingerprint
+    assert frame_io.content_sha256(rechunked) == fingerprint
+    assert frame_io.content_sha256(table.replace_schema_metadata({'source': 'x'})) == fingerprint
+
+
+def test_csv_chunks_render_lists_as_postgres_arrays():
+    table = pa.table({
+        'NPI': pa.array([1, 2, 3, 4], pa.int64()),
+        'taxonomy_codes': pa.array([['207RC0000X', '207RI0011X'], [], None, ['a"b', 'c\\d', None]],
+                                   pa.list_(pa.string())),
+    })
+    # A slice starts at a non-zero list offset
+    csv = b''.join(frame_io.iter_csv_chunks([table.to_batches()[0].slice(1), table.slice(0, 1).to_batches()[0]]))
+    assert csv.decode('utf-8').splitlines() == [
+        '"NPI","taxonomy_codes"',
+        '2,"{}"',
+        '3,',
+        '4,"{""a\\""b"",""c\\\\d"",NULL}"',
+        '1,"{""207RC0000X"",""207RI0011X""}"',
+    ]
+
+
+def test_to_processed_fills_taxonomy_codes_from_specialty_code():
+    table = frame_io.to_processed(pa.table({
+        'NPI': pa.array([1, 2], pa.int64()),
+        'provider_state': ['TN', 'NY'],
+        'provider_city': ['NASHVILLE', 'ALBANY'],
+        'specialty_code': ['207RC0000X', None],
+    }))
+    assert table.schema.names == frame_io.PROCESSED_SCHEMA.names
+    assert table['taxonomy_codes'].to_pylist() == [['207RC0000X'], []]
@@ -0,0 +1,91 @@
+import base64
+import gzip
+import json
+
+import numpy as np
+import pytest
+
+import provider_index
+import step12_lambda_post as step12
+
+
+def luhn_valid(npi):
+    """Reference check: Luhn over '80840' + the NPI, one digit at a time"""
+    digits = [int(digit) for digit in '80840' + str(npi)]
+    total = 0
+    for position, digit in enumerate(reversed(digits)):
+        if position % 2:
+            digit *= 2
+            digit = digit - 9 if digit > 9 else digit
+        total += digit
+    return len(str(npi)) == 10 and total % 10 == 0
+
+
+def test_valid_npis_known_values():
+    # 1234567893 is the example NPI of the CMS check digit specification
+    npis = [1234567893, 1234567890, 1003000126, 999999999, 10000000000]
+    assert provider_index.valid_npis(npis).tolist() == [True, False, luhn_valid(1003000126), False, False]
+
+
+def test_valid_npis_matches_reference_implementation():
+    rng = np.random.default_rng(0)
+    npis = rng.integers(1_000_000_000, 10_000_000_000, size=2000, dtype=np.int64)
+    # Make about a tenth valid by fixing up their check digit
+    for position in range(0, len(npis), 10):
+        base = npis[position] - npis[position] % 10
+        npis[position] = next(base + digit for digit in range(10) if luhn_valid(base + digit))
+    assert provider_index.valid_npis(npis).tolist() == [luhn_valid(int(npi)) for npi in npis]
+
+
+def test_valid_npis_empty():
+    assert provider_index.valid_npis([]).tolist() == []
+
+
+def test_parse_items_json_array():
+    body = json.dumps(['1234567893', 1234567893, {'npi': '1003000126'}, {'other': 1}, None])
+    assert step12.parse_items(body) == ['1234567893', 1234567893, '1003000126', None, None]
+
+
+def test_parse_items_ndjson():
+    body = '"1234567893"\n\n{"npi": "1003000126"}\n1234567890\n'
+    assert step12.parse_items(body) == ['1234567893', '1003000126', 1234567890]
+
+
+def test_parse_items_rejects_invalid_json():
+    with pytest.raises(step12.BadRequest, match="Invalid JSON"):
+        step12.parse_items('["1234567893",')
+
+
+def test_read_body_gzip_base64():
+    body = base64.b64encode(gzip.compress(b'["1234567893"]')).decode('ascii')
+    event = {'isBase64Encoded': True, 'headers': {'Content-Encoding': 'gzip'}, 'body': body}
+    assert step12.read_body(event) == '["1234567893"]'
+
+
+@pytest.mark.parametrize('event, message', [
+    ({'isBase64Encoded': True, 'body': 'not base64!'}, 'Invalid base64'),
+    ({'isBase64Encoded': True, 'headers': {'Content-Encoding': 'gzip'},
+      'body': base64.b64encode(b'not gzip').decode('ascii')}, 'Invalid gzip'),
+    ({'isBase64Encoded': True, 'body': base64.b64encode(gzip.compress(b'[1]')[:-12] + b'x' * 12).decode('ascii')},
+     'Invalid gzip'),
+    ({'isBase64Encoded': True, 'body': base64.b64encode(b'\xff\xfe').decode('ascii')}, 'not UTF-8'),
+])
+def test_lambda_handler_rejects_malformed_body(event, message):
+    result = step12.lambda_handler(event, None)
+    assert result['statusCode'] == 400
+    body = json.loads(result['body'])
+    assert body['error'] == 'Invalid request'
+    assert message in body['details']
+
+
+def test_to_npi_array():
+    items = ['1234567893', 1234567893, '1234567890', '12345', '123456789x', None, {'npi': 1}, '01234567893']
+    npis, valid = step12.to_npi_array(items)
+    assert npis.dtype == np.int64
+    assert npis.tolist() == [1234567893, 1234567893, 1234567890, 0, 0, 0, 0, 0]
+    assert valid.tolist() == [True, True, False, False, False, False, False, False]
+
+
+def test_to_npi_array_empty():
+    npis, valid = step12.to_npi_array([])
+    assert len(npis) == 0 and len(valid) == 0
@@ -0,0 +1,29 @@
+from datetime import date
+
+import pytest
+
+import nppes_incremental
+
+
+def test_file_date_single_date_in_each_format():
+    assert nppes_incremental.file_date('nppes-weekly/NPPES_2024-03-11.csv') == date(2024, 3, 11)
+    assert nppes_incremental.file_date('nppes-weekly/NPPES_20240311.csv') == date(2024, 3, 11)
+    assert nppes_incremental.file_date('nppes-weekly/NPPES_031124_V2.csv') == date(2024, 3, 11)
+
+
+def test_file_date_takes_the_period_end_in_both_formats():
+    assert nppes_incremental.file_date(
+        'nppes-weekly/NPPES_Data_Dissemination_030424_031024_V2.csv') == date(2024, 3, 10)
+    assert nppes_incremental.file_date(
+        'nppes-weekly/NPPES_Data_Dissemination_2024-03-04_2024-03-10.csv') == date(2024, 3, 10)
+    assert nppes_incremental.file_date(
+        'nppes-weekly/NPPES_Data_Dissemination_20240304_20240310.csv') == date(2024, 3, 10)
+
+
+def test_file_date_ignores_the_prefix():
+    assert nppes_incremental.file_date('nppes-2023-01-01/NPPES_031024.csv') == date(2024, 3, 10)
+
+
+def test_file_date_without_a_date():
+    with pytest.raises(ValueError):
+        nppes_incremental.file_date('nppes-weekly/NPPES_Deactivated.csv')
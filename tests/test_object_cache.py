@@ -0,0 +1,84 @@
+import os
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from object_cache import ObjectCache
+
+
+def add_entry(cache, name, size, last_used):
+    """A cached object as get() leaves it: body, sidecar, mtime = last use"""
+    path = os.path.join(cache.directory, f"{name}.obj")
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+    with open(path[:-len('.obj')] + '.json', 'w') as f:
+        f.write('{}')
+    os.utime(path, (last_used, last_used))
+    return path
+
+
+def test_evict_removes_least_recently_used_first(tmp_path):
+    cache = ObjectCache(str(tmp_path), max_bytes=250)
+    oldest = add_entry(cache, 'a', 100, 1000)
+    middle = add_entry(cache, 'b', 100, 2000)
+    newest = add_entry(cache, 'c', 100, 3000)
+
+    assert cache.evict() == 100
+    assert not os.path.exists(oldest)
+    assert not os.path.exists(oldest[:-len('.obj')] + '.json')
+    assert [path for path, _, _ in cache.entries()] == [middle, newest]
+    assert cache.size() == 200
+
+
+def test_evict_noop_under_the_cap(tmp_path):
+    cache = ObjectCache(str(tmp_path), max_bytes=300)
+    add_entry(cache, 'a', 100, 1000)
+    add_entry(cache, 'b', 100, 2000)
+    assert cache.evict() == 0
+    assert cache.size() == 200
+
+
+def test_evict_never_removes_keep(tmp_path):
+    cache = ObjectCache(str(tmp_path), max_bytes=50)
+    other = add_entry(cache, 'a', 100, 2000)
+    kept = add_entry(cache, 'b', 100, 1000)  # oldest, but just written
+
+    assert cache.evict(keep=kept) == 100
+    assert not os.path.exists(other)
+    assert [path for path, _, _ in cache.entries()] == [kept]
+
+
+def test_evict_ignores_other_files(tmp_path):
+    cache = ObjectCache(str(tmp_path), max_bytes=0)
+    add_entry(cache, 'a', 10, 1000)
+    (tmp_path / 'partial.obj.123.tmp').write_bytes(b'y' * 10)
+    assert cache.evict() == 10
+    assert os.listdir(tmp_path) == ['partial.obj.123.tmp']
+
+
+@pytest.fixture
+def s3():
+    with mock_aws():
+        client = boto3.client('s3', region_name='us-east-1', aws_access_key_id='test',
+                              aws_secret_access_key='test')
+        client.create_bucket(Bucket='processed-data')
+        yield client
+
+
+def test_get_downloads_once_then_revalidates(tmp_path, s3):
+    cache = ObjectCache(str(tmp_path), max_bytes=1024**2)
+    s3.put_object(Bucket='processed-data', Key='a.parquet', Body=b'version 1')
+
+    first = cache.get(s3, 'processed-data', 'a.parquet')
+    again = cache.get(s3, 'processed-data', 'a.parquet')
+    assert (first.hit, first.downloaded) == (False, 9)
+    assert again.hit and again.path == first.path
+    assert bytes(again.buffer()) == b'version 1'
+
+    s3.put_object(Bucket='processed-data', Key='a.parquet', Body=b'version 2!')
+    changed = cache.get(s3, 'processed-data', 'a.parquet')
+    assert not changed.hit
+    with changed.open() as f:
+        assert f.read() == b'version 2!'
+    assert (cache.hits, cache.misses) == (1, 2)
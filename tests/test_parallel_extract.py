@@ -0,0 +1,83 @@
+import csv
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import nppes_extract
+import parallel_extract
+
+COLUMNS = list(dict.fromkeys(
+    [nppes_extract.NPI_COLUMN, nppes_extract.STATE_COLUMN, nppes_extract.CITY_COLUMN,
+     nppes_extract.ENUMERATION_DATE_COLUMN, nppes_extract.DEACTIVATION_DATE_COLUMN,
+     nppes_extract.REACTIVATION_DATE_COLUMN] + nppes_extract.TAXONOMY_COLUMNS
+))
+
+
+def write_csv(path, header, rows):
+    with open(path, 'w', encoding='utf-8', newline='') as output:
+        writer = csv.writer(output, quoting=csv.QUOTE_ALL)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def read_range(path, start, end):
+    with open(path, 'rb') as source:
+        source.seek(start)
+        return source.read(end - start).decode('utf-8')
+
+
+@pytest.mark.parametrize('chunks', [1, 2, 3, 7, 50])
+def test_split_ranges_cuts_on_record_boundaries(tmp_path, chunks):
+    path = str(tmp_path / 'providers.csv')
+    # Quoted newlines and quotes land on both sides of many cuts
+    rows = [[str(1000000000 + i), f"Suite {i}\nFloor \"{i % 3}\"" if i % 2 else 'Main St', 'TN']
+            for i in range(40)]
+    write_csv(path, ['NPI', 'Address', 'State'], rows)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        column_names, ranges = parallel_extract.split_ranges(path, chunks, pool)
+
+    assert column_names == ['NPI', 'Address', 'State']
+    assert len(ranges) <= chunks
+    for (_, end), (start, _) in zip(ranges, ranges[1:]):
+        assert end == start
+    parsed = []
+    for start, end in ranges:
+        parsed += list(csv.reader(io.StringIO(read_range(path, start, end))))
+    assert parsed == rows
+
+
+def test_split_ranges_header_only(tmp_path):
+    path = str(tmp_path / 'empty.csv')
+    write_csv(path, ['NPI', 'State'], [])
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        column_names, ranges = parallel_extract.split_ranges(path, 4, pool)
+    assert column_names == ['NPI', 'State']
+    assert all(start == end for start, end in ranges)
+
+
+def test_extract_range_reads_blank_fields_as_null(tmp_path):
+    path = str(tmp_path / 'nppes.csv')
+    taxonomy = {nppes_extract.TAXONOMY_COLUMNS[0]: '207RC0000X'}
+    rows = [
+        {nppes_extract.NPI_COLUMN: '1003000126', nppes_extract.STATE_COLUMN: 'TN',
+         nppes_extract.CITY_COLUMN: 'NASHVILLE', **taxonomy},
+        {nppes_extract.NPI_COLUMN: '1003000134', nppes_extract.STATE_COLUMN: '',
+         nppes_extract.CITY_COLUMN: '', **taxonomy},
+    ]
+    write_csv(path, COLUMNS, [[row.get(column, '') for column in COLUMNS] for row in rows])
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        column_names, ranges = parallel_extract.split_ranges(path, 1, pool)
+    query = nppes_extract.cardiology_query(parallel_extract.BATCH_TABLE)
+    scanned, table = parallel_extract.extract_range(path, *ranges[0], column_names, COLUMNS, query)
+
+    assert scanned == 2
+    assert table['provider_state'].to_pylist() == ['TN', None]
+    assert table['provider_city'].to_pylist() == ['NASHVILLE', None]
+
+    conn = nppes_extract.connect()
+    expected = conn.execute(f"SELECT * FROM ({nppes_extract.cardiology_query(nppes_extract.csv_source(path))})")
+    assert table.to_pylist() == expected.fetch_arrow_table().to_pylist()
+    conn.close()
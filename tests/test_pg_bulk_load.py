@@ -0,0 +1,32 @@
+import io
+
+import pg_bulk_load
+
+
+def records(data, read_size=pg_bulk_load.DEFAULT_READ_SIZE):
+    return list(pg_bulk_load.iter_csv_records(io.BytesIO(data), read_size=read_size))
+
+
+def test_iter_csv_records_splits_lines():
+    assert records(b'npi,state\n1,TN\n2,NY\n') == [b'npi,state\n', b'1,TN\n', b'2,NY\n']
+
+
+def test_iter_csv_records_keeps_quoted_newlines_in_one_record():
+    data = b'1,"Suite 100\nBuilding ""B""",TN\n2,x,NY\n'
+    assert records(data) == [b'1,"Suite 100\nBuilding ""B""",TN\n', b'2,x,NY\n']
+
+
+def test_iter_csv_records_without_trailing_newline():
+    assert records(b'1,TN\n2,NY') == [b'1,TN\n', b'2,NY']
+
+
+def test_iter_csv_records_independent_of_read_size():
+    data = b'a,"multi\nline\nvalue"\nb,plain\n"c",""\n'
+    expected = records(data)
+    for read_size in (1, 2, 3, 7):
+        assert records(data, read_size=read_size) == expected
+    assert b''.join(expected) == data
+
+
+def test_iter_csv_records_empty_stream():
+    assert records(b'') == []
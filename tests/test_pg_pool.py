@@ -0,0 +1,62 @@
+import pytest
+
+import connections
+
+
+class FakeConnection:
+    def __init__(self, fail_rollback=False):
+        self.closed = 0
+        self.fail_rollback = fail_rollback
+        self.rollbacks = 0
+
+    def rollback(self):
+        self.rollbacks += 1
+        if self.fail_rollback:
+            raise RuntimeError('server closed the connection unexpectedly')
+
+
+class FakePool:
+    def __init__(self, conn):
+        self.conn = conn
+        self.returned = []
+
+    def getconn(self):
+        return self.conn
+
+    def putconn(self, conn, close=False):
+        self.returned.append((conn, close))
+
+
+def borrow(monkeypatch, conn):
+    pool = FakePool(conn)
+    monkeypatch.setattr(connections, 'get_pg_pool', lambda: pool)
+    return pool
+
+
+def test_pg_connection_rolls_back_and_returns(monkeypatch):
+    conn = FakeConnection()
+    pool = borrow(monkeypatch, conn)
+    with connections.pg_connection() as borrowed:
+        assert borrowed is conn
+    assert conn.rollbacks == 1
+    assert pool.returned == [(conn, False)]
+
+
+def test_pg_connection_closes_when_rollback_fails(monkeypatch):
+    conn = FakeConnection(fail_rollback=True)
+    pool = borrow(monkeypatch, conn)
+    with pytest.raises(RuntimeError):
+        with connections.pg_connection():
+            pass
+    assert pool.returned == [(conn, True)]
+
+
+def test_pg_connection_closes_a_closed_connection(monkeypatch):
+    conn = FakeConnection()
+    conn.closed = 2
+    pool = borrow(monkeypatch, conn)
+    with pytest.raises(ValueError):
+        with connections.pg_connection():
+            raise ValueError('query failed')
+    assert conn.rollbacks == 0
+    assert pool.returned == [(conn, True)]
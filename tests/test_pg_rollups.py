@@ -0,0 +1,79 @@
+import duckdb
+
+import pg_rollups
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def cache_with_clock(monkeypatch, max_entries=2, ttl_seconds=60):
+    clock = Clock()
+    monkeypatch.setattr(pg_rollups.time, 'monotonic', clock)
+    return pg_rollups.QueryCache(max_entries, ttl_seconds), clock
+
+
+def test_query_cache_hit_and_miss(monkeypatch):
+    cache, _ = cache_with_clock(monkeypatch)
+    assert cache.get('state', 1) is None
+    cache.put('state', 1, [('TN', 2)])
+    assert cache.get('state', 1) == [('TN', 2)]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_query_cache_drops_entries_from_another_load_version(monkeypatch):
+    cache, _ = cache_with_clock(monkeypatch)
+    cache.put('state', 1, [('TN', 2)])
+    assert cache.get('state', 2) is None
+    # The stale entry is gone, not just skipped
+    assert cache.get('state', 1) is None
+    assert 'state' not in cache.entries
+
+
+def test_query_cache_expires_after_ttl(monkeypatch):
+    cache, clock = cache_with_clock(monkeypatch, ttl_seconds=60)
+    cache.put('state', 1, 'result')
+    clock.now += 60
+    assert cache.get('state', 1) == 'result'
+    clock.now += 0.001
+    assert cache.get('state', 1) is None
+
+
+def test_query_cache_evicts_least_recently_used(monkeypatch):
+    cache, _ = cache_with_clock(monkeypatch, max_entries=2)
+    cache.put('a', 1, 'A')
+    cache.put('b', 1, 'B')
+    assert cache.get('a', 1) == 'A'  # b is now the least recently used
+    cache.put('c', 1, 'C')
+    assert list(cache.entries) == ['a', 'c']
+    assert cache.get('b', 1) is None
+
+
+def test_query_cache_clear(monkeypatch):
+    cache, _ = cache_with_clock(monkeypatch)
+    cache.put('a', 1, 'A')
+    cache.clear()
+    assert cache.get('a', 1) is None
+
+
+def test_rollup_sql_groups_blank_and_null_together():
+    # provider_rollups_key_idx cannot tell '' from NULL, so neither may the scan
+    conn = duckdb.connect(':memory:')
+    conn.execute("""
+        CREATE TABLE providers AS SELECT * FROM (VALUES
+            ('CA', '', NULL, 2001, TRUE),
+            ('CA', NULL, '', 2001, TRUE),
+            ('', NULL, '207RC0000X', NULL, FALSE)
+        ) t(provider_state, provider_city, specialty_code, enumeration_year, is_active)
+    """)
+    rows = conn.execute(f"SELECT * FROM ({pg_rollups.rollup_sql('providers')}) ORDER BY ALL").fetchall()
+    conn.close()
+    keys = [row[:5] for row in rows]
+    assert len(keys) == len(set(keys))
+    assert ('city', 'CA', None, None, None, 2, 2) in rows
+    assert ('taxonomy', None, None, None, None, 2, 2) in rows
+    assert ('state', None, None, None, None, 1, 0) in rows
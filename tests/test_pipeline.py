@@ -0,0 +1,174 @@
+import threading
+
+import pytest
+
+import pipeline
+import run_manifest
+
+
+class MemoryS3:
+    """The put_object/get_object subset of an S3 client the run manifest uses"""
+
+    class exceptions:
+        class NoSuchKey(Exception):
+            pass
+
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[(Bucket, Key)] = Body
+
+    def get_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise self.exceptions.NoSuchKey(Key)
+        body = self.objects[(Bucket, Key)]
+
+        class Body:
+            def read(self):
+                return body
+        return {'Body': Body()}
+
+
+def quiet(message):
+    pass
+
+
+def test_topological_order_puts_dependencies_first():
+    stages = [
+        pipeline.Stage('mirror', None, depends_on=['backup']),
+        pipeline.Stage('backup', None, depends_on=['extract']),
+        pipeline.Stage('load', None, depends_on=['extract']),
+        pipeline.Stage('extract', None),
+    ]
+    order = pipeline.topological_order(stages)
+    assert sorted(order) == ['backup', 'extract', 'load', 'mirror']
+    assert order.index('extract') < order.index('backup') < order.index('mirror')
+    assert order.index('extract') < order.index('load')
+
+
+@pytest.mark.parametrize('stages, message', [
+    ([pipeline.Stage('a', None, depends_on=['b']), pipeline.Stage('b', None, depends_on=['a'])], 'cycle'),
+    ([pipeline.Stage('a', None, depends_on=['missing'])], 'unknown stage'),
+    ([pipeline.Stage('a', None), pipeline.Stage('a', None)], 'Duplicate'),
+])
+def test_topological_order_rejects_invalid_graphs(stages, message):
+    with pytest.raises(ValueError, match=message):
+        pipeline.topological_order(stages)
+
+
+def test_run_hands_results_to_dependents():
+    stages = [
+        pipeline.Stage('extract', lambda inputs: [1, 2, 3]),
+        pipeline.Stage('total', lambda inputs: sum(inputs['extract']), depends_on=['extract']),
+        pipeline.Stage('count', lambda inputs: len(inputs['extract']), depends_on=['extract']),
+        pipeline.Stage('report', lambda inputs: f"{inputs['total']}/{inputs['count']}",
+                       depends_on=['total', 'count']),
+    ]
+    results = pipeline.run(stages, log=quiet)
+    assert results == {'extract': [1, 2, 3], 'total': 6, 'count': 3, 'report': '6/3'}
+
+
+def test_run_executes_independent_stages_concurrently():
+    # Each branch waits for the other, which only returns if both run at once
+    barrier = threading.Barrier(2, timeout=5)
+    stages = [
+        pipeline.Stage('left', lambda inputs: barrier.wait() is not None),
+        pipeline.Stage('right', lambda inputs: barrier.wait() is not None),
+    ]
+    assert pipeline.run(stages, max_workers=2, log=quiet) == {'left': True, 'right': True}
+
+
+def test_run_reraises_failures_and_skips_dependents():
+    started = []
+
+    def fail(inputs):
+        raise RuntimeError("boom")
+
+    stages = [
+        pipeline.Stage('extract', fail),
+        pipeline.Stage('load', lambda inputs: started.append('load'), depends_on=['extract']),
+    ]
+    with pytest.raises(RuntimeError, match="boom"):
+        pipeline.run(stages, log=quiet)
+    assert started == []
+
+
+def test_run_skips_stages_finished_in_the_same_run():
+    s3 = MemoryS3()
+    calls = []
+
+    def stages():
+        return [
+            pipeline.Stage('extract', lambda inputs: calls.append('extract') or 10,
+                           restore=lambda summary: summary),
+            pipeline.Stage('load', lambda inputs: calls.append('load') or inputs['extract'] + 1,
+                           depends_on=['extract'], checkpoint=True),
+        ]
+
+    manifest = run_manifest.RunManifest.open(s3, 'run-1')
+    assert pipeline.run(stages(), log=quiet, manifest=manifest) == {'extract': 10, 'load': 11}
+    assert manifest.is_done('extract') and manifest.is_done('load')
+
+    # Re-opened from storage, as a resumed run would be
+    resumed = run_manifest.RunManifest.open(s3, 'run-1')
+    assert resumed.resumed
+    assert pipeline.run(stages(), log=quiet, manifest=resumed) == {'extract': 10, 'load': 11}
+    assert calls == ['extract', 'load']
+
+
+def test_new_run_skips_stages_whose_inputs_are_unchanged():
+    s3 = MemoryS3()
+    source = {'rows': [1, 2, 3]}
+    calls = []
+
+    def stages():
+        return [
+            pipeline.Stage('extract', lambda inputs: list(source['rows']),
+                           fingerprint=lambda rows: str(rows)),
+            pipeline.Stage('load', lambda inputs: calls.append('load') or {'loaded': len(inputs['extract'])},
+                           depends_on=['extract'], skip_unchanged=True),
+            pipeline.Stage('index', lambda inputs: calls.append('index') or 'built',
+                           depends_on=['load'], skip_unchanged=True),
+        ]
+
+    def run(run_id):
+        manifest = run_manifest.RunManifest.open(s3, run_id)
+        return pipeline.run(stages(), log=quiet, manifest=manifest), manifest
+
+    run('run-1')
+    results, manifest = run('run-2')
+    assert calls == ['load', 'index']
+    assert results['load'] == {'loaded': 3} and results['index'] == 'built'
+    assert manifest.data['stages']['load']['unchanged_since'] == 'run-1'
+
+    source['rows'] = [1, 2, 3, 4]
+    results, _ = run('run-3')
+    assert calls == ['load', 'index', 'load', 'index']
+    assert results['load'] == {'loaded': 4}
+
+
+def test_unchanged_stage_runs_again_when_its_output_is_not_current():
+    s3 = MemoryS3()
+    table = {'version': 1}
+    calls = []
+
+    def load(inputs):
+        calls.append('load')
+        table['version'] += 1
+        return {'version': table['version']}
+
+    def stages():
+        return [
+            pipeline.Stage('extract', lambda inputs: [1, 2], fingerprint=lambda rows: str(rows)),
+            pipeline.Stage('load', load, depends_on=['extract'], skip_unchanged=True,
+                           current=lambda summary: summary['version'] == table['version']),
+        ]
+
+    for run_id in ['run-1', 'run-2']:
+        pipeline.run(stages(), log=quiet, manifest=run_manifest.RunManifest.open(s3, run_id))
+    assert calls == ['load']
+
+    table['version'] += 1  # e.g. an incremental load in between
+    pipeline.run(stages(), log=quiet, manifest=run_manifest.RunManifest.open(s3, 'run-3'))
+    assert calls == ['load', 'load']
@@ -0,0 +1,51 @@
+import pyarrow as pa
+import pytest
+
+import frame_io
+import provider_index
+
+
+@pytest.fixture
+def index():
+    table = pa.table({
+        'NPI': pa.array([1245319599, 1003000126, 1346336807, 1588667638], pa.int64()),
+        'provider_state': ['TN', 'TN', 'CA', None],
+        'provider_city': ['MEMPHIS', 'NASHVILLE', 'LOS ANGELES', None],
+        'specialty_code': ['207RI0011X', '207RC0000X', '207RC0000X', None],
+        'taxonomy_codes': pa.array([['207RI0011X'], ['207RC0000X', '207RI0011X'], ['207RC0000X'], None],
+                                   pa.list_(pa.string())),
+    })
+    index_table = provider_index.build_index(provider_index.from_processed(table))
+    return provider_index.ProviderIndex.from_bytes(frame_io.to_parquet_buffer(index_table))
+
+
+def npis(index, rows):
+    return [record['npi'] for record in index.records(rows)]
+
+
+def test_search_by_taxonomy_matches_every_matched_code(index):
+    # 1003000126's primary specialty is 207RC0000X; 207RI0011X is its second code.
+    # Results come in state, city, NPI order
+    assert npis(index, index.search(taxonomy='207RI0011X')) == ['1245319599', '1003000126']
+    assert npis(index, index.search(taxonomy='207rc0000x')) == ['1346336807', '1003000126']
+    assert npis(index, index.search(state='TN', city='Nashville', taxonomy='207RI0011X')) == ['1003000126']
+    assert len(index.search(taxonomy='207RE0101X')) == 0
+
+
+def test_records_include_every_taxonomy_code(index):
+    records = {record['npi']: record for record in index.records(range(len(index)))}
+    assert records['1003000126']['specialty_code'] == '207RC0000X'
+    assert records['1003000126']['taxonomy_codes'] == ['207RC0000X', '207RI0011X']
+    assert records['1588667638']['taxonomy_codes'] == []
+
+
+def test_from_processed_without_taxonomy_codes_uses_the_specialty():
+    table = pa.table({
+        'NPI': pa.array([1003000126, 1245319599], pa.int64()),
+        'provider_state': ['TN', 'TN'],
+        'provider_city': ['NASHVILLE', 'MEMPHIS'],
+        'specialty_code': ['207RC0000X', None],
+    })
+    index = provider_index.ProviderIndex(provider_index.build_index(provider_index.from_processed(table)))
+    assert npis(index, index.search(taxonomy='207RC0000X')) == ['1003000126']
+    assert [record['taxonomy_codes'] for record in index.records([0, 1])] == [['207RC0000X'], []]
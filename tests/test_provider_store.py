@@ -0,0 +1,98 @@
+import numpy as np
+import pyarrow as pa
+import pytest
+
+import frame_io
+from provider_store import ProviderStore
+
+PROVIDERS = [
+    # NPI, state, city, specialty, enumeration year, active
+    (1003000134, 'TN', 'MEMPHIS', '207RI0011X', None, True),
+    (1003000126, 'TN', 'NASHVILLE', '207RC0000X', 2005, True),
+    (1962000000, 'NY', None, '207RC0000X', 2019, False),
+    (1508000000, None, 'NASHVILLE', None, 2011, True),
+]
+
+
+def processed_table():
+    npi, state, city, specialty, year, active = zip(*PROVIDERS)
+    return frame_io.to_processed(pa.table({
+        'NPI': pa.array(npi, pa.int64()),
+        'provider_state': pa.array(state, pa.string()),
+        'provider_city': pa.array(city, pa.string()),
+        'specialty_code': pa.array(specialty, pa.string()),
+        'enumeration_year': pa.array(year, pa.int16()),
+        'is_active': pa.array(active, pa.bool_()),
+    }))
+
+
+def expected_records():
+    return [
+        {'npi': str(npi), 'provider_state': state, 'provider_city': city, 'specialty_code': specialty,
+         'enumeration_year': year, 'is_active': active}
+        for npi, state, city, specialty, year, active in sorted(PROVIDERS)
+    ]
+
+
+@pytest.fixture
+def store():
+    return ProviderStore.from_arrow(processed_table())
+
+
+def test_from_arrow_sorts_by_npi(store):
+    assert len(store) == len(PROVIDERS)
+    assert store.npi.tolist() == sorted(npi for npi, *_ in PROVIDERS)
+    assert store.records(range(len(store))) == expected_records()
+
+
+def test_file_round_trip(store, tmp_path):
+    path = str(tmp_path / 'providers.store')
+    assert store.save(path) == len(store.to_bytes())
+    loaded = ProviderStore.from_file(path)
+    assert loaded.records(range(len(loaded))) == expected_records()
+    for name, array in store._arrays().items():
+        assert loaded._arrays()[name].dtype == array.dtype
+        assert np.array_equal(loaded._arrays()[name], array)
+    # Mapped in place, not copied
+    assert not loaded.npi.flags.owndata
+
+
+def test_from_buffer_rejects_other_data():
+    with pytest.raises(ValueError, match="Not a provider store"):
+        ProviderStore.from_buffer(b'PAR1' + bytes(60))
+
+
+def test_find_and_lookup(store):
+    assert store.records([store.find(1962000000)])[0]['provider_state'] == 'NY'
+    assert store.find(1962000001) is None
+    assert store.find(1) is None
+    rows = store.lookup([1508000000, 42, 1003000126, 9999999999])
+    assert rows[1] == -1 and rows[3] == -1
+    assert store.npi[rows[[0, 2]]].tolist() == [1508000000, 1003000126]
+
+
+def test_lookup_on_empty_store():
+    empty = ProviderStore.from_arrow(processed_table().slice(0, 0))
+    assert len(empty) == 0
+    assert empty.find(1003000126) is None
+    assert empty.lookup([1003000126]).tolist() == [-1]
+
+
+def test_filters(store):
+    def npis(**filters):
+        return sorted(int(npi) for npi in store.npi[store.filter(**filters)])
+
+    assert npis(state='tn') == [1003000126, 1003000134]
+    assert npis(city='Nashville') == [1003000126, 1508000000]
+    assert npis(specialty='207RC0000X') == [1003000126, 1962000000]
+    assert npis(specialty='207RC0000X', active=True) == [1003000126]
+    assert npis(year=2011) == [1508000000]
+    assert npis(state='CA') == []
+
+
+def test_group_count(store):
+    assert store.group_count('provider_state') == {'TN': 2, 'NY': 1, None: 1}
+    assert store.group_count('specialty_code', store.mask(active=True)) == {
+        '207RC0000X': 1, '207RI0011X': 1, None: 1
+    }
+    assert store.group_count('enumeration_year') == {None: 1, 2005: 1, 2011: 1, 2019: 1}
@@ -0,0 +1,33 @@
+import boto3
+from moto import mock_aws
+
+import s3_bulk
+import s3_transfer
+
+
+@mock_aws
+def test_copy_prefix_server_side_copies_are_skipped_on_the_next_run():
+    s3 = boto3.client('s3', region_name='us-east-1')
+    s3.create_bucket(Bucket='src-bucket')
+    s3.create_bucket(Bucket='dst-bucket')
+    s3.put_object(Bucket='src-bucket', Key='data/small.csv', Body=b'npi\n1\n',
+                  ContentType='text/csv', Metadata={'sha256': 'abc'})
+    # Above the part size, so the server-side copy is multipart and gets a new ETag
+    s3.put_object(Bucket='src-bucket', Key='data/large.bin', Body=b'x' * (6 * 1024 * 1024))
+
+    first = s3_bulk.copy_prefix(s3, 'src-bucket', 'data/', s3, 'dst-bucket', 'mirror/',
+                                part_size=s3_transfer.MIN_PART_SIZE)
+    assert [result['skipped'] for result in first] == [False, False]
+    assert all(result['server_side'] for result in first)
+
+    large = s3.head_object(Bucket='dst-bucket', Key='mirror/large.bin')
+    source = s3.head_object(Bucket='src-bucket', Key='data/large.bin')
+    assert large['ETag'] != source['ETag']
+    assert large['Metadata'][s3_transfer.SOURCE_ETAG_METADATA] == source['ETag']
+    small = s3.head_object(Bucket='dst-bucket', Key='mirror/small.csv')
+    assert small['ContentType'] == 'text/csv'
+    assert small['Metadata']['sha256'] == 'abc'
+
+    second = s3_bulk.copy_prefix(s3, 'src-bucket', 'data/', s3, 'dst-bucket', 'mirror/',
+                                 part_size=s3_transfer.MIN_PART_SIZE)
+    assert [result['skipped'] for result in second] == [True, True]
@@ -0,0 +1,34 @@
+import duckdb
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+import nppes_extract
+import object_cache
+import step7_minio_to_postgres as step7
+
+
+class LocalCache:
+    def __init__(self, path):
+        self.path = path
+
+    def get(self, s3, bucket, key):
+        return object_cache.CachedObject(self.path, bucket, key, '"etag"', 0, 0)
+
+
+def test_load_object_missing_required_column(tmp_path, monkeypatch):
+    path = str(tmp_path / 'processed.parquet')
+    pq.write_table(pa.table({'NPI': [1234567893], 'provider_state': ['TN']}), path)
+    monkeypatch.setattr(object_cache, 'default_cache', lambda: LocalCache(path))
+    connections = []
+
+    def connect(minio=True):
+        connections.append(duckdb.connect())
+        return connections[-1]
+
+    monkeypatch.setattr(nppes_extract, 'connect', connect)
+    with pytest.raises(ValueError, match='provider_city'):
+        step7.load_object(None, None, 'processed-data', 'cardiology/processed.parquet')
+    # the DuckDB connection is closed even though the load failed
+    with pytest.raises(Exception, match='closed'):
+        connections[0].execute('SELECT 1')
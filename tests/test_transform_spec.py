@@ -0,0 +1,84 @@
+import copy
+
+import duckdb
+import pytest
+
+import nppes_extract
+import transform_spec
+
+STATE_COLUMN = nppes_extract.STATE_COLUMN
+
+
+def spec_with(*rules):
+    return copy.deepcopy(transform_spec.PROCESSED_SPEC) + list(rules)
+
+
+@pytest.mark.parametrize('name', sorted(transform_spec.SPECS))
+def test_validate_spec_accepts_builtin_specs(name):
+    spec = transform_spec.SPECS[name]
+    assert transform_spec.validate_spec(spec, transform_spec.source_columns(spec)) is spec
+
+
+@pytest.mark.parametrize('spec, problem', [
+    ([], 'non-empty list'),
+    ({'output': 'NPI'}, 'non-empty list'),
+    (spec_with('NPI'), 'expected a mapping'),
+    (spec_with({'output': 'bad name', 'rule': 'column', 'source': STATE_COLUMN}), 'plain identifier'),
+    (spec_with({'output': 'provider_state', 'rule': 'column', 'source': STATE_COLUMN}), 'duplicate output'),
+    (spec_with({'output': 'x', 'rule': 'column', 'source': STATE_COLUMN, 'default': 1}), "unknown option"),
+    (spec_with({'output': 'x', 'rule': 'upper', 'source': STATE_COLUMN}), "unknown rule 'upper'"),
+    (spec_with({'output': 'x', 'rule': 'zip5'}), "'zip5' needs a source column"),
+    (spec_with({'output': 'x', 'rule': 'taxonomy', 'source': STATE_COLUMN}), "'taxonomy' takes no source"),
+    ([rule for rule in transform_spec.PROCESSED_SPEC if rule['output'] != 'provider_city'],
+     'missing required output(s): provider_city'),
+])
+def test_validate_spec_rejects(spec, problem):
+    with pytest.raises(ValueError) as error:
+        transform_spec.validate_spec(spec)
+    assert problem in str(error.value)
+
+
+def test_validate_spec_checks_sources_against_the_input():
+    spec = spec_with({'output': 'phone', 'rule': 'phone', 'source': 'Not A Column'})
+    transform_spec.validate_spec(spec)
+    with pytest.raises(ValueError, match="source column 'Not A Column' not in input"):
+        transform_spec.validate_spec(spec, transform_spec.source_columns(transform_spec.PROCESSED_SPEC))
+
+
+def test_validate_spec_lists_every_problem():
+    spec = spec_with({'output': 'x', 'rule': 'upper'}, {'output': 'y', 'rule': 'zip5'})
+    with pytest.raises(ValueError) as error:
+        transform_spec.validate_spec(spec)
+    message = str(error.value)
+    first = len(transform_spec.PROCESSED_SPEC) + 1
+    assert f"rule {first} (x): unknown rule" in message
+    assert f"rule {first + 1} (y): 'zip5' needs a source column" in message
+
+
+def test_processed_spec_keeps_every_matched_taxonomy():
+    conn = duckdb.connect()
+    columns = transform_spec.source_columns(transform_spec.PROCESSED_SPEC)
+    definitions = ', '.join(f'"{column}" VARCHAR' for column in columns)
+    conn.execute(f"CREATE TABLE providers ({definitions})")
+    slots = {column: None for column in nppes_extract.TAXONOMY_COLUMNS}
+    rows = [
+        # primary match in slot 2, another in slot 4, repeated in slot 5
+        dict(slots, **{nppes_extract.TAXONOMY_COLUMNS[0]: '208D00000X',
+                       nppes_extract.TAXONOMY_COLUMNS[1]: '207RI0011X',
+                       nppes_extract.TAXONOMY_COLUMNS[3]: '207RC0000X',
+                       nppes_extract.TAXONOMY_COLUMNS[4]: '207RI0011X'}),
+        dict(slots, **{nppes_extract.TAXONOMY_COLUMNS[14]: '207RC0000X'}),
+    ]
+    for npi, row in zip(['1234567893', '1003000126'], rows):
+        values = dict(row, **{nppes_extract.NPI_COLUMN: npi})
+        conn.execute(f"INSERT INTO providers VALUES ({', '.join('?' for _ in columns)})",
+                     [values.get(column) for column in columns])
+
+    query = nppes_extract.cardiology_query(
+        'providers', select_sql=transform_spec.select_sql(transform_spec.PROCESSED_SPEC)
+    )
+    result = conn.execute(f"SELECT NPI, specialty_code, taxonomy_codes FROM ({query}) ORDER BY NPI").fetchall()
+    assert result == [
+        (1003000126, '207RC0000X', ['207RC0000X']),
+        (1234567893, '207RI0011X', ['207RC0000X', '207RI0011X']),
+    ]